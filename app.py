@@ -1,10 +1,24 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
+import hashlib
+import io
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 import plotly.graph_objects as go
 import plotly.express as px
 from streamlit_tree_select import tree_select
+from catalog_engine import (
+    DATA_DIR, DATA_FILES, HISTORY_FILE, HISTORY_COLUMNS, HISTORY_DTYPES, DECISION_ANALYTICS_FILE,
+    DECISION_ANALYTICS_COUNTERS, encode_ids, build_hierarchy_index, validate_category_path, build_hierarchy_paths,
+    resolve_selection, get_file_stat, read_data_version_state, products_file_lock, read_decision_analytics,
+    load_undo_state, read_change_set, commit_product_changes, bulk_update_product_status, bulk_apply_review_decisions,
+    bulk_approve_and_move, bulk_move_products, read_move_mapping, validate_move_mapping, undo_redo_bulk_operation
+)
 
 # Page configuration
 st.set_page_config(
@@ -98,6 +112,17 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Committed changes bump a small version file; sessions poll it instead of reloading data
+DATA_VERSION_POLL_SECONDS = 3
+
+# Caches built from temporal quality depend on where products sit, not on their review status
+PLACEMENT_SCOPE = ["departments.csv", "categories.csv", "subcategories.csv", "placement", "temporal_quality.csv"]
+
+@st.cache_resource(show_spinner=False, max_entries=10)
+def load_table(file_name, table_version):
+    """Read one data file once per version of that file (frames are shared read-only)"""
+    return pd.read_csv(Path("data") / file_name)
+
 def load_data():
     """Load grocery store data from CSV files"""
     data_path = Path("data")
@@ -107,16 +132,44 @@ def load_data():
         return None, None, None, None, None
     
     try:
-        departments = pd.read_csv(data_path / "departments.csv")
-        categories = pd.read_csv(data_path / "categories.csv")
-        subcategories = pd.read_csv(data_path / "subcategories.csv")
-        products = pd.read_csv(data_path / "products.csv")
-        temporal_quality = pd.read_csv(data_path / "temporal_quality.csv")
-        return departments, categories, subcategories, products, temporal_quality
+        # Only tables whose version changed are read again
+        table_versions = get_table_versions()
+        return tuple(load_table(file_name, table_versions[file_name]) for file_name in DATA_FILES)
     except FileNotFoundError as e:
         st.error(f"Data file not found: {e}")
         return None, None, None, None, None
 
+def get_table_versions():
+    """Version token per data file, plus 'placement' for product subcategory assignments"""
+    state = read_data_version_state()
+    table_versions = {}
+    for file_name in DATA_FILES:
+        table_state = state['tables'].get(file_name, {})
+        stat = get_file_stat(Path("data") / file_name)
+        table_versions[file_name] = str(table_state.get('version', 0))
+        if table_state.get('stat') != stat:
+            # Rewritten outside a commit (e.g. by generate_data.py): fall back to the file stat
+            table_versions[file_name] += f"+{stat}"
+    
+    # An outside rewrite of products may have moved products too
+    _, external_change, products_stat = table_versions["products.csv"].partition("+")
+    table_versions['placement'] = f"{state['placement']}{external_change}{products_stat}"
+    return table_versions
+
+def get_data_version(scope=DATA_FILES):
+    """Return a token that changes whenever any table in scope changes"""
+    table_versions = get_table_versions()
+    return "/".join(table_versions[table] for table in scope)
+
+@st.fragment(run_every=DATA_VERSION_POLL_SECONDS)
+def watch_data_version():
+    """Rerun the page when another session commits a change (reads only the version file)"""
+    committed_version = read_data_version_state()['version']
+    seen_version = st.session_state.get('seen_data_version')
+    st.session_state.seen_data_version = committed_version
+    if seen_version is not None and seen_version != committed_version:
+        st.rerun()
+
 def show_documentation():
     """Display the documentation page"""
     st.markdown('<h1 class="main-header">📖 Documentation & Architecture</h1>', unsafe_allow_html=True)
@@ -267,12 +320,217 @@ def show_documentation():
         - **Responsive Design**: Works on desktop and mobile
         """)
 
+# Facet vocabularies for the Data Explorer sidebar
+FACET_STATUSES = ['approved', 'recommended', 'rejected']
+FACET_QUALITIES = ['good', 'neutral', 'poor']
+PRICE_BUCKET_EDGES = [2, 5, 10, 20]
+PRICE_BUCKET_LABELS = ["Under $2", "$2 - $5", "$5 - $10", "$10 - $20", "$20+"]
+
+def compute_facet_counts(filtered_products, units, child_level, child_nodes, hierarchy):
+    """Count products per facet value for all facets with a single bincount"""
+    facets = [
+        ('Status', FACET_STATUSES,
+         pd.Categorical(filtered_products['status'], categories=FACET_STATUSES).codes),
+        ('Quality', FACET_QUALITIES,
+         pd.Categorical(filtered_products['quality'], categories=FACET_QUALITIES).codes),
+        ('Unit', list(units),
+         pd.Categorical(filtered_products['unit'], categories=units).codes),
+    ]
+    
+    # Price buckets (missing prices are left uncounted)
+    prices = filtered_products['price'].to_numpy(dtype=float)
+    price_codes = np.digitize(prices, PRICE_BUCKET_EDGES)
+    price_codes[np.isnan(prices)] = -1
+    facets.append(('Price', PRICE_BUCKET_LABELS, price_codes))
+    
+    # Children of the current hierarchy selection
+    if child_level is not None:
+        subcat_ids = filtered_products['subcategory_id'].to_numpy(dtype=np.int64)
+        in_range = (subcat_ids >= 0) & (subcat_ids < len(hierarchy['subcat_to_cat']))
+        child_ids = np.full(len(subcat_ids), -1, dtype=np.int64)
+        if child_level == 'department':
+            child_ids[in_range] = hierarchy['subcat_to_dept'][subcat_ids[in_range]]
+        elif child_level == 'category':
+            child_ids[in_range] = hierarchy['subcat_to_cat'][subcat_ids[in_range]]
+        else:
+            child_ids = subcat_ids
+        facets.append((child_level.title(), child_nodes['name'].tolist(),
+                       encode_ids(child_ids, child_nodes['id'].to_numpy())))
+    
+    # Offset each facet's codes into one shared code space; unmatched values go to a trailing slot
+    offsets = np.cumsum([0] + [len(labels) for _, labels, _ in facets])
+    trash_slot = offsets[-1]
+    stacked_codes = np.concatenate([
+        np.where(np.asarray(codes) >= 0, np.asarray(codes, dtype=np.int64) + offset, trash_slot)
+        for (_, _, codes), offset in zip(facets, offsets[:-1])
+    ])
+    counts = np.bincount(stacked_codes, minlength=trash_slot + 1)
+    
+    return {
+        name: pd.Series(counts[offset:offset + len(labels)], index=labels)
+        for (name, labels, _), offset in zip(facets, offsets[:-1])
+    }
+
+def show_facet_counts(facet_counts):
+    """Render facet counts in the sidebar"""
+    with st.sidebar:
+        st.markdown("---")
+        st.markdown("### 📊 Facet Counts")
+        for facet_name, counts in facet_counts.items():
+            st.markdown(f"**{facet_name}**")
+            st.markdown("\n".join(f"- {label}: {count}" for label, count in counts.items()))
+
+# Numeric product columns that support range filtering
+RANGE_FILTER_COLUMNS = ['price', 'stock_quantity']
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def build_sorted_column_index(_products, data_version):
+    """Pre-sort range-filterable columns once per data version"""
+    sorted_index = {}
+    for column in RANGE_FILTER_COLUMNS:
+        row_values = _products[column].to_numpy(dtype=float)
+        order = np.argsort(row_values, kind='stable')
+        sorted_values = row_values[order]
+        
+        # Missing values sort last; keep them out of every range
+        valid = ~np.isnan(sorted_values)
+        order, sorted_values = order[valid], sorted_values[valid]
+        
+        for array in (row_values, order, sorted_values):
+            array.setflags(write=False)
+        sorted_index[column] = {
+            'sorted_values': sorted_values,
+            'order': order,
+            'row_values': row_values
+        }
+    return sorted_index
+
+def query_sorted_range(column_index, low, high):
+    """Return row positions with low <= value <= high as a slice of the sort permutation"""
+    start = np.searchsorted(column_index['sorted_values'], low, side='left')
+    end = np.searchsorted(column_index['sorted_values'], high, side='right')
+    return column_index['order'][start:end]
+
+def select_rows_in_ranges(sorted_index, ranges):
+    """Intersect several range filters, scanning only the narrowest slice; None means no filter"""
+    active_ranges = {}
+    for column, (low, high) in ranges.items():
+        sorted_values = sorted_index[column]['sorted_values']
+        if len(sorted_values) > 0 and low <= sorted_values[0] and high >= sorted_values[-1]:
+            continue  # Range covers the whole column
+        active_ranges[column] = (low, high)
+    
+    if not active_ranges:
+        return None
+    
+    slices = {column: query_sorted_range(sorted_index[column], low, high)
+              for column, (low, high) in active_ranges.items()}
+    narrowest = min(slices, key=lambda column: len(slices[column]))
+    positions = slices[narrowest]
+    
+    # Check the remaining ranges only for rows inside the narrowest slice
+    for column, (low, high) in active_ranges.items():
+        if column == narrowest:
+            continue
+        values = sorted_index[column]['row_values'][positions]
+        positions = positions[(values >= low) & (values <= high)]
+    
+    return np.sort(positions)
+
+# Streaming export settings
+EXPORT_DIR = Path("exports")
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_DOWNLOAD_LIMIT_BYTES = 50 * 1024 * 1024
+
+def get_export_formats():
+    """Return the export formats available in this environment"""
+    try:
+        import pyarrow.parquet  # noqa: F401
+        return ["CSV", "Parquet"]
+    except ImportError:
+        return ["CSV"]
+
+def iter_export_chunks(frame, product_ids, id_column='id', chunk_rows=EXPORT_CHUNK_ROWS):
+    """Yield rows belonging to product_ids in frames of at most chunk_rows rows"""
+    product_ids = np.asarray(product_ids)
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows]
+        chunk = chunk[chunk[id_column].isin(product_ids)]
+        if len(chunk) > 0:
+            yield chunk
+
+def write_export(chunks, output_path, file_format):
+    """Stream frame chunks to disk as CSV or Parquet and return the number of rows written"""
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    rows_written = 0
+    
+    if file_format == "Parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(output_path, table.schema)
+                else:
+                    table = table.cast(writer.schema)
+                writer.write_table(table)  # One row group per chunk
+                rows_written += len(chunk)
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        with open(output_path, 'w', newline='') as output_file:
+            for chunk in chunks:
+                chunk.to_csv(output_file, index=False, header=rows_written == 0)
+                rows_written += len(chunk)
+    
+    return rows_written
+
+@st.fragment
+def show_export_panel(product_ids, products, temporal_quality, key_prefix):
+    """Export fragment writing the given products (and optionally their quality rows) to disk"""
+    with st.expander("📤 Export Products"):
+        col1, col2 = st.columns(2)
+        with col1:
+            file_format = st.radio("Format", get_export_formats(), horizontal=True, key=f"{key_prefix}_export_format")
+        with col2:
+            include_quality = st.checkbox("Include temporal quality rows", value=False,
+                                          disabled=temporal_quality is None,
+                                          key=f"{key_prefix}_export_quality")
+        
+        if st.button(f"📤 Export {len(product_ids)} products", key=f"{key_prefix}_export"):
+            extension = "parquet" if file_format == "Parquet" else "csv"
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            
+            exports = [(EXPORT_DIR / f"products_{timestamp}.{extension}", products, 'id')]
+            if include_quality and temporal_quality is not None:
+                exports.append((EXPORT_DIR / f"temporal_quality_{timestamp}.{extension}", temporal_quality, 'product_id'))
+            
+            with st.spinner("Writing export..."):
+                for output_path, frame, id_column in exports:
+                    rows_written = write_export(iter_export_chunks(frame, product_ids, id_column),
+                                                output_path, file_format)
+                    st.success(f"✅ Wrote {rows_written} rows to `{output_path}`")
+                    
+                    # Only small exports are offered as a browser download
+                    if output_path.stat().st_size <= EXPORT_DOWNLOAD_LIMIT_BYTES:
+                        with open(output_path, 'rb') as export_file:
+                            st.download_button(
+                                f"⬇️ Download {output_path.name}",
+                                data=export_file,
+                                file_name=output_path.name,
+                                key=f"{key_prefix}_download_{output_path.stem}"
+                            )
+
 def show_data_explorer():
     """Display the data exploration page"""
     st.markdown('<h1 class="main-header">🛒 Grocery Store Data Explorer</h1>', unsafe_allow_html=True)
     
     # Load data
-    departments, categories, subcategories, products, _ = load_data()
+    departments, categories, subcategories, products, temporal_quality = load_data()
     
     if departments is None:
         st.warning("Please generate sample data first by running `python scripts/generate_data.py`")
@@ -343,8 +601,49 @@ def show_data_explorer():
             key="subcat_filter"
         )
     
+    # Price and stock range filters
+    sorted_index = build_sorted_column_index(products, get_data_version(["products.csv"]))
+    price_values = sorted_index['price']['sorted_values']
+    stock_values = sorted_index['stock_quantity']['sorted_values']
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        if len(price_values) > 0:
+            price_min, price_max = float(np.floor(price_values[0])), float(np.ceil(price_values[-1]))
+            price_range = st.slider(
+                "Price range ($)",
+                min_value=price_min,
+                max_value=max(price_max, price_min + 1.0),
+                value=(price_min, max(price_max, price_min + 1.0)),
+                step=0.5,
+                key="price_filter"
+            )
+        else:
+            price_range = (0.0, 0.0)
+    
+    with col2:
+        if len(stock_values) > 0:
+            stock_min, stock_max = int(stock_values[0]), int(stock_values[-1])
+            stock_range = st.slider(
+                "Stock quantity",
+                min_value=stock_min,
+                max_value=max(stock_max, stock_min + 1),
+                value=(stock_min, max(stock_max, stock_min + 1)),
+                key="stock_filter"
+            )
+        else:
+            stock_range = (0, 0)
+    
     # Filter products based on selections
-    filtered_products = products.copy()
+    range_positions = select_rows_in_ranges(sorted_index, {
+        'price': price_range,
+        'stock_quantity': stock_range
+    })
+    if range_positions is None:
+        filtered_products = products.copy()
+    else:
+        filtered_products = products.iloc[range_positions]
     
     if selected_subcat != "All":
         subcat_id = filtered_subcategories[filtered_subcategories['name'] == selected_subcat]['id'].iloc[0]
@@ -384,50 +683,765 @@ def show_data_explorer():
         )
         
         st.info(f"Showing {len(filtered_products)} products")
+        
+        show_export_panel(filtered_products['id'].to_numpy(), products, temporal_quality, "explorer")
     else:
         st.warning("No products found with the current filters.")
+    
+    # Facet counts for the children of the current hierarchy selection
+    if selected_subcat != "All":
+        child_level, child_nodes = None, None
+    elif selected_cat != "All":
+        child_level, child_nodes = 'subcategory', filtered_subcategories
+    elif selected_dept != "All":
+        child_level, child_nodes = 'category', filtered_categories
+    else:
+        child_level, child_nodes = 'department', departments
+    
+    hierarchy = build_hierarchy_index(departments, categories, subcategories)
+    units = np.sort(products['unit'].dropna().unique())
+    show_facet_counts(compute_facet_counts(filtered_products, units, child_level, child_nodes, hierarchy))
 
-def create_quality_waterfall_chart(selected_product_ids, temporal_quality):
-    """Create a waterfall chart showing quality distribution changes over time"""
-    if not selected_product_ids:
-        return None
+def rollup_counts(cube, group_codes, n_groups):
+    """Sum per-item count arrays into per-group arrays (items with code -1 are skipped)"""
+    valid = group_codes >= 0
+    rolled_up = np.zeros((n_groups,) + cube.shape[1:], dtype=np.int64)
+    if not valid.any():
+        return rolled_up
+    
+    # Sort items by group and add up each contiguous run
+    order = np.argsort(group_codes[valid], kind='stable')
+    sorted_codes = group_codes[valid][order]
+    group_ids, run_starts = np.unique(sorted_codes, return_index=True)
+    rolled_up[group_ids] = np.add.reduceat(cube[valid][order], run_starts, axis=0)
+    return rolled_up
+
+def encode_temporal_dimensions(products, temporal_quality):
+    """Code temporal rows by product position and chronological source period"""
+    # Source period dimension with real dates, in chronological order
+    period_column = 'period_date' if 'period_date' in temporal_quality.columns else 'period_id'
+    raw_period_codes, raw_periods = pd.factorize(temporal_quality[period_column])
+    period_starts = pd.to_datetime(pd.Series(raw_periods, dtype=object))
+    chronological_order = np.argsort(period_starts.to_numpy(), kind='stable')
+    raw_to_sorted = np.empty(len(chronological_order), dtype=np.int64)
+    raw_to_sorted[chronological_order] = np.arange(len(chronological_order))
+    periods = pd.DataFrame({
+        'period_index': np.arange(len(raw_periods)),
+        'period_start': period_starts.iloc[chronological_order].reset_index(drop=True)
+    })
+    
+    return {
+        'periods': periods,
+        'product_codes': encode_ids(temporal_quality['product_id'].to_numpy(), products['id'].to_numpy()),
+        'period_codes': np.where(raw_period_codes >= 0, raw_to_sorted[raw_period_codes], -1)
+    }
+
+def build_hierarchy_rollups(product_cube, periods, departments, categories, subcategories, products):
+    """Roll a product-level cube up by current subcategory, then up the hierarchy"""
+    subcategory_ids = subcategories['id'].to_numpy()
+    category_ids = categories['id'].to_numpy()
+    department_ids = departments['id'].to_numpy()
+    subcategory_cube = rollup_counts(
+        product_cube, encode_ids(products['subcategory_id'].to_numpy(), subcategory_ids), len(subcategory_ids)
+    )
+    category_cube = rollup_counts(
+        subcategory_cube, encode_ids(subcategories['category_id'].to_numpy(), category_ids), len(category_ids)
+    )
+    department_cube = rollup_counts(
+        category_cube, encode_ids(categories['department_id'].to_numpy(), department_ids), len(department_ids)
+    )
+    
+    return {
+        'periods': periods,
+        'hierarchy': build_hierarchy_index(departments, categories, subcategories),
+        'product': {'ids': products['id'].to_numpy(), 'cube': product_cube,
+                    'subcategory_ids': products['subcategory_id'].to_numpy()},
+        'subcategory': {'ids': subcategory_ids, 'cube': subcategory_cube},
+        'category': {'ids': category_ids, 'cube': category_cube},
+        'department': {'ids': department_ids, 'cube': department_cube}
+    }
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_quality_rollups(data_version):
+    """Pre-aggregate temporal quality counts per (node, period, quality) at every hierarchy level"""
+    departments, categories, subcategories, products, temporal_quality = load_data()
+    dimensions = encode_temporal_dimensions(products, temporal_quality)
+    
+    # Product-level cube: one bincount over (product, period, quality) codes
+    n_products, n_periods, n_qualities = len(products), len(dimensions['periods']), len(FACET_QUALITIES)
+    product_codes, period_codes = dimensions['product_codes'], dimensions['period_codes']
+    quality_codes = pd.Categorical(temporal_quality['quality'], categories=FACET_QUALITIES).codes
+    valid = (product_codes >= 0) & (period_codes >= 0) & (quality_codes >= 0)
+    cell_codes = (product_codes[valid] * n_periods + period_codes[valid]) * n_qualities + quality_codes[valid]
+    product_cube = np.bincount(cell_codes, minlength=n_products * n_periods * n_qualities)
+    product_cube = product_cube.reshape(n_products, n_periods, n_qualities)
+    
+    return build_hierarchy_rollups(product_cube, dimensions['periods'],
+                                   departments, categories, subcategories, products)
+
+# Quality anomalies: sharp deviations of a product's share from its own rolling baseline
+ANOMALY_FILE = "quality_anomalies.csv"
+ANOMALY_VERSION_FILE = "quality_anomalies.version"
+ANOMALY_QUALITIES = ['good', 'poor']
+ANOMALY_BASELINE_PERIODS = 6
+ANOMALY_MIN_BASELINE_PERIODS = 3
+ANOMALY_Z_THRESHOLD = 3.0
+ANOMALY_MIN_STD = 0.2  # floor so a perfectly flat baseline still gives a finite z-score
+ANOMALY_RECENT_PERIODS = 3
+
+def detect_quality_anomalies(product_cube, product_ids, periods):
+    """Flag (product, period, quality) cells whose share deviates from the trailing baseline"""
+    totals = product_cube.sum(axis=2)
+    observed = totals > 0
+    quality_indexes = [FACET_QUALITIES.index(quality) for quality in ANOMALY_QUALITIES]
+    shares = np.divide(product_cube[:, :, quality_indexes], totals[:, :, None],
+                       out=np.zeros(totals.shape + (len(quality_indexes),)), where=observed[:, :, None])
+    
+    # Sums over the previous ANOMALY_BASELINE_PERIODS periods from cumulative sums along time
+    n_periods = totals.shape[1]
+    window_end = np.arange(n_periods)
+    window_start = np.maximum(window_end - ANOMALY_BASELINE_PERIODS, 0)
+    
+    def trailing_sum(values):
+        cumulative = np.concatenate([np.zeros_like(values[:, :1]), np.cumsum(values, axis=1)], axis=1)
+        return cumulative[:, window_end] - cumulative[:, window_start]
+    
+    baseline_periods = trailing_sum(observed.astype(float))[:, :, None]
+    has_baseline = baseline_periods >= ANOMALY_MIN_BASELINE_PERIODS
+    safe_periods = np.where(has_baseline, baseline_periods, 1)
+    baseline_mean = trailing_sum(shares) / safe_periods
+    baseline_variance = trailing_sum(shares ** 2) / safe_periods - baseline_mean ** 2
+    baseline_std = np.maximum(np.sqrt(np.maximum(baseline_variance, 0)), ANOMALY_MIN_STD)
+    z_scores = (shares - baseline_mean) / baseline_std
+    
+    flagged = observed[:, :, None] & has_baseline & (np.abs(z_scores) >= ANOMALY_Z_THRESHOLD)
+    product_positions, period_positions, quality_positions = np.nonzero(flagged)
+    return pd.DataFrame({
+        'product_id': product_ids[product_positions],
+        'period_index': period_positions,
+        'period_start': periods['period_start'].to_numpy()[period_positions],
+        'quality': np.asarray(ANOMALY_QUALITIES)[quality_positions],
+        'share': shares[flagged],
+        'baseline': baseline_mean[flagged],
+        'z_score': z_scores[flagged]
+    })
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_quality_anomalies(data_version):
+    """Load persisted anomaly flags for this data version, recomputing them when stale"""
+    anomaly_path = Path("data") / ANOMALY_FILE
+    version_path = Path("data") / ANOMALY_VERSION_FILE
+    # The version lives in a sidecar so an empty result is still a cache hit
+    if anomaly_path.exists() and version_path.exists() and version_path.read_text().strip() == data_version:
+        return pd.read_csv(anomaly_path, parse_dates=['period_start'])
+    
+    rollups = build_quality_rollups(data_version)
+    anomalies = detect_quality_anomalies(rollups['product']['cube'], rollups['product']['ids'], rollups['periods'])
+    anomalies.to_csv(anomaly_path, index=False)
+    version_path.write_text(data_version)  # written last, so it only ever vouches for a complete file
+    return anomalies
+
+def get_recent_anomaly_product_ids(anomalies, n_periods):
+    """Product ids flagged in any of the last ANOMALY_RECENT_PERIODS source periods"""
+    recent = anomalies['period_index'] >= n_periods - ANOMALY_RECENT_PERIODS
+    return set(anomalies.loc[recent, 'product_id'].tolist())
+
+# Price sketches: log-spaced buckets with bounded relative error (DDSketch style)
+PRICE_SKETCH_RELATIVE_ACCURACY = 0.02
+PRICE_SKETCH_GAMMA = (1 + PRICE_SKETCH_RELATIVE_ACCURACY) / (1 - PRICE_SKETCH_RELATIVE_ACCURACY)
+PRICE_SKETCH_MIN_PRICE = 0.01
+PRICE_QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+
+def build_sparse_sketch(node_codes, period_codes, bucket_codes, counts, n_nodes, n_periods, n_buckets):
+    """Merge (node, period, bucket) counts into sparse entries sorted by cell, with per-node offsets"""
+    valid = node_codes >= 0
+    cell_codes = (node_codes[valid] * n_periods + period_codes[valid]) * n_buckets + bucket_codes[valid]
+    order = np.argsort(cell_codes, kind='stable')
+    cell_codes, counts = cell_codes[order], counts[valid][order]
+    
+    # Add up the counts of each distinct cell
+    if len(cell_codes) > 0:
+        run_starts = np.flatnonzero(np.r_[True, np.diff(cell_codes) != 0])
+        cell_codes, counts = cell_codes[run_starts], np.add.reduceat(counts, run_starts)
+    nodes, node_cells = np.divmod(cell_codes, max(n_periods * n_buckets, 1))
+    periods, buckets = np.divmod(node_cells, max(n_buckets, 1))
+    
+    return {
+        'offsets': np.searchsorted(nodes, np.arange(n_nodes + 1)),
+        'periods': periods.astype(np.int32),
+        'buckets': buckets.astype(np.int32),
+        'counts': counts
+    }
+
+def get_sketch_entry_nodes(sketch):
+    """Node position of every sparse sketch entry"""
+    return np.repeat(np.arange(len(sketch['offsets']) - 1), np.diff(sketch['offsets']))
+
+def gather_sketch_entries(sketch, positions):
+    """Sparse entries (periods, buckets, counts) of the nodes at the given positions"""
+    positions = np.asarray(positions, dtype=np.int64)
+    starts = sketch['offsets'][positions]
+    lengths = sketch['offsets'][positions + 1] - starts
+    entry_index = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    return sketch['periods'][entry_index], sketch['buckets'][entry_index], sketch['counts'][entry_index]
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_price_sketches(data_version):
+    """Build mergeable price quantile sketches per (product, period) and roll them up the hierarchy"""
+    departments, categories, subcategories, products, temporal_quality = load_data()
+    dimensions = encode_temporal_dimensions(products, temporal_quality)
+    
+    # Map each instance price to a log-spaced bucket
+    prices = np.maximum(temporal_quality['price'].to_numpy(dtype=float), PRICE_SKETCH_MIN_PRICE)
+    bucket_keys = np.ceil(np.log(prices) / np.log(PRICE_SKETCH_GAMMA))
+    product_codes, period_codes = dimensions['product_codes'], dimensions['period_codes']
+    valid = (product_codes >= 0) & (period_codes >= 0) & ~np.isnan(bucket_keys)
+    bucket_keys = bucket_keys[valid].astype(np.int64)
+    key_offset = int(bucket_keys.min()) if len(bucket_keys) > 0 else 0
+    n_buckets = int(bucket_keys.max()) - key_offset + 1 if len(bucket_keys) > 0 else 1
+    
+    # Product-level sketches keep only the non-empty (product, period, bucket) cells
+    n_periods = len(dimensions['periods'])
+    product_sketch = build_sparse_sketch(product_codes[valid], period_codes[valid], bucket_keys - key_offset,
+                                         np.ones(len(bucket_keys), dtype=np.int64), len(products), n_periods, n_buckets)
+    
+    # Sketches merge by adding bucket counts, so each level merges the entries of its children
+    subcategory_ids = subcategories['id'].to_numpy()
+    category_ids = categories['id'].to_numpy()
+    department_ids = departments['id'].to_numpy()
+    
+    def rollup(sketch, group_codes, n_groups):
+        return build_sparse_sketch(group_codes[get_sketch_entry_nodes(sketch)], sketch['periods'], sketch['buckets'],
+                                   sketch['counts'], n_groups, n_periods, n_buckets)
+    
+    subcategory_sketch = rollup(product_sketch, encode_ids(products['subcategory_id'].to_numpy(), subcategory_ids),
+                                len(subcategory_ids))
+    category_sketch = rollup(subcategory_sketch, encode_ids(subcategories['category_id'].to_numpy(), category_ids),
+                             len(category_ids))
+    department_sketch = rollup(category_sketch, encode_ids(categories['department_id'].to_numpy(), department_ids),
+                               len(department_ids))
+    
+    return {
+        'periods': dimensions['periods'],
+        'hierarchy': build_hierarchy_index(departments, categories, subcategories),
+        'product': {'ids': products['id'].to_numpy(), 'sketch': product_sketch,
+                    'subcategory_ids': products['subcategory_id'].to_numpy()},
+        'subcategory': {'ids': subcategory_ids, 'sketch': subcategory_sketch},
+        'category': {'ids': category_ids, 'sketch': category_sketch},
+        'department': {'ids': department_ids, 'sketch': department_sketch},
+        'key_offset': key_offset,
+        'n_buckets': n_buckets
+    }
+
+def estimate_sketch_quantiles(sketch, n_periods, key_offset, quantiles=PRICE_QUANTILES):
+    """Estimate quantiles per period from a single-node sketch (NaN for empty periods); also returns period totals"""
+    totals = np.bincount(sketch['periods'], weights=sketch['counts'], minlength=n_periods).astype(np.int64)
+    cumulative = np.cumsum(sketch['counts'])
+    counts_before = np.cumsum(totals) - totals
+    observed = totals > 0
+    estimates = np.full((n_periods, len(quantiles)), np.nan)
+    
+    for quantile_index, quantile in enumerate(quantiles):
+        # First entry whose cumulative count within its period exceeds the target rank
+        ranks = quantile * (totals[observed] - 1)
+        entries = np.searchsorted(cumulative, counts_before[observed] + ranks, side='right')
+        bucket_keys = sketch['buckets'][entries] + key_offset
+        estimates[observed, quantile_index] = 2 * PRICE_SKETCH_GAMMA ** bucket_keys / (PRICE_SKETCH_GAMMA + 1)
+    
+    return estimates, totals
+
+# Time granularities the quality charts can roll up to (pandas period frequencies)
+TIME_GRANULARITIES = {
+    'Day': 'D',
+    'Week': 'W',
+    'Month': 'M',
+    'Quarter': 'Q'
+}
+
+def format_period_label(period, granularity):
+    """Format a pandas Period as a chart label for the given granularity"""
+    if granularity == 'Quarter':
+        return f"Q{period.quarter} {period.year}"
+    elif granularity == 'Month':
+        return period.start_time.strftime('%B %Y')
+    elif granularity == 'Week':
+        return f"Week of {period.start_time.strftime('%b %d, %Y')}"
+    return period.start_time.strftime('%b %d, %Y')
+
+def get_period_runs(source_periods, granularity):
+    """Group chronological source periods into target periods; return run starts and the period table"""
+    # Source periods are chronological, so each target period is a contiguous run
+    target_periods = source_periods['period_start'].dt.to_period(TIME_GRANULARITIES[granularity])
+    target_codes, target_uniques = pd.factorize(target_periods, sort=True)
+    run_starts = np.flatnonzero(np.r_[True, np.diff(target_codes) != 0]) if len(target_codes) > 0 else []
+    
+    periods = pd.DataFrame({
+        'period_index': np.arange(len(target_uniques)),
+        'period_name': [format_period_label(period, granularity) for period in target_uniques],
+        'period_start': [period.start_time for period in target_uniques],
+        'period_end': [period.end_time for period in target_uniques]
+    })
+    return run_starts, periods
+
+def regroup_periods(counts, run_starts, axis=1):
+    """Add up source-period counts into target periods (None keeps the source periods)"""
+    if run_starts is None or len(run_starts) == 0:
+        return counts
+    return np.add.reduceat(counts, run_starts, axis=axis)
+
+def regroup_rollups(rollups, granularity):
+    """Roll hierarchy-level cubes up to a coarser granularity without rescanning raw rows"""
+    run_starts, periods = get_period_runs(rollups['periods'], granularity)
+    if len(periods) == len(rollups['periods']):
+        run_starts = None  # every target period is one source period, so the source cubes are reused
+    
+    # The product cube stays at source periods and is shared; callers regroup only the rows they need
+    granular_rollups = dict(rollups)
+    granular_rollups['granularity'] = granularity
+    granular_rollups['periods'] = periods
+    granular_rollups['run_starts'] = run_starts
+    for level in ('subcategory', 'category', 'department'):
+        granular_rollups[level] = dict(rollups[level], cube=regroup_periods(rollups[level]['cube'], run_starts))
+    
+    return granular_rollups
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_granular_rollups(data_version, granularity):
+    """Quality rollups at the given granularity, derived once per data version"""
+    return regroup_rollups(build_quality_rollups(data_version), granularity)
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_granular_price_sketches(data_version, granularity):
+    """Price sketches at the given granularity, derived once per data version"""
+    sketches = build_price_sketches(data_version)
+    run_starts, periods = get_period_runs(sketches['periods'], granularity)
+    target_codes = np.cumsum(np.isin(np.arange(len(sketches['periods'])), run_starts)) - 1
+    
+    granular_sketches = dict(sketches)
+    granular_sketches['granularity'] = granularity
+    granular_sketches['periods'] = periods
+    if len(periods) == len(sketches['periods']):
+        return granular_sketches
+    for level in ('product', 'subcategory', 'category', 'department'):
+        sketch = sketches[level]['sketch']
+        granular_sketches[level] = dict(sketches[level], sketch=build_sparse_sketch(
+            get_sketch_entry_nodes(sketch), target_codes[sketch['periods']], sketch['buckets'], sketch['counts'],
+            len(sketch['offsets']) - 1, len(periods), sketches['n_buckets']
+        ))
+    
+    return granular_sketches
+
+# Per-product trend features over the full timeline of a granularity
+TREND_FEATURES = {
+    'slope': "Slope of good share per period",
+    'delta': "Last vs first good share",
+    'volatility': "Volatility of good share"
+}
+
+def compute_product_trend_features(product_cube):
+    """Slope, last-vs-first delta and volatility of each product's good share, in one pass"""
+    totals = product_cube.sum(axis=2)
+    observed = totals > 0
+    good_shares = np.divide(product_cube[:, :, FACET_QUALITIES.index('good')], totals,
+                            out=np.zeros(totals.shape), where=observed)
+    n_periods = totals.shape[1]
+    
+    # Least-squares slope against the period index over observed periods only
+    x = np.arange(n_periods, dtype=float)
+    weights = observed.astype(float)
+    n_observed = weights.sum(axis=1)
+    sum_x, sum_y = weights @ x, good_shares.sum(axis=1)
+    sum_xx, sum_xy = weights @ (x * x), good_shares @ x
+    denominator = n_observed * sum_xx - sum_x ** 2
+    slope = np.divide(n_observed * sum_xy - sum_x * sum_y, denominator,
+                      out=np.full(len(totals), np.nan), where=denominator > 0)
+    
+    # First and last observed period of each product
+    first_period = np.argmax(observed, axis=1)
+    last_period = n_periods - 1 - np.argmax(observed[:, ::-1], axis=1)
+    rows = np.arange(len(totals))
+    delta = np.where(n_observed > 0, good_shares[rows, last_period] - good_shares[rows, first_period], np.nan)
+    
+    # Standard deviation of the good share over observed periods
+    mean_share = np.divide(sum_y, n_observed, out=np.zeros(len(totals)), where=n_observed > 0)
+    squared_deviation = (((good_shares - mean_share[:, None]) ** 2) * weights).sum(axis=1)
+    volatility = np.sqrt(np.divide(squared_deviation, n_observed,
+                                   out=np.full(len(totals), np.nan), where=n_observed > 0))
+    
+    return {'slope': slope, 'delta': delta, 'volatility': volatility}
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def get_product_trend_features(data_version, granularity):
+    """Per-product trend feature vectors, computed once per data version and granularity"""
+    rollups = get_granular_rollups(data_version, granularity)
+    features = compute_product_trend_features(regroup_periods(rollups['product']['cube'], rollups['run_starts']))
+    features['ids'] = rollups['product']['ids']
+    return features
+
+def top_k_products(trend_features, feature, product_ids, k, largest=False):
+    """Positions of the k products in the selection with the smallest (or largest) feature values"""
+    positions = encode_ids(np.asarray(product_ids), trend_features['ids'])
+    positions = positions[positions >= 0]
+    values = trend_features[feature][positions]
+    positions, values = positions[~np.isnan(values)], values[~np.isnan(values)]
+    if largest:
+        values = -values
+    
+    # Partial selection of the k extremes, then order just those k
+    k = min(k, len(values))
+    if k == 0:
+        return positions[:0]
+    candidates = np.argpartition(values, k - 1)[:k]
+    return positions[candidates[np.argsort(values[candidates], kind='stable')]]
+
+def get_period_window(periods, start_date, end_date):
+    """Return the slice of chronological periods overlapping [start_date, end_date]"""
+    start = np.searchsorted(periods['period_end'].to_numpy(), np.datetime64(pd.Timestamp(start_date)), side='left')
+    end = np.searchsorted(periods['period_start'].to_numpy(), np.datetime64(pd.Timestamp(end_date)), side='right')
+    return slice(int(start), int(max(start, end)))
+
+def select_rollup_nodes(selection, rollups):
+    """Positions of a tree selection's topmost selected nodes at each rollup level"""
+    hierarchy = rollups['hierarchy']
+    dept_ids = np.unique(np.asarray(selection['dept_ids'], dtype=np.int64))
+    cat_ids = np.unique(np.asarray(selection['cat_ids'], dtype=np.int64))
+    subcat_ids = np.unique(np.asarray(selection['subcat_ids'], dtype=np.int64))
+    product_ids = np.unique(np.asarray(selection['product_ids'], dtype=np.int64))
+    
+    def lookup(table, ids):
+        in_range = (ids >= 0) & (ids < len(table))
+        return np.where(in_range, table[np.clip(ids, 0, len(table) - 1)], -1)
+    
+    # Skip nodes already covered by a selected ancestor
+    cat_ids = cat_ids[~np.isin(lookup(hierarchy['cat_to_dept'], cat_ids), dept_ids)]
+    subcat_ids = subcat_ids[
+        ~np.isin(lookup(hierarchy['subcat_to_dept'], subcat_ids), dept_ids) &
+        ~np.isin(lookup(hierarchy['subcat_to_cat'], subcat_ids), cat_ids)
+    ]
+    
+    # Individually checked products only need a product-level lookup when not covered by a node
+    product_positions = encode_ids(product_ids, rollups['product']['ids'])
+    product_positions = product_positions[product_positions >= 0]
+    product_subcats = rollups['product']['subcategory_ids'][product_positions]
+    covered = (
+        np.isin(product_subcats, subcat_ids) |
+        np.isin(lookup(hierarchy['subcat_to_cat'], product_subcats), cat_ids) |
+        np.isin(lookup(hierarchy['subcat_to_dept'], product_subcats), dept_ids)
+    )
     
-    # Filter temporal data for selected products
-    filtered_temporal = temporal_quality[temporal_quality['product_id'].isin(selected_product_ids)]
+    node_positions = {'product': product_positions[~covered]}
+    for level, node_ids in (('department', dept_ids), ('category', cat_ids), ('subcategory', subcat_ids)):
+        positions = encode_ids(node_ids, rollups[level]['ids'])
+        node_positions[level] = positions[positions >= 0]
+    return node_positions
+
+def sum_selection_rollups(selection, rollups):
+    """Answer a tree selection by summing the rollups of its topmost selected nodes"""
+    node_positions = select_rollup_nodes(selection, rollups)
+    product_counts = rollups['product']['cube'][node_positions.pop('product')].sum(axis=0)
+    counts = regroup_periods(product_counts, rollups.get('run_starts'), axis=0)
+    for level, positions in node_positions.items():
+        counts += rollups[level]['cube'][positions].sum(axis=0)
+    return counts
+
+def merge_selection_sketches(selection, price_sketches, period_window=slice(None)):
+    """Merge the sparse sketches of a selection's topmost nodes over a period window into one sketch"""
+    entries = [gather_sketch_entries(price_sketches[level]['sketch'], positions)
+               for level, positions in select_rollup_nodes(selection, price_sketches).items()]
+    periods, buckets, counts = (np.concatenate(parts) for parts in zip(*entries))
+    
+    # Re-index the window's periods from zero and add up matching (period, bucket) entries
+    window = range(len(price_sketches['periods']))[period_window]
+    in_window = (periods >= window.start) & (periods < window.stop)
+    merged = build_sparse_sketch(np.zeros(int(in_window.sum()), dtype=np.int64), periods[in_window] - window.start,
+                                 buckets[in_window], counts[in_window], 1, len(window), price_sketches['n_buckets'])
+    return merged, len(window)
+
+def compute_selection_aggregate(selection, rollups, period_window=slice(None), price_sketches=None):
+    """Aggregate temporal quality for a selection once, for every chart, metric and insight"""
+    product_ids = np.asarray(selection['relevant_product_ids'])
+    
+    # Quality distribution for each time period in the window from the hierarchy rollups
+    counts = sum_selection_rollups(selection, rollups)[period_window]
+    period_quality_counts = rollups['periods'].iloc[period_window].copy()
+    for quality_index, quality in enumerate(FACET_QUALITIES):
+        period_quality_counts[quality] = counts[:, quality_index]
+    
+    # Price percentiles from the merged sketches of the same nodes
+    price_quantiles = None
+    if price_sketches is not None:
+        merged_sketch, n_window_periods = merge_selection_sketches(selection, price_sketches, period_window)
+        estimates, totals = estimate_sketch_quantiles(merged_sketch, n_window_periods, price_sketches['key_offset'])
+        price_quantiles = price_sketches['periods'].iloc[period_window][['period_index', 'period_name']].copy()
+        for quantile_index, quantile in enumerate(PRICE_QUANTILES):
+            price_quantiles[f"p{int(quantile * 100)}"] = estimates[:, quantile_index]
+        price_quantiles = price_quantiles[totals > 0].reset_index(drop=True)
+    
+    # Keep only periods with data for this selection
+    period_quality_counts = period_quality_counts[counts.sum(axis=1) > 0].reset_index(drop=True)
+    
+    # Stable fingerprint of the selection and time view for figure caching
+    fingerprint_hash = hashlib.blake2b(
+        np.ascontiguousarray(product_ids, dtype=np.int64).tobytes(), digest_size=16
+    )
+    fingerprint_hash.update(f"{rollups.get('granularity')}|{period_window.start}|{period_window.stop}".encode())
+    selection_fingerprint = fingerprint_hash.hexdigest()
+    
+    # Latest period counts back the "Current Good Quality" metric
+    latest_counts = {}
+    latest_period_name = None
+    if len(period_quality_counts) > 0:
+        latest_row = period_quality_counts.iloc[-1]
+        latest_period_name = latest_row['period_name']
+        latest_counts = {quality: int(latest_row.get(quality, 0)) for quality in FACET_QUALITIES}
+    
+    return {
+        'product_ids': product_ids,
+        'fingerprint': selection_fingerprint,
+        'period_counts': period_quality_counts,
+        'price_quantiles': price_quantiles,
+        'latest_period_name': latest_period_name,
+        'latest_counts': latest_counts
+    }
+
+# Approximate mode: stratified sample of temporal rows by (subcategory, period)
+QUALITY_SAMPLE_FILE = "temporal_quality_sample.csv"
+APPROX_SAMPLE_FRACTION = 0.05
+APPROX_MIN_STRATUM_SAMPLE = 20
+APPROX_CONFIDENCE_Z = 1.96  # 95% confidence intervals
+
+def draw_stratified_sample(temporal_quality, fraction=APPROX_SAMPLE_FRACTION,
+                           min_per_stratum=APPROX_MIN_STRATUM_SAMPLE, seed=42):
+    """Draw a stratified random sample of temporal rows by (subcategory, period)"""
+    period_column = 'period_date' if 'period_date' in temporal_quality.columns else 'period_id'
+    stratum_codes = temporal_quality.groupby(['subcategory_id', period_column], sort=False).ngroup().to_numpy()
+    stratum_sizes = np.bincount(stratum_codes)
+    sample_sizes = np.minimum(
+        stratum_sizes, np.maximum(min_per_stratum, np.ceil(fraction * stratum_sizes).astype(np.int64))
+    )
     
-    if filtered_temporal.empty:
-        return None
+    # Random order within each stratum; keep the first sample_size rows of each
+    random_keys = np.random.default_rng(seed).random(len(stratum_codes))
+    order = np.lexsort((random_keys, stratum_codes))
+    sorted_codes = stratum_codes[order]
+    stratum_starts = np.searchsorted(sorted_codes, np.arange(len(stratum_sizes)))
+    rank_in_stratum = np.arange(len(order)) - stratum_starts[sorted_codes]
+    kept_rows = np.sort(order[rank_in_stratum < sample_sizes[sorted_codes]])
+    
+    sample = temporal_quality.iloc[kept_rows][['product_id', 'subcategory_id', period_column, 'quality']].copy()
+    sample['stratum_size'] = stratum_sizes[stratum_codes[kept_rows]]
+    sample['stratum_sample_size'] = sample_sizes[stratum_codes[kept_rows]]
+    return sample.reset_index(drop=True)
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_quality_sample(data_version):
+    """Load the stratified sample kept next to temporal_quality.csv, redrawing it when stale"""
+    data_path = Path("data")
+    sample_path = data_path / QUALITY_SAMPLE_FILE
+    temporal_path = data_path / "temporal_quality.csv"
     
-    # Calculate quality distribution for each time period
-    period_quality_counts = (
-        filtered_temporal.groupby(['period_index', 'period_name', 'quality'])
-        .size()
-        .unstack(fill_value=0)
-        .reset_index()
-        .sort_values('period_index')  # Sort by chronological order
+    if sample_path.exists() and sample_path.stat().st_mtime_ns >= temporal_path.stat().st_mtime_ns:
+        sample = pd.read_csv(sample_path)
+    else:
+        *_, temporal_quality = load_data()
+        sample = draw_stratified_sample(temporal_quality)
+        sample.to_csv(sample_path, index=False)
+    
+    # Encode strata once so each estimate is a few bincounts over the sample
+    period_column = 'period_date' if 'period_date' in sample.columns else 'period_id'
+    dimensions = encode_temporal_dimensions(pd.DataFrame({'id': sample['product_id'].unique()}), sample)
+    stratum_codes = sample.groupby(['subcategory_id', period_column], sort=False).ngroup().to_numpy()
+    first_rows = np.unique(stratum_codes, return_index=True)[1]
+    
+    return {
+        'product_ids': sample['product_id'].to_numpy(),
+        'quality_codes': pd.Categorical(sample['quality'], categories=FACET_QUALITIES).codes,
+        'stratum_codes': stratum_codes,
+        'stratum_sizes': sample['stratum_size'].to_numpy(dtype=float)[first_rows],
+        'stratum_sample_sizes': sample['stratum_sample_size'].to_numpy(dtype=float)[first_rows],
+        'stratum_periods': dimensions['period_codes'][first_rows],
+        'periods': dimensions['periods']
+    }
+
+def get_sample_periods(quality_sample, granularity):
+    """Period table of the sample at the given granularity"""
+    return get_period_runs(quality_sample['periods'], granularity)[1]
+
+def estimate_selection_aggregate(selection, quality_sample, granularity, period_window=slice(None)):
+    """Estimate a selection aggregate with 95% confidence intervals from the stratified sample"""
+    product_ids = np.asarray(selection['relevant_product_ids'])
+    n_strata, n_qualities = len(quality_sample['stratum_sizes']), len(FACET_QUALITIES)
+    
+    # Sampled rows in the selection, per stratum and quality
+    quality_codes = quality_sample['quality_codes']
+    in_selection = np.isin(quality_sample['product_ids'], product_ids) & (quality_codes >= 0)
+    hits = np.bincount(
+        quality_sample['stratum_codes'][in_selection] * n_qualities + quality_codes[in_selection],
+        minlength=n_strata * n_qualities
+    ).reshape(n_strata, n_qualities)
+    
+    # Stratified estimate of each count and its variance (with finite population correction)
+    population = quality_sample['stratum_sizes'][:, None]
+    sampled = quality_sample['stratum_sample_sizes'][:, None]
+    share = hits / sampled
+    sample_variance = np.where(sampled > 1, sampled / np.maximum(sampled - 1, 1) * share * (1 - share), 0.0)
+    stratum_estimates = population * share
+    stratum_variances = population ** 2 * (1 - sampled / population) * sample_variance / sampled
+    
+    # Strata are independent, so estimates and variances add up per period
+    n_source_periods = len(quality_sample['periods'])
+    estimates = np.zeros((n_source_periods, n_qualities))
+    variances = np.zeros((n_source_periods, n_qualities))
+    np.add.at(estimates, quality_sample['stratum_periods'], stratum_estimates)
+    np.add.at(variances, quality_sample['stratum_periods'], stratum_variances)
+    
+    run_starts, periods = get_period_runs(quality_sample['periods'], granularity)
+    if len(run_starts) > 0:
+        estimates = np.add.reduceat(estimates, run_starts, axis=0)
+        variances = np.add.reduceat(variances, run_starts, axis=0)
+    estimates, variances = estimates[period_window], variances[period_window]
+    
+    period_quality_counts = periods.iloc[period_window].copy()
+    confidence_intervals = periods.iloc[period_window][['period_index', 'period_name']].copy()
+    for quality_index, quality in enumerate(FACET_QUALITIES):
+        period_quality_counts[quality] = np.round(estimates[:, quality_index]).astype(np.int64)
+        confidence_intervals[quality] = APPROX_CONFIDENCE_Z * np.sqrt(variances[:, quality_index])
+    has_data = estimates.sum(axis=1) > 0
+    period_quality_counts = period_quality_counts[has_data].reset_index(drop=True)
+    confidence_intervals = confidence_intervals[has_data].reset_index(drop=True)
+    
+    fingerprint_hash = hashlib.blake2b(
+        np.ascontiguousarray(product_ids, dtype=np.int64).tobytes(), digest_size=16
     )
+    fingerprint_hash.update(f"approximate|{granularity}|{period_window.start}|{period_window.stop}".encode())
+    
+    latest_counts = {}
+    latest_period_name = None
+    if len(period_quality_counts) > 0:
+        latest_row = period_quality_counts.iloc[-1]
+        latest_period_name = latest_row['period_name']
+        latest_counts = {quality: int(latest_row[quality]) for quality in FACET_QUALITIES}
+    
+    return {
+        'product_ids': product_ids,
+        'fingerprint': fingerprint_hash.hexdigest(),
+        'period_counts': period_quality_counts,
+        'price_quantiles': None,
+        'confidence_intervals': confidence_intervals,
+        'latest_period_name': latest_period_name,
+        'latest_counts': latest_counts
+    }
+
+@st.cache_resource(show_spinner=False)
+def get_background_executor():
+    """Shared thread pool for background aggregation jobs"""
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix="exact-aggregate")
+
+def compute_exact_aggregate(data_version, granularity, selection, period_window):
+    """Compute the exact selection aggregate (used as a background job in approximate mode)"""
+    rollups = get_granular_rollups(data_version, granularity)
+    price_sketches = get_granular_price_sketches(data_version, granularity)
+    return compute_selection_aggregate(selection, rollups, period_window, price_sketches)
+
+def get_approximate_aggregate(selection, data_version, granularity, period_window, quality_sample):
+    """Return the exact aggregate once its background job finishes, else a sampled estimate and the job's future"""
+    job_key = (data_version, granularity, period_window.start, period_window.stop,
+               tuple(selection['relevant_product_ids']))
+    # A failed job stays in the session, so it is only resubmitted once the selection or time view changes
+    job = st.session_state.get('exact_aggregate_job')
+    if job is None or job['key'] != job_key:
+        job = {
+            'key': job_key,
+            'future': get_background_executor().submit(
+                compute_exact_aggregate, data_version, granularity, selection, period_window
+            )
+        }
+        st.session_state.exact_aggregate_job = job
+    
+    if job['future'].done() and job['future'].exception() is None:
+        return job['future'].result(), None
+    return estimate_selection_aggregate(selection, quality_sample, granularity, period_window), job['future']
+
+@st.fragment(run_every=1)
+def show_exact_aggregate_poller(exact_future):
+    """Poll the background exact aggregation and rerun the page once it finishes or fails"""
+    if exact_future.done():
+        st.rerun()
+    st.caption("⏳ Showing sampled estimates with 95% confidence intervals; exact results are computing in the background...")
+
+# Large-series rendering: beyond this many periods charts switch to WebGL lines
+# downsampled to a point budget bounded by the chart's pixel width
+LARGE_SERIES_PERIODS = 60
+MAX_CHART_POINTS = 400
+
+def lttb_indices(y, n_out):
+    """Pick n_out point indices with Largest-Triangle-Three-Buckets, keeping both endpoints"""
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    
+    # Inner points are split into n_out - 2 equal buckets; x is the point index
+    bucket_size = (n - 2) / (n_out - 2)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(n_out - 2):
+        start = int(bucket * bucket_size) + 1
+        stop = int((bucket + 1) * bucket_size) + 1
+        # Average of the next bucket is the third triangle vertex
+        next_stop = min(int((bucket + 2) * bucket_size) + 1, n)
+        next_x = (stop + next_stop - 1) / 2
+        next_y = y[stop:next_stop].mean()
+        candidates = np.arange(start, stop)
+        areas = np.abs((previous - next_x) * (y[candidates] - y[previous])
+                       - (previous - candidates) * (next_y - y[previous]))
+        previous = candidates[np.argmax(areas)]
+        selected[bucket + 1] = previous
+    return selected
+
+def downsample_series(frame, value_columns, max_points=MAX_CHART_POINTS):
+    """Downsample rows so every value column keeps its shape within a max_points budget"""
+    if len(frame) <= max_points:
+        return frame
+    
+    # Union of each column's LTTB picks, with the budget split across columns
+    points_per_column = max(3, max_points // len(value_columns))
+    kept = np.unique(np.concatenate([
+        lttb_indices(frame[column].to_numpy(), points_per_column) for column in value_columns
+    ]))
+    return frame.iloc[kept]
+
+def is_large_series(period_quality_counts):
+    """Whether a period series is long enough for the WebGL rendering mode"""
+    return len(period_quality_counts) > LARGE_SERIES_PERIODS
+
+def get_period_axis(period_quality_counts):
+    """Date axis for large series (keeps the x axis continuous after downsampling)"""
+    if 'period_start' in period_quality_counts.columns:
+        return period_quality_counts['period_start']
+    return period_quality_counts['period_name']
+
+def create_quality_waterfall_chart(selection_aggregate):
+    """Create a waterfall chart showing quality distribution changes over time"""
+    period_quality_counts = selection_aggregate['period_counts']
+    
+    if period_quality_counts.empty:
+        return None
     
-    # Calculate cumulative changes from the baseline
-    baseline_good = period_quality_counts.iloc[0]['good'] if 'good' in period_quality_counts.columns else 0
-    baseline_neutral = period_quality_counts.iloc[0]['neutral'] if 'neutral' in period_quality_counts.columns else 0
-    baseline_poor = period_quality_counts.iloc[0]['poor'] if 'poor' in period_quality_counts.columns else 0
+    # Period-over-period changes for all quality levels at once; the first period is the baseline
+    level_counts = period_quality_counts.reindex(columns=FACET_QUALITIES, fill_value=0)
+    
+    if is_large_series(period_quality_counts):
+        return create_large_series_waterfall_chart(period_quality_counts, level_counts)
+    
+    quality_changes = level_counts.diff()
+    quality_changes.iloc[0] = level_counts.iloc[0]
+    quality_changes = quality_changes.astype(int)
     
     # Prepare waterfall data
     periods = period_quality_counts['period_name'].tolist()
-    good_changes = []
-    neutral_changes = []
-    poor_changes = []
-    
-    for i, row in period_quality_counts.iterrows():
-        if i == 0:  # First period is baseline
-            good_changes.append(row.get('good', 0))
-            neutral_changes.append(row.get('neutral', 0))
-            poor_changes.append(row.get('poor', 0))
-        else:
-            prev_row = period_quality_counts.iloc[i-1]
-            good_changes.append(row.get('good', 0) - prev_row.get('good', 0))
-            neutral_changes.append(row.get('neutral', 0) - prev_row.get('neutral', 0))
-            poor_changes.append(row.get('poor', 0) - prev_row.get('poor', 0))
+    good_changes = quality_changes['good'].tolist()
     
     # Create the waterfall chart
     fig = go.Figure()
@@ -461,28 +1475,78 @@ def create_quality_waterfall_chart(selected_product_ids, temporal_quality):
     
     return fig
 
-def create_quality_distribution_chart(selected_product_ids, temporal_quality):
-    """Create a stacked bar chart showing quality distribution over time"""
-    if not selected_product_ids:
-        return None
-    
-    # Filter temporal data for selected products
-    filtered_temporal = temporal_quality[temporal_quality['product_id'].isin(selected_product_ids)]
-    
-    if filtered_temporal.empty:
-        return None
+def create_large_series_waterfall_chart(period_quality_counts, level_counts):
+    """Running good-quality level as a downsampled WebGL line, marked by direction of change"""
+    series = downsample_series(pd.DataFrame({
+        'period': get_period_axis(period_quality_counts).to_numpy(),
+        'period_name': period_quality_counts['period_name'].to_numpy(),
+        'good': level_counts['good'].to_numpy()
+    }), ['good'])
+    
+    # Changes between the kept points, so each marker still shows the net move it covers
+    changes = np.diff(series['good'].to_numpy(), prepend=0)
+    fig = go.Figure(go.Scattergl(
+        x=series['period'],
+        y=series['good'],
+        mode='lines+markers',
+        line=dict(color='rgb(63, 63, 63)', width=1),
+        marker=dict(size=5, color=np.where(changes >= 0, '#2E8B57', '#DC143C')),
+        customdata=np.column_stack([series['period_name'], changes]),
+        hovertemplate="%{customdata[0]}<br>Good: %{y}<br>Change: %{customdata[1]:+}<extra></extra>"
+    ))
     
-    # Calculate quality distribution for each time period
-    period_quality_counts = (
-        filtered_temporal.groupby(['period_index', 'period_name', 'quality'])
-        .size()
-        .unstack(fill_value=0)
-        .reset_index()
-        .sort_values('period_index')  # Sort by chronological order
+    fig.update_layout(
+        title=f"Good Quality Level Over Time ({len(period_quality_counts)} periods)",
+        title_x=0.5,
+        showlegend=False,
+        xaxis_title="Time Period",
+        yaxis_title="Good Quality Count",
+        font_size=12,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        height=400
     )
     
-    # Create stacked bar chart
+    return fig
+
+def create_large_series_distribution_chart(period_quality_counts, colors, confidence_intervals=None):
+    """Stacked quality areas as downsampled WebGL lines for long time axes"""
+    series = period_quality_counts.reindex(columns=FACET_QUALITIES, fill_value=0).astype(float)
+    series['period'] = get_period_axis(period_quality_counts).to_numpy()
+    series['period_name'] = period_quality_counts['period_name'].to_numpy()
+    if confidence_intervals is not None:
+        for quality in FACET_QUALITIES:
+            series[f"{quality}_ci"] = confidence_intervals[quality].to_numpy()
+    series = downsample_series(series, FACET_QUALITIES)
+    
+    # Scattergl has no stackgroup, so stack by plotting cumulative sums
     fig = go.Figure()
+    stacked = np.zeros(len(series))
+    for quality in FACET_QUALITIES:
+        stacked = stacked + series[quality].to_numpy()
+        error_y = None
+        if confidence_intervals is not None:
+            error_y = dict(type='data', array=series[f"{quality}_ci"], visible=True)
+        fig.add_trace(go.Scattergl(
+            name=quality.title(),
+            x=series['period'],
+            y=stacked,
+            mode='lines',
+            line=dict(color=colors[quality], width=1),
+            fill='tozeroy' if quality == FACET_QUALITIES[0] else 'tonexty',
+            fillcolor=colors[quality],
+            customdata=np.column_stack([series['period_name'], series[quality]]),
+            hovertemplate=f"%{{customdata[0]}}<br>{quality.title()}: %{{customdata[1]:,.0f}}<extra></extra>",
+            error_y=error_y
+        ))
+    return fig
+
+def create_quality_distribution_chart(selection_aggregate):
+    """Create a stacked bar chart showing quality distribution over time"""
+    period_quality_counts = selection_aggregate['period_counts']
+    
+    if period_quality_counts.empty:
+        return None
     
     colors = {
         'good': '#7CB9A8',      # Soft Seafoam Green
@@ -490,19 +1554,48 @@ def create_quality_distribution_chart(selected_product_ids, temporal_quality):
         'poor': '#D4827E'       # Soft Coral
     }
     
+    # Approximate aggregates carry 95% confidence intervals
+    confidence_intervals = selection_aggregate.get('confidence_intervals')
+    
+    title = "Quality Distribution Over Time (Selected Products)"
+    if confidence_intervals is not None:
+        title = "Estimated Quality Distribution Over Time (95% CI)"
+    
+    if is_large_series(period_quality_counts):
+        fig = create_large_series_distribution_chart(period_quality_counts, colors, confidence_intervals)
+        fig.update_layout(
+            title=title,
+            title_x=0.5,
+            xaxis_title="Time Period",
+            yaxis_title="Number of Products",
+            legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
+            font_size=12,
+            plot_bgcolor='rgba(0,0,0,0)',
+            paper_bgcolor='rgba(0,0,0,0)',
+            height=400
+        )
+        return fig
+    
+    # Create stacked bar chart
+    fig = go.Figure()
+    
     for quality in ['good', 'neutral', 'poor']:
         if quality in period_quality_counts.columns:
+            error_y = None
+            if confidence_intervals is not None:
+                error_y = dict(type='data', array=confidence_intervals[quality], visible=True)
             fig.add_trace(go.Bar(
                 name=quality.title(),
                 x=period_quality_counts['period_name'],
                 y=period_quality_counts[quality],
                 marker_color=colors[quality],
                 text=period_quality_counts[quality],
-                textposition='inside'
+                textposition='inside',
+                error_y=error_y
             ))
     
     fig.update_layout(
-        title="Quality Distribution Over Time (Selected Products)",
+        title=title,
         title_x=0.5,
         barmode='stack',
         xaxis_title="Time Period",
@@ -522,6 +1615,143 @@ def create_quality_distribution_chart(selected_product_ids, temporal_quality):
     
     return fig
 
+def create_price_band_chart(selection_aggregate):
+    """Create a line chart of price percentile bands over time"""
+    price_quantiles = selection_aggregate.get('price_quantiles')
+    if price_quantiles is None or price_quantiles.empty:
+        return None
+    
+    fig = go.Figure()
+    
+    # Shaded p10-p90 and p25-p75 bands with the median on top
+    for lower, upper, fill_color in (('p10', 'p90', 'rgba(124, 185, 168, 0.2)'),
+                                     ('p25', 'p75', 'rgba(124, 185, 168, 0.4)')):
+        fig.add_trace(go.Scatter(
+            x=price_quantiles['period_name'], y=price_quantiles[upper],
+            mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'
+        ))
+        fig.add_trace(go.Scatter(
+            x=price_quantiles['period_name'], y=price_quantiles[lower],
+            mode='lines', line=dict(width=0), fill='tonexty', fillcolor=fill_color,
+            name=f"{lower.upper()}-{upper.upper()}"
+        ))
+    
+    fig.add_trace(go.Scatter(
+        x=price_quantiles['period_name'], y=price_quantiles['p50'],
+        mode='lines+markers', name="Median", line=dict(color='#2E8B57', width=2)
+    ))
+    
+    fig.update_layout(
+        title="Price Distribution Over Time (Selected Products)",
+        title_x=0.5,
+        xaxis_title="Time Period",
+        yaxis_title="Price ($)",
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        font_size=12,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        height=400
+    )
+    
+    return fig
+
+# Chart builders that take a selection aggregate, by chart type
+QUALITY_CHART_BUILDERS = {
+    'distribution': create_quality_distribution_chart,
+    'waterfall': create_quality_waterfall_chart,
+    'price_bands': create_price_band_chart
+}
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def get_quality_chart_spec(chart_type, selection_fingerprint, data_version, _selection_aggregate):
+    """Build a quality chart once per (selection, data version, chart type) and memoize its spec"""
+    fig = QUALITY_CHART_BUILDERS[chart_type](_selection_aggregate)
+    return fig.to_dict() if fig else None
+
+# Comparison groups saved from tree selections
+MAX_COMPARISON_GROUPS = 8
+COMPARISON_COLORS = px.colors.qualitative.Set2
+
+def compute_comparison_aggregates(groups, rollups, period_window=slice(None)):
+    """Aggregate every comparison group in one batched pass over the product cube"""
+    product_ids = rollups['product']['ids']
+    periods = rollups['periods'].iloc[period_window]
+    if not groups:
+        return pd.DataFrame(columns=['group', 'period_name', 'period_start', 'total', 'good_share'])
+    
+    # Group membership matrix; a product may belong to several groups
+    group_codes = np.concatenate([np.full(len(group['product_ids']), g) for g, group in enumerate(groups)])
+    positions = encode_ids(np.concatenate([np.asarray(group['product_ids']) for group in groups]), product_ids)
+    membership = np.zeros((len(groups), len(product_ids)), dtype=np.int64)
+    membership[group_codes[positions >= 0], positions[positions >= 0]] = 1
+    
+    # (groups x products) . (products x source periods x qualities), then regrouped into the window's periods
+    counts = np.tensordot(membership, rollups['product']['cube'], axes=1)
+    counts = regroup_periods(counts, rollups['run_starts'])[:, period_window]
+    totals = counts.sum(axis=2)
+    good_index = FACET_QUALITIES.index('good')
+    good_shares = np.divide(counts[:, :, good_index], totals,
+                            out=np.full(totals.shape, np.nan), where=totals > 0)
+    
+    n_groups, n_periods = totals.shape
+    return pd.DataFrame({
+        'group': np.repeat([group['name'] for group in groups], n_periods),
+        'period_name': np.tile(periods['period_name'].to_numpy(), n_groups),
+        'period_start': np.tile(periods['period_start'].to_numpy(), n_groups),
+        'total': totals.ravel(),
+        'good_share': good_shares.ravel()
+    })
+
+def create_comparison_chart(comparison):
+    """Create a line chart of the good-quality share of each comparison group over time"""
+    if comparison.empty:
+        return None
+    
+    fig = go.Figure()
+    large_series = comparison['period_name'].nunique() > LARGE_SERIES_PERIODS
+    for group_index, (group_name, group_periods) in enumerate(comparison.groupby('group', sort=False)):
+        group_periods = group_periods[group_periods['total'] > 0]
+        color = COMPARISON_COLORS[group_index % len(COMPARISON_COLORS)]
+        if large_series:
+            group_periods = downsample_series(group_periods, ['good_share'])
+            trace_type, x = go.Scattergl, group_periods['period_start']
+        else:
+            trace_type, x = go.Scatter, group_periods['period_name']
+        fig.add_trace(trace_type(
+            name=group_name,
+            x=x,
+            y=group_periods['good_share'],
+            mode='lines' if large_series else 'lines+markers',
+            line=dict(color=color, width=2)
+        ))
+    
+    fig.update_layout(
+        title="Good Quality Share by Comparison Group",
+        title_x=0.5,
+        xaxis_title="Time Period",
+        yaxis_title="Good Quality Share",
+        yaxis_tickformat='.0%',
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        font_size=12,
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        height=400
+    )
+    
+    return fig
+
 def get_status_indicator(status):
     """Get emoji indicator for product status"""
     status_indicators = {
@@ -563,82 +1793,1357 @@ def filter_selected_products_by_status(product_ids, products_df):
     
     return status_breakdown
 
-def bulk_update_product_status(product_ids, new_status, reviewed_by="Manager", review_reason="Bulk operation"):
-    """Update product status for multiple products"""
-    import pandas as pd
-    from datetime import datetime
-    
-    # Load current products
-    products_df = pd.read_csv('data/products.csv')
-    
-    # Update status for selected products
-    mask = products_df['id'].isin(product_ids)
-    products_df.loc[mask, 'status'] = new_status
-    products_df.loc[mask, 'reviewed_by'] = reviewed_by
-    products_df.loc[mask, 'review_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Save updated products
-    products_df.to_csv('data/products.csv', index=False)
-    
-    return len(product_ids)
+# Approval history queries: sorted key indexes over the append-only log the engine writes
+def build_history_key_index(keys):
+    """Sort one history column for seeks, in the range-filter index layout"""
+    order = np.argsort(keys, kind='stable')
+    return {'sorted_values': keys[order], 'order': order}
 
-def validate_category_path(dept_id, cat_id, subcat_id, departments, categories, subcategories):
-    """Validate that the category hierarchy path is valid"""
-    try:
-        # Check if department exists
-        if dept_id not in departments['id'].values:
-            return False
-            
-        # Check if category exists and belongs to department
-        cat_row = categories[categories['id'] == cat_id]
-        if len(cat_row) == 0 or cat_row['department_id'].iloc[0] != dept_id:
-            return False
-            
-        # Check if subcategory exists and belongs to category
-        subcat_row = subcategories[subcategories['id'] == subcat_id]
-        if len(subcat_row) == 0 or subcat_row['category_id'].iloc[0] != cat_id:
-            return False
-            
-        return True
-    except:
-        return False
+def merge_history_key_index(key_index, new_keys, row_offset):
+    """Merge newly appended rows into a sorted key index without re-sorting old rows"""
+    new_order = np.argsort(new_keys, kind='stable')
+    new_sorted = new_keys[new_order]
+    # New rows go after equal old keys, so append order is kept within each key
+    insert_at = np.searchsorted(key_index['sorted_values'], new_sorted, side='right')
+    # Widen fixed-width string keys so longer new keys are not truncated
+    sorted_values = key_index['sorted_values'].astype(np.result_type(key_index['sorted_values'], new_sorted), copy=False)
+    return {
+        'sorted_values': np.insert(sorted_values, insert_at, new_sorted),
+        'order': np.insert(key_index['order'], insert_at, new_order + row_offset)
+    }
 
-def get_product_hierarchy_path(product_id, products, subcategories, categories, departments):
-    """Get the full hierarchy path for a product"""
-    try:
-        product = products[products['id'] == product_id].iloc[0]
-        subcat = subcategories[subcategories['id'] == product['subcategory_id']].iloc[0]
-        cat = categories[categories['id'] == subcat['category_id']].iloc[0]
-        dept = departments[departments['id'] == cat['department_id']].iloc[0]
+def empty_history_state():
+    """Index state before any history rows have been read"""
+    return {'offset': 0, 'history': pd.DataFrame(columns=HISTORY_COLUMNS), 'by_product': None,
+            'by_actor': None, 'review_dates': np.array([], dtype='datetime64[s]')}
+
+@st.cache_resource(show_spinner=False)
+def get_approval_history_index(history_path=DATA_DIR / HISTORY_FILE):
+    """Shared in-memory history with sorted indexes; refreshed by reading only the appended tail"""
+    return {'lock': threading.Lock(), 'path': history_path, **empty_history_state()}
+
+def refresh_approval_history_index(history_index):
+    """Read rows appended since the last refresh and merge them into the indexes"""
+    history_path = history_index['path']
+    with history_index['lock']:
+        size = history_path.stat().st_size if history_path.exists() else 0
+        if size < history_index['offset']:
+            # The log was replaced rather than appended to; start over
+            history_index.update(empty_history_state())
+        if size == history_index['offset']:
+            return history_index
         
-        return f"{dept['name']} > {cat['name']} > {subcat['name']}"
-    except:
-        return "Unknown"
+        with open(history_path, 'rb') as history_file:
+            history_file.seek(history_index['offset'])
+            tail_bytes = history_file.read(size - history_index['offset'])
+        # Only consume complete lines; a concurrent writer may be mid-row
+        complete_bytes = tail_bytes[:tail_bytes.rfind(b'\n') + 1]
+        if not complete_bytes:
+            return history_index
+        tail = pd.read_csv(io.BytesIO(complete_bytes), dtype=HISTORY_DTYPES,
+                           header=0 if history_index['offset'] == 0 else None,
+                           names=None if history_index['offset'] == 0 else HISTORY_COLUMNS)
+        
+        row_offset = len(history_index['history'])
+        product_keys = tail['product_id'].to_numpy(dtype=np.int64)
+        actor_keys = tail['reviewed_by'].fillna("").to_numpy(dtype=str)
+        if history_index['by_product'] is None:
+            history_index['by_product'] = build_history_key_index(product_keys)
+            history_index['by_actor'] = build_history_key_index(actor_keys)
+        else:
+            history_index['by_product'] = merge_history_key_index(history_index['by_product'], product_keys, row_offset)
+            history_index['by_actor'] = merge_history_key_index(history_index['by_actor'], actor_keys, row_offset)
+        
+        # Rows are appended in time order, so review dates are already sorted
+        history_index['review_dates'] = np.concatenate([
+            history_index['review_dates'],
+            pd.to_datetime(tail['review_date']).to_numpy(dtype='datetime64[s]')
+        ])
+        history_index['history'] = pd.concat([history_index['history'], tail], ignore_index=True) \
+            if row_offset > 0 else tail
+        history_index['offset'] += len(complete_bytes)
+    return history_index
 
-def bulk_approve_and_move(product_ids, new_subcategory_id, reviewed_by="Manager"):
-    """Approve products and move them to new subcategory"""
-    import pandas as pd
-    from datetime import datetime
-    
-    # Load current products
-    products_df = pd.read_csv('data/products.csv')
-    
-    # Update both status and subcategory for selected products
-    mask = products_df['id'].isin(product_ids)
-    products_df.loc[mask, 'status'] = 'approved'
-    products_df.loc[mask, 'subcategory_id'] = new_subcategory_id
-    products_df.loc[mask, 'reviewed_by'] = reviewed_by
-    products_df.loc[mask, 'review_date'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    
-    # Save updated products
-    products_df.to_csv('data/products.csv', index=False)
+def query_history_by_products(history_index, product_ids):
+    """History rows of the given products, oldest first"""
+    key_index = history_index['by_product']
+    if key_index is None:
+        return history_index['history'].iloc[:0]
+    product_ids = np.unique(np.asarray(product_ids, dtype=np.int64))
+    starts = np.searchsorted(key_index['sorted_values'], product_ids, side='left')
+    ends = np.searchsorted(key_index['sorted_values'], product_ids, side='right')
+    
+    # Concatenate each product's slice of the sort permutation
+    lengths = ends - starts
+    positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+    rows = np.sort(key_index['order'][positions])
+    return history_index['history'].iloc[rows]
+
+def query_history_by_actor(history_index, reviewed_by, start_date=None, end_date=None):
+    """History rows recorded by one reviewer, optionally within [start_date, end_date]"""
+    key_index = history_index['by_actor']
+    if key_index is None:
+        return history_index['history'].iloc[:0]
+    rows = np.sort(query_sorted_range(key_index, reviewed_by, reviewed_by))
+    if start_date is not None or end_date is not None:
+        # Append order is time order, so the window is a contiguous range of rows
+        window = query_history_time_window(history_index, start_date, end_date)
+        rows = rows[(rows >= window.start) & (rows < window.stop)]
+    return history_index['history'].iloc[rows]
+
+def query_history_time_window(history_index, start_date=None, end_date=None):
+    """Row slice of history recorded within [start_date, end_date] (dates inclusive)"""
+    review_dates = history_index['review_dates']
+    start = 0 if start_date is None else np.searchsorted(
+        review_dates, np.datetime64(pd.Timestamp(start_date)), side='left')
+    end = len(review_dates) if end_date is None else np.searchsorted(
+        review_dates, np.datetime64(pd.Timestamp(end_date) + pd.Timedelta(days=1)), side='left')
+    return slice(start, end)
+
+# Decision analytics: the engine keeps the counters in step with every commit; pages only read them
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_decision_analytics(products_version):
+    """Read the small counters table once per committed products version"""
+    if "+" in products_version:
+        # products.csv was rewritten outside a commit, so the running counters are rebuilt from it
+        with products_file_lock():
+            (DATA_DIR / DECISION_ANALYTICS_FILE).unlink(missing_ok=True)
+            return read_decision_analytics()
+    return read_decision_analytics()
+
+def summarize_decisions(analytics, key):
+    """Roll the counters up to one key with approval rate and mean time-to-decision"""
+    summary = analytics.groupby(key)[DECISION_ANALYTICS_COUNTERS].sum()
+    decisions = summary['approved'] + summary['rejected']
+    summary['decisions'] = decisions
+    summary['approval_rate'] = (summary['approved'] / decisions.where(decisions > 0)).round(3)
+    summary['avg_hours_to_decision'] = (summary['decision_seconds'] / 3600 /
+                                        summary['timed_decisions'].where(summary['timed_decisions'] > 0)).round(1)
+    return summary.drop(columns=['decision_seconds', 'timed_decisions']).sort_values('decisions', ascending=False)
+
+def show_decision_analytics(analytics, subcategories):
+    """Approval rate and time-to-decision by reviewer, source and subcategory"""
+    with st.expander("📈 Decision Analytics"):
+        if len(analytics) == 0:
+            st.info("No approval or rejection decisions yet.")
+            return
+        
+        by_subcategory = summarize_decisions(analytics, 'subcategory_id')
+        by_subcategory.index = by_subcategory.index.map(subcategories.set_index('id')['name']).fillna("Unknown")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.markdown("**By reviewer**")
+            st.dataframe(summarize_decisions(analytics, 'reviewed_by'), use_container_width=True)
+        with col2:
+            st.markdown("**By source**")
+            st.dataframe(summarize_decisions(analytics, 'recommendation_source'), use_container_width=True)
+        with col3:
+            st.markdown("**By subcategory**")
+            st.dataframe(by_subcategory, use_container_width=True)
+        
+        st.markdown("**Decisions per day**")
+        by_day = summarize_decisions(analytics[analytics['review_day'] != "Unknown"], 'review_day').sort_index()
+        if len(by_day) > 0:
+            st.bar_chart(by_day[['approved', 'rejected']])
+
+# Auto-triage: ordered declarative rules over the recommended queue; the first matching rule decides
+TRIAGE_RULES_PATH = Path("data") / "triage_rules.json"
+TRIAGE_DECISIONS = ['approved', 'rejected']
+DEFAULT_TRIAGE_RULES = [
+    {"name": "Persistently poor quality", "decision": "rejected",
+     "conditions": {"min_poor_streak": 3}},
+    {"name": "Fair price and good quality", "decision": "approved",
+     "conditions": {"max_price_deviation": 0.2, "quality": ["good"]}}
+]
+
+def load_triage_rules(rules_path=TRIAGE_RULES_PATH):
+    """Load the rule list, falling back to the defaults"""
+    if not rules_path.exists():
+        return DEFAULT_TRIAGE_RULES
+    with open(rules_path) as rules_file:
+        return json.load(rules_file)
+
+def save_triage_rules(rules, rules_path=TRIAGE_RULES_PATH):
+    """Validate and store the rule list"""
+    validate_triage_rules(rules)
+    with open(rules_path, 'w') as rules_file:
+        json.dump(rules, rules_file, indent=2)
+
+def validate_triage_rules(rules):
+    """Raise ValueError for rules the engine cannot evaluate"""
+    if not isinstance(rules, list):
+        raise ValueError("Rules must be a list")
+    for position, rule in enumerate(rules, start=1):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule {position} must be an object")
+        name = rule.get('name')
+        if not isinstance(name, str) or not name.strip():
+            raise ValueError(f"Rule {position}: name must be a non-empty string")
+        if rule.get('decision') not in TRIAGE_DECISIONS:
+            raise ValueError(f"Rule {name!r}: decision must be one of {TRIAGE_DECISIONS}")
+        conditions = rule.get('conditions', {})
+        if not isinstance(conditions, dict):
+            raise ValueError(f"Rule {name!r}: conditions must be an object")
+        unknown = set(conditions) - set(TRIAGE_CONDITIONS)
+        if unknown:
+            raise ValueError(f"Rule {name!r}: unknown conditions {sorted(unknown)}")
+        
+        # List conditions match column values; the others are numeric thresholds
+        for condition, value in conditions.items():
+            if condition in TRIAGE_LIST_CONDITIONS:
+                if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+                    raise ValueError(f"Rule {name!r}: {condition} must be a list of strings")
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f"Rule {name!r}: {condition} must be a number")
+
+def compute_triage_features(products, product_cube, cube_product_ids):
+    """Per-product inputs to the rule conditions, aligned with products"""
+    # Price deviation from the median approved price of the product's subcategory
+    approved = products[products['status'] == 'approved']
+    subcategory_medians = approved.groupby('subcategory_id')['price'].median()
+    median_price = products['subcategory_id'].map(subcategory_medians).to_numpy(dtype=float)
+    price_deviation = np.abs(products['price'].to_numpy(dtype=float) / median_price - 1)
+    
+    # Number of latest consecutive periods in which poor is the majority quality
+    poor_majority = product_cube[:, :, FACET_QUALITIES.index('poor')] * 2 > product_cube.sum(axis=2)
+    poor_streaks = np.cumprod(poor_majority[:, ::-1], axis=1).sum(axis=1)
+    positions = encode_ids(products['id'].to_numpy(), cube_product_ids)
+    
+    return pd.DataFrame({
+        'price_deviation': price_deviation,
+        'poor_streak': np.where(positions >= 0, poor_streaks[np.maximum(positions, 0)], 0)
+    }, index=products.index)
+
+# Each condition maps (products, features, rule value) to a boolean mask
+TRIAGE_CONDITIONS = {
+    'quality': lambda products, features, values: products['quality'].isin(values).to_numpy(),
+    'recommendation_source': lambda products, features, values: products['recommendation_source'].isin(values).to_numpy(),
+    'max_price_deviation': lambda products, features, value: (features['price_deviation'] <= value).to_numpy(),
+    'min_poor_streak': lambda products, features, value: (features['poor_streak'] >= value).to_numpy(),
+    'min_stock_quantity': lambda products, features, value: (products['stock_quantity'] >= value).to_numpy()
+}
+TRIAGE_LIST_CONDITIONS = ['quality', 'recommendation_source']
+
+def evaluate_triage_rules(rules, products, features):
+    """Propose a decision for every recommended product in one pass; the first matching rule wins"""
+    validate_triage_rules(rules)
+    recommended = (products['status'] == 'recommended').to_numpy()
+    undecided = recommended.copy()
+    rule_index = np.full(len(products), -1)
+    
+    for index, rule in enumerate(rules):
+        matches = undecided.copy()
+        for condition, value in rule.get('conditions', {}).items():
+            matches &= TRIAGE_CONDITIONS[condition](products, features, value)
+        rule_index[matches] = index
+        undecided &= ~matches
+    
+    decided = rule_index >= 0
+    rule_names = np.array([rule['name'] for rule in rules] or [""], dtype=object)
+    decisions = np.array([rule['decision'] for rule in rules] or [""], dtype=object)
+    return pd.DataFrame({
+        'id': products['id'].to_numpy()[decided],
+        'name': products['name'].to_numpy()[decided],
+        'decision': decisions[rule_index[decided]],
+        'rule': rule_names[rule_index[decided]],
+        'price_deviation': features['price_deviation'].to_numpy()[decided],
+        'poor_streak': features['poor_streak'].to_numpy()[decided]
+    })
+
+# Background bulk jobs: a bounded pool, a product lock table and one commit at a time
+BULK_JOB_WORKERS = 2
+BULK_JOB_HISTORY = 100  # finished jobs kept for status lookups
+
+@st.cache_resource(show_spinner=False)
+def get_bulk_job_runner():
+    """Shared worker pool and lock tables for bulk operations across sessions"""
+    return {
+        'executor': ThreadPoolExecutor(max_workers=BULK_JOB_WORKERS, thread_name_prefix="bulk-job"),
+        'jobs': {},
+        'next_job_id': itertools.count(1),
+        'lock': threading.Lock(),  # guards jobs and locked_products
+        'locked_products': set(),  # products of queued and running jobs, so concurrent merges never overlap
+        'commit_lock': threading.Lock()  # products.csv is rewritten whole, so commits are serialized
+    }
+
+def submit_bulk_job(runner, description, product_ids, operation, on_commit=None, **operation_kwargs):
+    """Queue a bulk operation; returns its job id, or None if another job holds any of the products"""
+    # Operations get the ids in submitted order, so per-product arguments parallel to them stay aligned
+    submitted_ids = [int(product_id) for product_id in product_ids]
+    product_ids = set(submitted_ids)
+    with runner['lock']:
+        if runner['locked_products'] & product_ids:
+            return None
+        runner['locked_products'] |= product_ids
+        
+        # Forget the oldest finished jobs
+        finished_ids = [job_id for job_id, job in runner['jobs'].items() if job['status'] in ('committed', 'failed')]
+        for job_id in finished_ids[:max(0, len(finished_ids) - BULK_JOB_HISTORY)]:
+            del runner['jobs'][job_id]
+        
+        job = {'id': next(runner['next_job_id']), 'description': description, 'status': 'queued',
+               'progress': 0.0, 'message': "Queued", 'product_ids': product_ids, 'result': None, 'error': None,
+               'submitted_ids': submitted_ids}
+        runner['jobs'][job['id']] = job
+    runner['executor'].submit(run_bulk_job, runner, job, operation, operation_kwargs, on_commit)
+    return job['id']
+
+def run_bulk_job(runner, job, operation, operation_kwargs, on_commit=None):
+    """Worker body: prepare the change unlocked, merge and write it under the commit lock, release the products"""
+    def report(progress, message):
+        job['progress'], job['message'] = progress, message
     
-    return len(product_ids)
+    try:
+        job['status'] = 'running'
+        # Reading, validating and computing rows needs no lock, so jobs on disjoint products overlap here
+        change = operation(job['submitted_ids'], progress_callback=report, commit=False, **operation_kwargs)
+        report(0.5, "Waiting for other commits")
+        with runner['commit_lock'], products_file_lock(change['data_dir']):
+            job['result'] = commit_product_changes(change, report)
+            # The submitter drops its pending copies of these rows now rather than on its next poll
+            if on_commit is not None:
+                on_commit(job['result'])
+        report(1.0, "Committed")
+        job['status'] = 'committed'
+    except Exception as error:
+        job['error'] = str(error)
+        job['status'] = 'failed'
+    finally:
+        with runner['lock']:
+            runner['locked_products'] -= job['product_ids']
 
-def show_tree_hierarchy():
+def start_bulk_job(description, product_ids, operation, **operation_kwargs):
+    """Submit a bulk job for this session and track it for progress polling"""
+    job_id = submit_bulk_job(get_bulk_job_runner(), description, product_ids, operation, **operation_kwargs)
+    if job_id is None:
+        st.error("⏳ Some of these products are already being updated by another job. Try again when it finishes.")
+        return None
+    st.session_state.setdefault('bulk_jobs', []).append(job_id)
+    return job_id
+
+@st.fragment(run_every=1)
+def show_bulk_job_progress():
+    """Poll this session's bulk jobs; rerun the whole page once any of them commits"""
+    jobs = get_bulk_job_runner()['jobs']
+    pending, finished = [], []
+    for job_id in st.session_state.get('bulk_jobs', []):
+        job = jobs.get(job_id)
+        if job is not None and job['status'] in ('queued', 'running'):
+            pending.append(job_id)
+            st.progress(job['progress'], text=f"Job #{job_id}: {job['description']} · {job['message']}")
+        elif job is not None:
+            finished.append(job)
+    
+    if finished:
+        # Notices are shown by the bulk operations panel after the page reloads the data
+        st.session_state.bulk_jobs = pending
+        st.session_state.setdefault('bulk_job_notices', []).extend(finished)
+        st.rerun()
+
+def build_subcategory_nodes(subcat_products, anomaly_product_ids=frozenset()):
+    """Product nodes of one subcategory with its (total, recommended, anomaly) counts"""
+    product_nodes = []
+    
+    # Add individual products as children of subcategory with status indicators
+    for _, product in subcat_products.iterrows():
+        # Get status indicator emoji
+        status_emoji = get_status_indicator(product['status'])
+        
+        # Create product label with status indicator
+        if product['status'] == 'recommended':
+            label = f"{status_emoji} {product['name']} - ${product['price']:.2f} (RECOMMENDED)"
+        elif product['status'] == 'rejected':
+            label = f"{status_emoji} {product['name']} - ${product['price']:.2f} (REJECTED)"
+        else:  # approved
+            label = f"{status_emoji} {product['name']} - ${product['price']:.2f}"
+        
+        if product['id'] in anomaly_product_ids:
+            label = f"{label} ⚠️"
+        
+        product_nodes.append({
+            "label": label,
+            "value": f"product_{product['id']}"
+        })
+    
+    counts = (len(subcat_products), int((subcat_products['status'] == 'recommended').sum()),
+              int(subcat_products['id'].isin(anomaly_product_ids).sum()))
+    return product_nodes, counts
+
+def assemble_tree_nodes(departments, categories, subcategories, subcat_nodes):
+    """Department, category and subcategory levels over prebuilt product nodes ({subcategory id: (nodes, counts)})"""
+    tree_nodes = []
+    
+    for _, dept in departments.iterrows():
+        dept_children, dept_count, dept_recommended_count = [], 0, 0
+        
+        for _, cat in categories[categories['department_id'] == dept['id']].iterrows():
+            cat_children, cat_count, cat_recommended_count = [], 0, 0
+            
+            for _, subcat in subcategories[subcategories['category_id'] == cat['id']].iterrows():
+                product_nodes, (subcat_count, subcat_recommended_count, subcat_anomaly_count) = \
+                    subcat_nodes.get(subcat['id'], ([], (0, 0, 0)))
+                
+                # Only add subcategory if it has products
+                if subcat_count == 0:
+                    continue
+                
+                # Badge subcategories holding products with recent quality anomalies
+                subcat_label = create_count_label(subcat['name'], subcat_count, subcat_recommended_count)
+                if subcat_anomaly_count > 0:
+                    subcat_label = f"{subcat_label} ⚠️ {subcat_anomaly_count}"
+                
+                cat_children.append({
+                    "label": subcat_label,
+                    "value": f"subcat_{subcat['id']}",
+                    "children": product_nodes
+                })
+                cat_count += subcat_count
+                cat_recommended_count += subcat_recommended_count
+            
+            # Only add category if it has products
+            if cat_count > 0:
+                dept_children.append({
+                    "label": create_count_label(cat['name'], cat_count, cat_recommended_count),
+                    "value": f"cat_{cat['id']}",
+                    "children": cat_children
+                })
+                dept_count += cat_count
+                dept_recommended_count += cat_recommended_count
+        
+        # Only add department if it has products
+        if dept_count > 0:
+            tree_nodes.append({
+                "label": create_count_label(dept['name'], dept_count, dept_recommended_count),
+                "value": f"dept_{dept['id']}",
+                "children": dept_children
+            })
+    
+    return tree_nodes
+
+def build_tree_nodes(departments, categories, subcategories, filtered_products, anomaly_product_ids=frozenset()):
+    """Build tree structure for streamlit-tree-select"""
+    subcat_nodes = {subcat_id: build_subcategory_nodes(subcat_products, anomaly_product_ids)
+                    for subcat_id, subcat_products in filtered_products.groupby('subcategory_id', sort=False)}
+    return assemble_tree_nodes(departments, categories, subcategories, subcat_nodes)
+
+def filter_tree_products(products, show_recommended, show_rejected, show_approved, anomalies_only=False):
+    """Products the tree shows for the status filters, and the ids it badges as anomalous"""
+    filtered_products = filter_products_by_status(
+        products,
+        show_recommended=show_recommended,
+        show_rejected=show_rejected,
+        show_approved=show_approved
+    )
+    
+    # Products flagged by the anomaly pass in the latest periods get a badge (or are the only ones shown)
+    placement_version = get_data_version(PLACEMENT_SCOPE)
+    anomaly_product_ids = get_recent_anomaly_product_ids(
+        load_quality_anomalies(placement_version), len(build_quality_rollups(placement_version)['periods'])
+    )
+    if anomalies_only:
+        filtered_products = filtered_products[filtered_products['id'].isin(anomaly_product_ids)]
+    return filtered_products, anomaly_product_ids
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def get_subcategory_nodes(data_version, show_recommended, show_rejected, show_approved, anomalies_only=False):
+    """Build product nodes per subcategory once per data version and status filter combination"""
+    products = load_data()[3]
+    filtered_products, anomaly_product_ids = filter_tree_products(
+        products, show_recommended, show_rejected, show_approved, anomalies_only
+    )
+    return {subcat_id: build_subcategory_nodes(subcat_products, anomaly_product_ids)
+            for subcat_id, subcat_products in filtered_products.groupby('subcategory_id', sort=False)}
+
+def get_tree_nodes(data_version, show_recommended, show_rejected, show_approved, anomalies_only=False,
+                   overlay_statuses=None):
+    """Tree nodes for the saved data; unsaved review decisions only rebuild the subcategories they touch"""
+    departments, categories, subcategories, products, _ = load_data()
+    subcat_nodes = get_subcategory_nodes(data_version, show_recommended, show_rejected, show_approved, anomalies_only)
+    
+    if overlay_statuses:
+        touched_ids = products.loc[products['id'].isin(list(overlay_statuses)), 'subcategory_id'].unique()
+        touched_products = apply_status_overlay(products[products['subcategory_id'].isin(touched_ids)], overlay_statuses)
+        filtered_products, anomaly_product_ids = filter_tree_products(
+            touched_products, show_recommended, show_rejected, show_approved, anomalies_only
+        )
+        for subcat_id in touched_ids:
+            subcat_nodes[subcat_id] = build_subcategory_nodes(
+                filtered_products[filtered_products['subcategory_id'] == subcat_id], anomaly_product_ids
+            )
+    return assemble_tree_nodes(departments, categories, subcategories, subcat_nodes)
+
+@st.fragment
+def show_tree_panel(nodes):
+    """Tree selector fragment; a changed selection reruns the whole page"""
+    st.markdown("### 📋 Select Hierarchy Levels")
+    return_select = tree_select(
+        nodes,
+        check_model="all",  # Allow selection at all levels (departments, categories, subcategories)
+        expanded=["dept_1", "dept_2"],  # Expand first two departments by default
+        no_cascade=False,  # Allow parent selection to cascade to children
+        show_expand_all=True  # Show expand/collapse all buttons
+    )
+    
+    # Dependent panels read the selection from session state
+    previous_select = st.session_state.get('tree_selection')
+    if return_select != previous_select:
+        first_render = 'tree_selection' not in st.session_state
+        st.session_state.tree_selection = return_select
+        st.session_state.pop('bulk_action', None)
+        if not first_render:
+            st.rerun()
+
+@st.fragment
+def show_bulk_operations_panel(selected_product_ids, products, departments, categories, subcategories):
+    """Bulk operations fragment; widget interactions rerun only this panel"""
+    st.markdown("---")
+    st.markdown("### 🔧 Bulk Operations")
+    
+    # Outcomes of background jobs that finished since the last page run
+    for job in st.session_state.pop('bulk_job_notices', []):
+        if job['status'] == 'committed':
+            st.success(f"Job #{job['id']} done: {job['description']} ({job['result']} updated)")
+        else:
+            st.error(f"Job #{job['id']} failed: {job['description']} ({job['error']})")
+    
+    show_undo_redo_controls()
+    
+    # Filter selected products by status
+    status_breakdown = filter_selected_products_by_status(selected_product_ids, products)
+    
+    # Show status breakdown of selections
+    col_status1, col_status2, col_status3, col_status4 = st.columns(4)
+    
+    with col_status1:
+        rec_count = len(status_breakdown['recommended'])
+        st.metric("🔍 Recommended", rec_count)
+    
+    with col_status2:
+        app_count = len(status_breakdown['approved'])
+        st.metric("📦 Approved", app_count)
+    
+    with col_status3:
+        rej_count = len(status_breakdown['rejected'])
+        st.metric("❌ Rejected", rej_count)
+    
+    with col_status4:
+        total_actionable = rec_count + rej_count  # Can approve recommended or re-approve rejected
+        st.metric("⚡ Actionable", total_actionable)
+    
+    # Bulk Action Controls - Only show if there are actionable items
+    if rec_count > 0 or rej_count > 0:
+        st.markdown("#### 🎯 Bulk Actions")
+        
+        # Action buttons open a confirmation panel that survives panel reruns
+        col_btn1, col_btn2, col_btn3, col_btn4 = st.columns(4)
+        
+        with col_btn1:
+            if rec_count > 0:
+                if st.button(f"✅ Approve All Recommended ({rec_count})",
+                           type="primary",
+                           use_container_width=True,
+                           key="bulk_approve"):
+                    st.session_state.bulk_action = 'approve'
+        
+        with col_btn2:
+            if rec_count > 0:
+                if st.button(f"❌ Reject All Recommended ({rec_count})",
+                           type="secondary",
+                           use_container_width=True,
+                           key="bulk_reject"):
+                    st.session_state.bulk_action = 'reject'
+        
+        with col_btn3:
+            if rec_count > 0:
+                if st.button(f"🔄 Approve & Move ({rec_count})",
+                           use_container_width=True,
+                           key="bulk_approve_move"):
+                    st.session_state.bulk_action = 'approve_move'
+        
+        with col_btn4:
+            if st.button("📊 Review History",
+                    use_container_width=True,
+                    key="view_history"):
+                st.session_state.bulk_action = 'history'
+        
+        bulk_action = st.session_state.get('bulk_action') if rec_count > 0 else None
+        recommended_ids = status_breakdown['recommended']['id'].tolist()
+        recommended_names = status_breakdown['recommended']['name'].tolist()
+        
+        if bulk_action == 'approve':
+            with st.expander("⚠️ Confirm Bulk Approval", expanded=True):
+                st.warning(f"You are about to approve {rec_count} recommended products:")
+                for name in recommended_names[:5]:  # Show first 5
+                    st.write(f"• {name}")
+                if len(recommended_names) > 5:
+                    st.write(f"• ... and {len(recommended_names) - 5} more")
+                
+                reason = st.text_input("Approval reason (optional):",
+                                     value="Bulk approval - management review",
+                                     key="approve_reason")
+                
+                col_confirm1, col_confirm2 = st.columns(2)
+                with col_confirm1:
+                    if st.button("✅ Confirm Approval", type="primary", key="confirm_approve"):
+                        # Perform bulk approval in the background
+                        if start_bulk_job(
+                            f"✅ Approve {rec_count} products",
+                            recommended_ids,
+                            bulk_update_product_status,
+                            new_status='approved',
+                            reviewed_by="Manager",
+                            review_reason=reason
+                        ):
+                            st.session_state.pop('bulk_action', None)
+                            st.rerun()  # Start polling the job from the page
+                
+                with col_confirm2:
+                    if st.button("❌ Cancel", key="cancel_approve"):
+                        st.session_state.pop('bulk_action', None)
+                        st.rerun(scope="fragment")
+        
+        elif bulk_action == 'reject':
+            with st.expander("⚠️ Confirm Bulk Rejection", expanded=True):
+                st.error(f"You are about to reject {rec_count} recommended products:")
+                for name in recommended_names[:5]:  # Show first 5
+                    st.write(f"• {name}")
+                if len(recommended_names) > 5:
+                    st.write(f"• ... and {len(recommended_names) - 5} more")
+                
+                reason = st.text_input("Rejection reason:",
+                                     placeholder="Why are these products being rejected?",
+                                     key="reject_reason")
+                
+                if reason:  # Only allow rejection with a reason
+                    col_confirm1, col_confirm2 = st.columns(2)
+                    with col_confirm1:
+                        if st.button("❌ Confirm Rejection", type="primary", key="confirm_reject"):
+                            # Perform bulk rejection in the background
+                            if start_bulk_job(
+                                f"❌ Reject {rec_count} products",
+                                recommended_ids,
+                                bulk_update_product_status,
+                                new_status='rejected',
+                                reviewed_by="Manager",
+                                review_reason=reason
+                            ):
+                                st.session_state.pop('bulk_action', None)
+                                st.rerun()  # Start polling the job from the page
+                    
+                    with col_confirm2:
+                        if st.button("🔙 Cancel", key="cancel_reject"):
+                            st.session_state.pop('bulk_action', None)
+                            st.rerun(scope="fragment")
+                else:
+                    st.info("💡 Please provide a reason for rejection")
+        
+        elif bulk_action == 'approve_move':
+            with st.expander("🔄 Approve & Move Products", expanded=True):
+                recommended_products = status_breakdown['recommended']
+                
+                st.warning(f"You are approving {rec_count} recommended products:")
+                
+                # Bulk destination selector
+                st.markdown("#### 🎯 Move all products to:")
+                col_dest1, col_dest2, col_dest3 = st.columns(3)
+                
+                with col_dest1:
+                    dept_options = [(dept['id'], dept['name']) for _, dept in departments.iterrows()]
+                    selected_dept = st.selectbox(
+                        "Department",
+                        options=[opt[0] for opt in dept_options],
+                        format_func=lambda x: next(opt[1] for opt in dept_options if opt[0] == x),
+                        key="bulk_move_dept"
+                    )
+                
+                with col_dest2:
+                    dept_categories = categories[categories['department_id'] == selected_dept]
+                    cat_options = [(cat['id'], cat['name']) for _, cat in dept_categories.iterrows()]
+                    if cat_options:
+                        selected_cat = st.selectbox(
+                            "Category",
+                            options=[opt[0] for opt in cat_options],
+                            format_func=lambda x: next(opt[1] for opt in cat_options if opt[0] == x),
+                            key="bulk_move_cat"
+                        )
+                    else:
+                        st.warning("No categories in selected department")
+                        selected_cat = None
+                
+                with col_dest3:
+                    if selected_cat:
+                        cat_subcategories = subcategories[subcategories['category_id'] == selected_cat]
+                        subcat_options = [(subcat['id'], subcat['name']) for _, subcat in cat_subcategories.iterrows()]
+                        if subcat_options:
+                            selected_subcat = st.selectbox(
+                                "Subcategory",
+                                options=[opt[0] for opt in subcat_options],
+                                format_func=lambda x: next(opt[1] for opt in subcat_options if opt[0] == x),
+                                key="bulk_move_subcat"
+                            )
+                        else:
+                            st.warning("No subcategories in selected category")
+                            selected_subcat = None
+                    else:
+                        selected_subcat = None
+                
+                # Show destination path
+                if selected_dept and selected_cat and selected_subcat:
+                    dest_dept = departments[departments['id'] == selected_dept]['name'].iloc[0]
+                    dest_cat = categories[categories['id'] == selected_cat]['name'].iloc[0]
+                    dest_subcat = subcategories[subcategories['id'] == selected_subcat]['name'].iloc[0]
+                    dest_path = f"{dest_dept} > {dest_cat} > {dest_subcat}"
+                    st.info(f"📍 Destination: {dest_path}")
+                    
+                    # Show products being moved
+                    st.markdown("#### 📦 Products to approve & move:")
+                    show_move_preview(recommended_products, dest_path, departments, categories, subcategories)
+                    
+                    # Action buttons
+                    col_confirm1, col_confirm2 = st.columns(2)
+                    with col_confirm1:
+                        if st.button("✅ Confirm Approve & Move All", type="primary", key="confirm_approve_move"):
+                            # Validate destination exists
+                            if validate_category_path(selected_dept, selected_cat, selected_subcat,
+                                                     departments, categories, subcategories):
+                                # Execute approve + move operation in the background
+                                if start_bulk_job(
+                                    f"🔄 Approve & move {rec_count} products",
+                                    recommended_ids,
+                                    bulk_approve_and_move,
+                                    new_subcategory_id=selected_subcat
+                                ):
+                                    st.session_state.pop('bulk_action', None)
+                                    st.rerun()  # Start polling the job from the page
+                            else:
+                                st.error("❌ Invalid destination category. Please select a valid path.")
+                    
+                    with col_confirm2:
+                        if st.button("❌ Cancel", key="cancel_approve_move"):
+                            st.session_state.pop('bulk_action', None)
+                            st.rerun(scope="fragment")
+                else:
+                    st.warning("⚠️ Please select a complete destination path (Department > Category > Subcategory)")
+    
+    elif app_count > 0:
+        st.info("📦 Selected products are already approved. Use filters to view recommended products for bulk actions.")
+        if st.button("📊 Review History", key="view_history"):
+            st.session_state.bulk_action = 'history'
+    else:
+        st.info("🔍 Select some recommended products to see bulk action options.")
+    
+    if st.session_state.get('bulk_action') == 'history':
+        show_review_history(selected_product_ids, subcategories)
+
+MOVE_PREVIEW_PAGE_SIZE = 50
+
+def show_move_preview(products_to_move, dest_path, departments, categories, subcategories):
+    """Paginated preview of an approve & move, with counts grouped by source path"""
+    preview = pd.DataFrame({
+        'Product': products_to_move['name'].to_numpy(),
+        'SKU': products_to_move['sku'].to_numpy(),
+        'Currently': build_hierarchy_paths(products_to_move['subcategory_id'].to_numpy(),
+                                           departments, categories, subcategories),
+        'Moving to': dest_path
+    })
+    
+    # Summary of where the products come from
+    source_counts = preview['Currently'].value_counts().rename_axis('From').reset_index(name='Products')
+    st.dataframe(source_counts, use_container_width=True, hide_index=True)
+    
+    n_pages = max(1, -(-len(preview) // MOVE_PREVIEW_PAGE_SIZE))
+    page = 1
+    if n_pages > 1:
+        page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, key="move_preview_page")
+    start = (page - 1) * MOVE_PREVIEW_PAGE_SIZE
+    st.dataframe(preview.iloc[start:start + MOVE_PREVIEW_PAGE_SIZE], use_container_width=True, hide_index=True)
+    st.caption(f"Showing {start + 1}-{min(start + MOVE_PREVIEW_PAGE_SIZE, len(preview))} of {len(preview)} products")
+
+def show_undo_redo_controls():
+    """Undo/redo buttons for the most recent bulk operations"""
+    undo_state = load_undo_state()
+    if not undo_state['undo'] and not undo_state['redo']:
+        return
+    
+    col_undo, col_redo = st.columns(2)
+    for column, direction, icon in ((col_undo, 'undo', "↩️"), (col_redo, 'redo', "↪️")):
+        with column:
+            entry = undo_state[direction][-1] if undo_state[direction] else None
+            label = f"{icon} {direction.title()}: {entry['description']}" if entry else f"{icon} {direction.title()}"
+            if st.button(label, key=f"bulk_{direction}", disabled=entry is None, use_container_width=True):
+                change_set = read_change_set(entry)
+                if start_bulk_job(
+                    f"{icon} {direction.title()} {entry['description'].lower()}",
+                    change_set['product_ids'],
+                    undo_redo_bulk_operation,
+                    direction=direction,
+                    change_set_id=entry['id']
+                ):
+                    st.rerun()  # Start polling the job from the page
+
+def show_review_history(selected_product_ids, subcategories):
+    """Approval history of the selected products, or of one reviewer over a date range"""
+    history_index = refresh_approval_history_index(get_approval_history_index())
+    
+    with st.expander("📊 Review History", expanded=True):
+        if len(history_index['history']) == 0:
+            st.info("No decisions have been recorded yet.")
+        else:
+            tab_products, tab_reviewer = st.tabs(["Selected Products", "By Reviewer"])
+            
+            with tab_products:
+                history = query_history_by_products(history_index, selected_product_ids)
+                if history.empty:
+                    st.info("No recorded decisions for the selected products.")
+                else:
+                    st.caption(f"{len(history)} decisions for {history['product_id'].nunique()} selected products")
+                    show_history_table(history.iloc[::-1], subcategories)
+            
+            with tab_reviewer:
+                reviewers = np.unique(history_index['by_actor']['sorted_values']).tolist()
+                col_reviewer, col_dates = st.columns(2)
+                with col_reviewer:
+                    reviewer = st.selectbox("Reviewer", reviewers, key="history_reviewer")
+                with col_dates:
+                    today = datetime.now().date()
+                    date_range = st.date_input("Decision dates", value=(today, today), key="history_dates")
+                
+                if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+                    history = query_history_by_actor(history_index, reviewer, date_range[0], date_range[1])
+                    st.caption(f"{len(history)} decisions by {reviewer}")
+                    show_history_table(history.iloc[::-1], subcategories)
+        
+        st.button("Close", key="close_history", on_click=st.session_state.pop, args=('bulk_action', None))
+
+def show_history_table(history, subcategories):
+    """Render history rows with subcategory names instead of ids"""
+    subcategory_names = subcategories.set_index('id')['name']
+    st.dataframe(
+        history.assign(
+            previous_subcategory=history['previous_subcategory_id'].map(subcategory_names),
+            new_subcategory=history['new_subcategory_id'].map(subcategory_names)
+        )[['review_date', 'product_name', 'action', 'previous_status', 'new_status',
+           'previous_subcategory', 'new_subcategory', 'reviewed_by', 'decision_reason']],
+        use_container_width=True,
+        hide_index=True
+    )
+
+@st.fragment
+def show_quality_charts_panel(selection_aggregate, data_version):
+    """Quality evolution fragment for the current selection"""
+    st.markdown("---")
+    st.markdown("### 📊 Quality Evolution Over Time")
+    
+    # Create and display quality distribution chart (memoized figure spec)
+    dist_chart = get_quality_chart_spec('distribution', selection_aggregate['fingerprint'],
+                                        data_version, selection_aggregate)
+    if dist_chart:
+        st.plotly_chart(dist_chart, use_container_width=True, config={'displayModeBar': False})
+    
+    # Price percentile bands from the merged price sketches
+    price_chart = get_quality_chart_spec('price_bands', selection_aggregate['fingerprint'],
+                                         data_version, selection_aggregate)
+    if price_chart:
+        st.plotly_chart(price_chart, use_container_width=True, config={'displayModeBar': False})
+        st.caption(f"Price percentiles are estimated from mergeable sketches "
+                   f"(within ±{PRICE_SKETCH_RELATIVE_ACCURACY:.0%} of the true value).")
+    
+    # Show quality trend analysis
+    st.markdown("#### 📈 Quality Trend Analysis")
+    
+    # Quality trends come from the shared selection aggregate
+    quality_trends = selection_aggregate['period_counts']
+    
+    if not quality_trends.empty:
+        # Show key insights
+        col_insight1, col_insight2 = st.columns(2)
+        
+        with col_insight1:
+            st.markdown("**📊 Quality Trends:**")
+            if 'good' in quality_trends.columns:
+                good_trend = quality_trends['good'].iloc[-1] - quality_trends['good'].iloc[0]
+                if good_trend > 0:
+                    st.success(f"🟢 Good quality increased by {good_trend} products")
+                elif good_trend < 0:
+                    st.error(f"🔴 Good quality decreased by {abs(good_trend)} products")
+                else:
+                    st.info("🟡 Good quality remained stable")
+        
+        with col_insight2:
+            st.markdown("**🎯 Best/Worst Periods:**")
+            if 'good' in quality_trends.columns:
+                best_period = quality_trends.loc[quality_trends['good'].idxmax(), 'period_name']
+                worst_period = quality_trends.loc[quality_trends['good'].idxmin(), 'period_name']
+                st.info(f"🏆 Best: {best_period}")
+                st.warning(f"⚠️ Worst: {worst_period}")
+        
+        # Show detailed breakdown
+        with st.expander("📋 View Detailed Quality Data"):
+            st.dataframe(
+                quality_trends,
+                use_container_width=True,
+                hide_index=True
+            )
+    else:
+        st.warning("No temporal quality data available for selected items")
+
+@st.fragment
+def show_trend_outliers_panel(selected_product_ids, products, trend_features):
+    """Rank the selection's products by a precomputed trend feature"""
+    st.markdown("#### 🚨 Product Trend Outliers")
+    
+    if trend_features is None:
+        st.caption("⏳ Product trend rankings appear once exact results are ready.")
+        return
+    
+    col_feature, col_direction, col_k = st.columns([2, 2, 1])
+    with col_feature:
+        feature = st.selectbox("Rank by", list(TREND_FEATURES), format_func=TREND_FEATURES.get,
+                               key="trend_feature")
+    with col_direction:
+        direction = st.radio("Show", ["Lowest", "Highest"], horizontal=True, key="trend_direction",
+                             help="Lowest slope/delta are the most declining products")
+    with col_k:
+        k = st.number_input("Top K", min_value=1, max_value=500, value=10, step=5, key="trend_top_k")
+    
+    positions = top_k_products(trend_features, feature, selected_product_ids, int(k),
+                               largest=direction == "Highest")
+    if len(positions) == 0:
+        st.info("No trend data for the selected products.")
+        return
+    
+    # Look up names for just the k ranked products
+    ranked = pd.DataFrame({
+        'id': trend_features['ids'][positions],
+        **{name: trend_features[name][positions] for name in TREND_FEATURES}
+    })
+    ranked = ranked.merge(products[['id', 'name', 'sku', 'status']], on='id', how='left')
+    st.dataframe(
+        ranked[['name', 'sku', 'status', 'slope', 'delta', 'volatility']],
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            'slope': st.column_config.NumberColumn("Slope", format="%.3f"),
+            'delta': st.column_config.NumberColumn("Last - First", format="%+.2f"),
+            'volatility': st.column_config.NumberColumn("Volatility", format="%.3f")
+        }
+    )
+    st.caption("Features use the good-quality share over the full timeline at the selected granularity.")
+
+def add_comparison_group(group_name, product_ids):
+    """Save product ids as a named comparison group, replacing a group of the same name"""
+    groups = st.session_state.comparison_groups
+    name = group_name.strip() or f"Group {len(groups) + 1}"
+    groups[:] = [group for group in groups if group['name'] != name]
+    groups.append({'name': name, 'product_ids': list(product_ids)})
+
+@st.fragment
+def show_comparison_panel(selected_product_ids, rollups, period_window):
+    """Compare saved selections side by side on the quality trend"""
+    st.markdown("---")
+    st.markdown("### ⚖️ Compare Selections")
+    
+    if 'comparison_groups' not in st.session_state:
+        st.session_state.comparison_groups = []
+    groups = st.session_state.comparison_groups
+    
+    # Save the current tree selection as a named group
+    col_name, col_add = st.columns([3, 1])
+    with col_name:
+        group_name = st.text_input("Group name", value=f"Group {len(groups) + 1}",
+                                   key="comparison_group_name", label_visibility="collapsed")
+    with col_add:
+        st.button("➕ Add selection", key="add_comparison_group", use_container_width=True,
+                  disabled=len(groups) >= MAX_COMPARISON_GROUPS,
+                  on_click=add_comparison_group, args=(group_name, selected_product_ids))
+    
+    if not groups:
+        st.caption("Save two or more selections to compare their quality trends.")
+        return
+    
+    # Saved groups with remove buttons
+    for group_index, group in enumerate(groups):
+        col_group, col_remove = st.columns([4, 1])
+        with col_group:
+            st.write(f"**{group['name']}** · {len(group['product_ids'])} products")
+        with col_remove:
+            st.button("✖", key=f"remove_comparison_group_{group_index}",
+                      on_click=groups.pop, args=(group_index,))
+    
+    if rollups is None:
+        st.caption("⏳ The comparison chart appears once exact results are ready.")
+        return
+    
+    comparison_chart = create_comparison_chart(
+        compute_comparison_aggregates(groups, rollups, period_window)
+    )
+    if comparison_chart:
+        st.plotly_chart(comparison_chart, use_container_width=True, config={'displayModeBar': False})
+
+TRIAGE_PREVIEW_ROWS = 200
+
+@st.fragment
+def show_triage_panel(products):
+    """Rule-based auto-triage of the whole recommended queue"""
+    st.markdown("---")
+    st.markdown("### 🤖 Auto-Triage")
+    
+    rules = load_triage_rules()
+    with st.expander("📜 Rules (evaluated in order, first match decides)"):
+        rules_text = st.text_area("Rules JSON", value=json.dumps(rules, indent=2), height=260, key="triage_rules_text")
+        if st.button("💾 Save Rules", key="save_triage_rules"):
+            try:
+                save_triage_rules(json.loads(rules_text))
+                st.success("Rules saved")
+                rules = load_triage_rules()
+            except ValueError as error:  # json.JSONDecodeError is a ValueError
+                st.error(f"Invalid rules: {error}")
+        st.caption("Conditions: " + ", ".join(f"`{condition}`" for condition in TRIAGE_CONDITIONS))
+    
+    recommended_count = int((products['status'] == 'recommended').sum())
+    if recommended_count == 0:
+        st.info("No recommended products waiting for review.")
+        return
+    
+    rollups = build_quality_rollups(get_data_version(PLACEMENT_SCOPE))
+    features = compute_triage_features(products, rollups['product']['cube'], rollups['product']['ids'])
+    try:
+        proposals = evaluate_triage_rules(rules, products, features)
+    except ValueError as error:  # a rules file edited outside the panel
+        st.error(f"Invalid rules: {error}")
+        return
+    
+    st.write(f"**{len(proposals)}** of {recommended_count} recommended products match a rule")
+    if proposals.empty:
+        return
+    
+    summary = proposals.groupby(['rule', 'decision'], sort=False).size().reset_index(name='products')
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+    st.dataframe(
+        proposals.head(TRIAGE_PREVIEW_ROWS).assign(price_deviation=lambda frame: frame['price_deviation'] * 100),
+        use_container_width=True,
+        hide_index=True,
+        column_config={'price_deviation': st.column_config.NumberColumn("Price vs median", format="%.0f%%")}
+    )
+    if len(proposals) > TRIAGE_PREVIEW_ROWS:
+        st.caption(f"Showing the first {TRIAGE_PREVIEW_ROWS} of {len(proposals)} proposals")
+    
+    if st.button(f"⚡ Apply {len(proposals)} Decisions", type="primary", key="apply_triage"):
+        # One bulk job per rule, so every decision carries its rule as the reason and can be undone per rule
+        submitted = 0
+        for (rule_name, decision), rule_proposals in proposals.groupby(['rule', 'decision'], sort=False):
+            if start_bulk_job(
+                f"🤖 {rule_name}: {decision} {len(rule_proposals)} products",
+                rule_proposals['id'].tolist(),
+                bulk_update_product_status,
+                new_status=decision,
+                reviewed_by="Auto-triage",
+                review_reason=f"Rule: {rule_name}"
+            ):
+                submitted += 1
+        if submitted:
+            st.rerun()  # Start polling the jobs from the page
+
+MOVE_MAPPING_PREVIEW_ROWS = 200
+
+@st.fragment
+def show_mapping_move_panel(products, departments, categories, subcategories):
+    """Bulk move from an uploaded (product_id -> subcategory_id) mapping file"""
+    st.markdown("---")
+    st.markdown("### 🗺️ Move from Mapping File")
+    
+    uploaded = st.file_uploader("Mapping file (product_id, subcategory_id; optional category_id, department_id)",
+                                type=["csv", "jsonl"], key="move_mapping_file")
+    if uploaded is None:
+        return
+    
+    try:
+        mapping = read_move_mapping(uploaded, uploaded.name)
+    except ValueError as error:  # includes pandas parser errors
+        st.error(f"Could not read mapping: {error}")
+        return
+    
+    validation = validate_move_mapping(mapping, products, departments, categories, subcategories)
+    moves, problems = validation['moves'], validation['problems']
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Mapping Rows", len(mapping))
+    with col2:
+        st.metric("Valid Moves", len(moves))
+    with col3:
+        st.metric("Target Subcategories", moves['subcategory_id'].nunique())
+    with col4:
+        st.metric("Invalid Rows", len(problems))
+    
+    if len(problems) > 0:
+        st.warning("Some rows fail validation and will be skipped: " +
+                   ", ".join(f"{problem} ({count})" for problem, count in problems['problem'].value_counts().items()))
+        st.dataframe(problems.head(MOVE_MAPPING_PREVIEW_ROWS), use_container_width=True, hide_index=True)
+    if len(moves) == 0:
+        return
+    
+    # Paths come from vectorized lookups, so large mappings preview as cheaply as small ones
+    positions = encode_ids(moves['product_id'].to_numpy(), products['id'].to_numpy())
+    preview = pd.DataFrame({
+        'Product': products['name'].to_numpy()[positions],
+        'Status': products['status'].to_numpy()[positions],
+        'Currently': build_hierarchy_paths(products['subcategory_id'].to_numpy()[positions],
+                                           departments, categories, subcategories),
+        'Moving to': build_hierarchy_paths(moves['subcategory_id'].to_numpy(), departments, categories, subcategories)
+    })
+    st.dataframe(preview.head(MOVE_MAPPING_PREVIEW_ROWS), use_container_width=True, hide_index=True)
+    if len(preview) > MOVE_MAPPING_PREVIEW_ROWS:
+        st.caption(f"Showing the first {MOVE_MAPPING_PREVIEW_ROWS} of {len(preview)} moves")
+    
+    approve = st.checkbox("Also approve the moved products", value=True, key="move_mapping_approve")
+    if st.button(f"🗺️ Apply {len(moves)} Moves", type="primary", key="apply_move_mapping"):
+        if start_bulk_job(
+            f"🗺️ Move {len(moves)} products to {moves['subcategory_id'].nunique()} subcategories",
+            moves['product_id'].tolist(),
+            bulk_move_products,
+            new_subcategory_id=moves.set_index('product_id')['subcategory_id'],
+            approve=approve,
+            reviewed_by="Manager",
+            review_reason=f"Mapping file {uploaded.name}"
+        ):
+            st.rerun()  # Start polling the job from the page
+
+# One-by-one review: decisions go to a session overlay at once and are saved in background batches
+OVERLAY_FLUSH_SECONDS = 2
+OVERLAY_FLUSH_BATCH = 500  # most decisions per background write
+
+def apply_status_overlay(products, overlay_statuses):
+    """Base products with unsaved review decisions ({product id: status}) applied"""
+    if not overlay_statuses:
+        return products
+    overlay_status = products['id'].map(overlay_statuses)
+    products = products.copy()
+    products['status'] = overlay_status.where(overlay_status.notna(), products['status'])
+    return products
+
+def get_unsaved_statuses(products, overlay):
+    """Overlay statuses ({product id: status}) the saved products do not hold yet"""
+    if not overlay:
+        return {}
+    saved = products.loc[products['id'].isin(list(overlay)), ['id', 'status']]
+    return {product_id: overlay[product_id][0] for product_id, status in zip(saved['id'], saved['status'])
+            if overlay[product_id][0] != status}
+
+def record_review_decision(product_id, status):
+    """Button callback: queue a decision in the overlay (no disk access)"""
+    st.session_state.setdefault('status_overlay', {})[product_id] = (status, datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    st.session_state.setdefault('overlay_pending_since', datetime.now())
+
+def skip_review_item(product_id):
+    """Button callback: leave a product for later in this session"""
+    st.session_state.setdefault('review_queue_skipped', set()).add(product_id)
+
+def undo_review_decision():
+    """Button callback: take back the latest decision that is not being saved yet"""
+    overlay = st.session_state.get('status_overlay', {})
+    in_flight = set((st.session_state.get('overlay_flush') or {}).get('product_ids', []))
+    for product_id in reversed(list(overlay)):
+        if product_id not in in_flight:
+            del overlay[product_id]
+            return
+
+def clear_flushed_decisions(overlay, product_ids):
+    """Commit callback (worker thread): saved decisions leave the overlay as the rows land in products.csv"""
+    for product_id in product_ids:
+        overlay.pop(product_id, None)
+
+def count_overlay_decisions(overlay):
+    """(unsaved, saving) decision counts; a committing flush may already have cleared its rows"""
+    in_flight = set((st.session_state.get('overlay_flush') or {}).get('product_ids', []))
+    product_ids = list(overlay)
+    saving = sum(product_id in in_flight for product_id in product_ids)
+    return len(product_ids) - saving, saving
+
+def flush_status_overlay():
+    """Settle the in-flight batch and submit the next one; returns True once a batch has committed"""
+    overlay = st.session_state.get('status_overlay', {})
+    flush = st.session_state.get('overlay_flush')
+    runner = get_bulk_job_runner()
+    if flush is not None:
+        job = runner['jobs'].get(flush['job_id'])
+        if job is not None and job['status'] in ('queued', 'running'):
+            return False
+        st.session_state.overlay_flush = None
+        if job is not None and job['status'] == 'committed':
+            # The commit already cleared the saved rows; skipped rows were reviewed elsewhere first
+            skipped = len(flush['product_ids']) - job['result']
+            if skipped:
+                st.session_state.review_queue_notice = f"{skipped} decisions were dropped: those products were already reviewed elsewhere"
+            return True
+        st.session_state.review_queue_notice = f"Saving decisions failed ({job['error'] if job else 'job expired'}); retrying"
+    
+    # Batch decisions: wait until the oldest unsaved one has aged a poll interval, unless a full batch is ready
+    pending = list(overlay)[:OVERLAY_FLUSH_BATCH]
+    pending_since = st.session_state.get('overlay_pending_since', datetime.now())
+    if len(pending) == OVERLAY_FLUSH_BATCH or \
+            (pending and (datetime.now() - pending_since).total_seconds() >= OVERLAY_FLUSH_SECONDS):
+        job_id = submit_bulk_job(runner, f"Save {len(pending)} review decisions", pending, bulk_apply_review_decisions,
+                                 on_commit=lambda result: clear_flushed_decisions(overlay, pending),
+                                 decisions={product_id: overlay[product_id] for product_id in pending})
+        # Products held by another job are retried on the next poll
+        if job_id is not None:
+            st.session_state.overlay_flush = {'job_id': job_id, 'product_ids': pending}
+            st.session_state.overlay_pending_since = datetime.now()
+    elif not pending:
+        st.session_state.pop('overlay_pending_since', None)
+    return False
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_review_queue(products_version):
+    """Recommended products in review order, sorted once per products version (shared read-only)"""
+    products = load_table("products.csv", products_version)
+    queue = products[products['status'] == 'recommended']
+    return queue.sort_values(['recommendation_date', 'id'])
+
+@st.fragment(run_every=OVERLAY_FLUSH_SECONDS)
+def show_overlay_flusher():
+    """Poll the background save of review decisions; only rendered while the overlay holds any"""
+    if flush_status_overlay():
+        st.rerun()  # Reload the base data that now holds the saved decisions
+    
+    unsaved_count, saving_count = count_overlay_decisions(st.session_state.get('status_overlay', {}))
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Unsaved Decisions", unsaved_count)
+    with col2:
+        st.metric("Saving", saving_count)
+    
+    notice = st.session_state.pop('review_queue_notice', None)
+    if notice:
+        st.warning(notice)
+
+@st.fragment
+def show_review_queue(subcategories, product_ids=None):
+    """Fast one-by-one review of the saved recommended products"""
+    st.markdown("---")
+    st.markdown("### ⚡ Quick Review Queue")
+    
+    overlay = st.session_state.get('status_overlay', {})
+    skipped = st.session_state.get('review_queue_skipped', set())
+    queue = get_review_queue(get_data_version(["products.csv"]))
+    queue = queue[~queue['id'].isin(list(overlay))]
+    if product_ids:
+        queue = queue[queue['id'].isin(product_ids)]
+    skipped_mask = queue['id'].isin(list(skipped))
+    skipped_count = int(skipped_mask.sum())
+    queue = queue[~skipped_mask]
+    
+    st.metric("In Queue", len(queue), help="Limited to the tree selection" if product_ids else None)
+    
+    # Polling runs only while decisions wait to be saved; clicks rerun this fragment and restart it
+    if overlay:
+        show_overlay_flusher()
+    
+    notice = st.session_state.pop('review_queue_notice', None)
+    if notice:
+        st.warning(notice)
+    
+    if len(queue) == 0:
+        st.info("Nothing left to review here." + (f" {skipped_count} skipped products are hidden." if skipped_count else ""))
+        if skipped_count:
+            st.button("🔁 Review Skipped Products", key="review_unskip",
+                      on_click=lambda: st.session_state.pop('review_queue_skipped', None))
+    else:
+        product = queue.iloc[0]
+        subcategory_names = subcategories.set_index('id')['name']
+        st.markdown(f"""
+        <div class="info-box">
+        <strong>🔍 {product['name']}</strong> - ${product['price']:.2f}<br>
+        🏷️ {subcategory_names.get(product['subcategory_id'], 'Unknown')} |
+        Quality: {product['quality']} | Source: {product['recommendation_source']} |
+        Recommended: {product['recommendation_date']}
+        </div>
+        """, unsafe_allow_html=True)
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.button("✅ Approve", key="review_approve", type="primary", use_container_width=True,
+                      on_click=record_review_decision, args=(int(product['id']), 'approved'))
+        with col2:
+            st.button("❌ Reject", key="review_reject", use_container_width=True,
+                      on_click=record_review_decision, args=(int(product['id']), 'rejected'))
+        with col3:
+            st.button("⏭️ Skip", key="review_skip", use_container_width=True,
+                      on_click=skip_review_item, args=(int(product['id']),))
+        with col4:
+            st.button("↩️ Undo", key="review_undo", use_container_width=True, on_click=undo_review_decision,
+                      disabled=count_overlay_decisions(overlay)[0] == 0)
+    
+    st.caption("Decisions show up in this queue immediately and are saved in the background every few seconds; "
+               "the tree and metrics include them on the next page refresh.")
+
+@st.fragment
+def show_tree_insights_panel(return_select, departments, categories, subcategories, products):
+    """Tree insights fragment showing expanded and selected nodes"""
+    st.markdown('<h2 class="section-header">💡 Tree Insights</h2>', unsafe_allow_html=True)
+    
+    if return_select and return_select.get('checked'):
+        selected_values = return_select['checked']
+        
+        # Analyze what's expanded vs selected
+        expanded_values = return_select.get('expanded', [])
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("#### 🔽 Expanded Nodes")
+            expanded_display = []
+            for value in expanded_values:
+                if value.startswith('dept_'):
+                    dept_id = int(value.replace('dept_', ''))
+                    dept_name = departments[departments['id'] == dept_id]['name'].iloc[0]
+                    expanded_display.append(f"📁 {dept_name}")
+                elif value.startswith('cat_'):
+                    cat_id = int(value.replace('cat_', ''))
+                    cat_name = categories[categories['id'] == cat_id]['name'].iloc[0]
+                    expanded_display.append(f"📂 {cat_name}")
+            
+            if expanded_display:
+                for item in expanded_display:
+                    st.write(item)
+            else:
+                st.info("No nodes expanded")
+        
+        with col2:
+            st.markdown("#### ✅ Selected Nodes")
+            selected_display = []
+            for value in selected_values:
+                if value.startswith('dept_'):
+                    dept_id = int(value.replace('dept_', ''))
+                    dept_name = departments[departments['id'] == dept_id]['name'].iloc[0]
+                    selected_display.append(f"🏢 {dept_name}")
+                elif value.startswith('cat_'):
+                    cat_id = int(value.replace('cat_', ''))
+                    cat_name = categories[categories['id'] == cat_id]['name'].iloc[0]
+                    selected_display.append(f"📂 {cat_name}")
+                elif value.startswith('subcat_'):
+                    subcat_id = int(value.replace('subcat_', ''))
+                    subcat_name = subcategories[subcategories['id'] == subcat_id]['name'].iloc[0]
+                    selected_display.append(f"🏷️ {subcat_name}")
+                elif value.startswith('product_'):
+                    product_id = int(value.replace('product_', ''))
+                    product_name = products[products['id'] == product_id]['name'].iloc[0]
+                    selected_display.append(f"🛒 {product_name}")
+            
+            if selected_display:
+                for item in selected_display:
+                    st.write(item)
+            else:
+                st.info("No items selected")
+
+def show_tree_hierarchy():
     """Display interactive tree hierarchy with streamlit-tree-select"""
     st.markdown('<h1 class="main-header">🌳 Interactive Tree Hierarchy</h1>', unsafe_allow_html=True)
     
+    # Copy the overlay before loading: a flush committing in between leaves its decisions in one of the two
+    overlay = dict(st.session_state.get('status_overlay', {}))
+    
     # Load data
     departments, categories, subcategories, products, temporal_quality = load_data()
     
@@ -646,6 +3151,10 @@ def show_tree_hierarchy():
         st.warning("Please generate sample data first by running `python scripts/generate_data.py`")
         return
     
+    # Unsaved one-by-one review decisions of this session render on top of the saved data (once each)
+    overlay_statuses = get_unsaved_statuses(products, overlay)
+    products = apply_status_overlay(products, overlay_statuses)
+    
     # Product Status Filtering - Add to sidebar
     with st.sidebar:
         if st.session_state.current_page == 'Tree Hierarchy':
@@ -656,11 +3165,18 @@ def show_tree_hierarchy():
             show_recommended = st.checkbox("🔍 Show Recommended Products", value=True, key="show_recommended")
             show_approved = st.checkbox("📦 Show Approved Products", value=True, key="show_approved")
             show_rejected = st.checkbox("❌ Show Rejected Products", value=False, key="show_rejected")
+            anomalies_only = st.checkbox(
+                "⚠️ Only Products with Quality Anomalies",
+                value=False,
+                key="anomalies_only",
+                help=f"Products whose good or poor share deviated sharply from their own baseline "
+                     f"in the last {ANOMALY_RECENT_PERIODS} periods"
+            )
             
             # Summary of current filters
             status_summary = []
             if show_recommended: status_summary.append("Recommended")
-            if show_approved: status_summary.append("Approved") 
+            if show_approved: status_summary.append("Approved")
             if show_rejected: status_summary.append("Rejected")
             
             if status_summary:
@@ -668,13 +3184,49 @@ def show_tree_hierarchy():
             else:
                 st.warning("No products will be visible with current filters!")
             
-
+            # Time window for the quality charts
+            st.markdown("### 🕒 Time Window")
+            granularity = st.selectbox("Granularity", list(TIME_GRANULARITIES), index=2, key="time_granularity")
+            approximate_mode = st.toggle(
+                "⚡ Approximate mode",
+                value=False,
+                key="approximate_mode",
+                help="Show sampled estimates with confidence intervals immediately and fill in exact results in the background"
+            )
+            
+            if approximate_mode:
+                quality_sample = load_quality_sample(get_data_version(PLACEMENT_SCOPE))
+                periods = get_sample_periods(quality_sample, granularity)
+            else:
+                rollups = get_granular_rollups(get_data_version(PLACEMENT_SCOPE), granularity)
+                periods = rollups['periods']
+            
+            if len(periods) > 0:
+                first_date = periods['period_start'].iloc[0].date()
+                last_date = periods['period_end'].iloc[-1].date()
+                date_range = st.date_input(
+                    "Date range",
+                    value=(first_date, last_date),
+                    min_value=first_date,
+                    max_value=last_date,
+                    key="time_window"
+                )
+                
+                # The picker returns a single date while a range is being chosen
+                if isinstance(date_range, (tuple, list)) and len(date_range) == 2:
+                    period_window = get_period_window(periods, date_range[0], date_range[1])
+                else:
+                    period_window = slice(None)
+            else:
+                period_window = slice(None)
+    
+    
     
     # Filter products based on sidebar controls
     filtered_products = filter_products_by_status(
-        products, 
+        products,
         show_recommended=show_recommended,
-        show_rejected=show_rejected, 
+        show_rejected=show_rejected,
         show_approved=show_approved
     )
     
@@ -694,541 +3246,110 @@ def show_tree_hierarchy():
     with col3:
         st.metric("Recommended", recommended_count)
     with col4:
-        approval_rate = f"{(total_products - recommended_count) / total_products * 100:.1f}%" if total_products > 0 else "0%"
-        st.metric("Approval Rate", approval_rate)
+        # Read from the incrementally maintained decision counters rather than rescanning products
+        decision_analytics = load_decision_analytics(get_data_version(["products.csv"]))
+        overlay_decisions = list(overlay_statuses.values())
+        approved_count = decision_analytics['approved'].sum() + overlay_decisions.count('approved')
+        decided_count = approved_count + decision_analytics['rejected'].sum() + overlay_decisions.count('rejected')
+        approval_rate = f"{approved_count / decided_count * 100:.1f}%" if decided_count > 0 else "0%"
+        st.metric("Approval Rate", approval_rate, help="Share of reviewed products that were approved")
+    
+    show_decision_analytics(decision_analytics, subcategories)
     
     st.markdown("""
     <div class="info-box">
-    <strong>🎯 Interactive Tree Selection:</strong> This view allows you to select at ALL hierarchy levels! 
-    Choose entire departments (🏢), specific categories (📂), subcategories (🏷️), or even individual products (🛒) using the checkbox tree below. 
+    <strong>🎯 Interactive Tree Selection:</strong> This view allows you to select at ALL hierarchy levels!
+    Choose entire departments (🏢), specific categories (📂), subcategories (🏷️), or even individual products (🛒) using the checkbox tree below.
     The system will intelligently aggregate all your selections - perfect for granular product analysis!
     <br><br>
-    <strong>📋 Status Indicators:</strong> 
-    🔍 = Recommended (pending approval) | 
-    📦 = Approved (live products) | 
+    <strong>📋 Status Indicators:</strong>
+    🔍 = Recommended (pending approval) |
+    📦 = Approved (live products) |
     ❌ = Rejected (removed from consideration)
     </div>
     """, unsafe_allow_html=True)
     
-    # Build tree structure for streamlit-tree-select
-    def build_tree_nodes():
-        tree_nodes = []
-        
-        for _, dept in departments.iterrows():
-            # Get categories for this department
-            dept_categories = categories[categories['department_id'] == dept['id']]
-            
-            # Count total and recommended products in this department (filtered)
-            dept_subcats = subcategories[subcategories['category_id'].isin(dept_categories['id'])]
-            dept_products = filtered_products[filtered_products['subcategory_id'].isin(dept_subcats['id'])]
-            dept_count = len(dept_products)
-            dept_recommended_count = len(dept_products[dept_products['status'] == 'recommended'])
-            
-            dept_node = {
-                "label": create_count_label(dept['name'], dept_count, dept_recommended_count),
-                "value": f"dept_{dept['id']}",
-                "children": []
-            }
-            
-            for _, cat in dept_categories.iterrows():
-                # Get subcategories for this category
-                cat_subcats = subcategories[subcategories['category_id'] == cat['id']]
-                cat_products = filtered_products[filtered_products['subcategory_id'].isin(cat_subcats['id'])]
-                cat_count = len(cat_products)
-                cat_recommended_count = len(cat_products[cat_products['status'] == 'recommended'])
-                
-                cat_node = {
-                    "label": create_count_label(cat['name'], cat_count, cat_recommended_count),
-                    "value": f"cat_{cat['id']}",
-                    "children": []
-                }
-                
-                for _, subcat in cat_subcats.iterrows():
-                    # Get products for this subcategory (filtered)
-                    subcat_products = filtered_products[filtered_products['subcategory_id'] == subcat['id']]
-                    subcat_count = len(subcat_products)
-                    subcat_recommended_count = len(subcat_products[subcat_products['status'] == 'recommended'])
-                    
-                    subcat_node = {
-                        "label": create_count_label(subcat['name'], subcat_count, subcat_recommended_count),
-                        "value": f"subcat_{subcat['id']}",
-                        "children": []
-                    }
-                    
-                    # Add individual products as children of subcategory with status indicators
-                    for _, product in subcat_products.iterrows():
-                        # Get status indicator emoji
-                        status_emoji = get_status_indicator(product['status'])
-                        
-                        # Create product label with status indicator
-                        if product['status'] == 'recommended':
-                            label = f"{status_emoji} {product['name']} - ${product['price']:.2f} (RECOMMENDED)"
-                        elif product['status'] == 'rejected':
-                            label = f"{status_emoji} {product['name']} - ${product['price']:.2f} (REJECTED)"
-                        else:  # approved
-                            label = f"{status_emoji} {product['name']} - ${product['price']:.2f}"
-                        
-                        product_node = {
-                            "label": label,
-                            "value": f"product_{product['id']}"
-                        }
-                        subcat_node["children"].append(product_node)
-                    
-                    # Only add subcategory if it has products
-                    if subcat_count > 0:
-                        cat_node["children"].append(subcat_node)
-                
-                # Only add category if it has products  
-                if cat_count > 0:
-                    dept_node["children"].append(cat_node)
-            
-            # Only add department if it has products
-            if dept_count > 0:
-                tree_nodes.append(dept_node)
-        
-        return tree_nodes
-    
     # Create tree nodes
-    nodes = build_tree_nodes()
+    nodes = get_tree_nodes(get_data_version(), show_recommended, show_rejected, show_approved, anomalies_only,
+                           overlay_statuses)
     
     # Display tree selector
     col1, col2 = st.columns([1, 2])
     
     with col1:
-        st.markdown("### 📋 Select Hierarchy Levels")
-        return_select = tree_select(
-            nodes,
-            check_model="all",  # Allow selection at all levels (departments, categories, subcategories)
-            expanded=["dept_1", "dept_2"],  # Expand first two departments by default
-            no_cascade=False,  # Allow parent selection to cascade to children
-            show_expand_all=True  # Show expand/collapse all buttons
-        )
+        show_tree_panel(nodes)
+    return_select = st.session_state.get('tree_selection')
     
     with col2:
         st.markdown("### 📊 Quality Evolution Over Time")
         
+        review_queue_ids = None
+        
+        # Progress of this session's background bulk jobs
+        if st.session_state.get('bulk_jobs'):
+            show_bulk_job_progress()
+        
         if return_select and return_select.get('checked'):
-            selected_values = return_select['checked']
-            
-            # Parse selected IDs at all levels
-            selected_dept_ids = []
-            selected_cat_ids = []
-            selected_subcat_ids = []
-            selected_product_ids = []
-            
-            for value in selected_values:
-                if value.startswith('dept_'):
-                    dept_id = int(value.replace('dept_', ''))
-                    selected_dept_ids.append(dept_id)
-                elif value.startswith('cat_'):
-                    cat_id = int(value.replace('cat_', ''))
-                    selected_cat_ids.append(cat_id)
-                elif value.startswith('subcat_'):
-                    subcat_id = int(value.replace('subcat_', ''))
-                    selected_subcat_ids.append(subcat_id)
-                elif value.startswith('product_'):
-                    product_id = int(value.replace('product_', ''))
-                    selected_product_ids.append(product_id)
-            
-            # Build comprehensive product filter based on all selections
-            all_relevant_product_ids = set()
-            
-            # Add products from direct product selections
-            all_relevant_product_ids.update(selected_product_ids)
-            
-            # Add products from direct subcategory selections
-            for subcat_id in selected_subcat_ids:
-                subcat_products = products[products['subcategory_id'] == subcat_id]['id'].tolist()
-                all_relevant_product_ids.update(subcat_products)
-            
-            # Add products from selected categories
-            for cat_id in selected_cat_ids:
-                cat_subcats = subcategories[subcategories['category_id'] == cat_id]['id'].tolist()
-                cat_products = products[products['subcategory_id'].isin(cat_subcats)]['id'].tolist()
-                all_relevant_product_ids.update(cat_products)
-            
-            # Add products from selected departments
-            for dept_id in selected_dept_ids:
-                dept_cats = categories[categories['department_id'] == dept_id]['id'].tolist()
-                dept_subcats = subcategories[subcategories['category_id'].isin(dept_cats)]['id'].tolist()
-                dept_products = products[products['subcategory_id'].isin(dept_subcats)]['id'].tolist()
-                all_relevant_product_ids.update(dept_products)
+            selection = resolve_selection(return_select['checked'], products, categories, subcategories)
+            all_relevant_product_ids = selection['relevant_product_ids']
+            review_queue_ids = all_relevant_product_ids
             
             if all_relevant_product_ids:
+                # Aggregate temporal quality once for every chart, metric and insight
+                exact_future = None
+                if approximate_mode:
+                    selection_aggregate, exact_future = get_approximate_aggregate(
+                        selection, get_data_version(PLACEMENT_SCOPE), granularity, period_window, quality_sample
+                    )
+                else:
+                    price_sketches = get_granular_price_sketches(get_data_version(PLACEMENT_SCOPE), granularity)
+                    selection_aggregate = compute_selection_aggregate(selection, rollups, period_window, price_sketches)
+                
+                if exact_future is not None and exact_future.done():
+                    st.error(f"Exact results could not be computed ({exact_future.exception()}); "
+                             "showing sampled estimates.")
+                elif exact_future is not None:
+                    show_exact_aggregate_poller(exact_future)
+                
                 # Show selection summary
                 col2_1, col2_2, col2_3 = st.columns(3)
                 
                 with col2_1:
-                    total_selections = len(selected_dept_ids) + len(selected_cat_ids) + len(selected_subcat_ids) + len(selected_product_ids)
+                    total_selections = (len(selection['dept_ids']) + len(selection['cat_ids']) +
+                                        len(selection['subcat_ids']) + len(selection['product_ids']))
                     st.metric("Total Selections", total_selections)
                 
                 with col2_2:
                     st.metric("Relevant Products", len(all_relevant_product_ids))
                 
                 with col2_3:
-                    # Calculate quality distribution for current period
-                    current_quality = temporal_quality[
-                        (temporal_quality['product_id'].isin(list(all_relevant_product_ids))) &
-                        (temporal_quality['period_id'] == '2023-12')  # Latest period
-                    ]
-                    good_count = len(current_quality[current_quality['quality'] == 'good'])
-                    st.metric("Current Good Quality", f"{good_count}")
-                
-                # ========== BULK OPERATIONS PANEL ==========
-                st.markdown("---")
-                st.markdown("### 🔧 Bulk Operations")
-                
-                # Filter selected products by status
-                status_breakdown = filter_selected_products_by_status(list(all_relevant_product_ids), products)
-                
-                # Show status breakdown of selections
-                col_status1, col_status2, col_status3, col_status4 = st.columns(4)
-                
-                with col_status1:
-                    rec_count = len(status_breakdown['recommended'])
-                    st.metric("🔍 Recommended", rec_count)
-                
-                with col_status2:
-                    app_count = len(status_breakdown['approved'])
-                    st.metric("📦 Approved", app_count)
-                
-                with col_status3:
-                    rej_count = len(status_breakdown['rejected'])
-                    st.metric("❌ Rejected", rej_count)
-                
-                with col_status4:
-                    total_actionable = rec_count + rej_count  # Can approve recommended or re-approve rejected
-                    st.metric("⚡ Actionable", total_actionable)
-                
-                # Bulk Action Controls - Only show if there are actionable items
-                if rec_count > 0 or rej_count > 0:
-                    st.markdown("#### 🎯 Bulk Actions")
-                    
-                    # Action buttons
-                    col_btn1, col_btn2, col_btn3, col_btn4 = st.columns(4)
-                    
-                    with col_btn1:
-                        if rec_count > 0:
-                            if st.button(f"✅ Approve All Recommended ({rec_count})", 
-                                       type="primary", 
-                                       use_container_width=True,
-                                       key="bulk_approve"):
-                                
-                                # Confirmation dialog
-                                recommended_ids = status_breakdown['recommended']['id'].tolist()
-                                recommended_names = status_breakdown['recommended']['name'].tolist()
-                                
-                                with st.expander("⚠️ Confirm Bulk Approval", expanded=True):
-                                    st.warning(f"You are about to approve {rec_count} recommended products:")
-                                    for name in recommended_names[:5]:  # Show first 5
-                                        st.write(f"• {name}")
-                                    if len(recommended_names) > 5:
-                                        st.write(f"• ... and {len(recommended_names) - 5} more")
-                                    
-                                    reason = st.text_input("Approval reason (optional):", 
-                                                         value="Bulk approval - management review",
-                                                         key="approve_reason")
-                                    
-                                    col_confirm1, col_confirm2 = st.columns(2)
-                                    with col_confirm1:
-                                        if st.button("✅ Confirm Approval", type="primary", key="confirm_approve"):
-                                            # Perform bulk approval
-                                            updated_count = bulk_update_product_status(
-                                                recommended_ids, 
-                                                'approved', 
-                                                reviewed_by="Manager",
-                                                review_reason=reason
-                                            )
-                                            
-                                            st.success(f"✅ Successfully approved {updated_count} products!")
-                                            st.rerun()
-                                    
-                                    with col_confirm2:
-                                        if st.button("❌ Cancel", key="cancel_approve"):
-                                            st.rerun()
-                    
-                    with col_btn2:
-                        if rec_count > 0:
-                            if st.button(f"❌ Reject All Recommended ({rec_count})", 
-                                       type="secondary", 
-                                       use_container_width=True,
-                                       key="bulk_reject"):
-                                
-                                # Confirmation dialog
-                                recommended_ids = status_breakdown['recommended']['id'].tolist()
-                                recommended_names = status_breakdown['recommended']['name'].tolist()
-                                
-                                with st.expander("⚠️ Confirm Bulk Rejection", expanded=True):
-                                    st.error(f"You are about to reject {rec_count} recommended products:")
-                                    for name in recommended_names[:5]:  # Show first 5
-                                        st.write(f"• {name}")
-                                    if len(recommended_names) > 5:
-                                        st.write(f"• ... and {len(recommended_names) - 5} more")
-                                    
-                                    reason = st.text_input("Rejection reason:", 
-                                                         placeholder="Why are these products being rejected?",
-                                                         key="reject_reason")
-                                    
-                                    if reason:  # Only allow rejection with a reason
-                                        col_confirm1, col_confirm2 = st.columns(2)
-                                        with col_confirm1:
-                                            if st.button("❌ Confirm Rejection", type="primary", key="confirm_reject"):
-                                                # Perform bulk rejection
-                                                updated_count = bulk_update_product_status(
-                                                    recommended_ids, 
-                                                    'rejected', 
-                                                    reviewed_by="Manager",
-                                                    review_reason=reason
-                                                )
-                                                
-                                                st.success(f"❌ Successfully rejected {updated_count} products!")
-                                                st.rerun()
-                                        
-                                        with col_confirm2:
-                                            if st.button("🔙 Cancel", key="cancel_reject"):
-                                                st.rerun()
-                                    else:
-                                        st.info("💡 Please provide a reason for rejection")
-                    
-                    with col_btn3:
-                        if rec_count > 0:
-                            if st.button(f"🔄 Approve & Move ({rec_count})", 
-                                       use_container_width=True,
-                                       key="bulk_approve_move"):
-                                # Show the Approve & Move modal (double width)
-                                # Use custom CSS to make the expander wider
-                                st.markdown("""
-                                <style>
-                                .approve-move-modal .stExpander > div:first-child {
-                                    width: 200% !important;
-                                    max-width: none !important;
-                                }
-                                </style>
-                                """, unsafe_allow_html=True)
-                                
-                                with st.container():
-                                    st.markdown('<div class="approve-move-modal">', unsafe_allow_html=True)
-                                    with st.expander("🔄 Approve & Move Products", expanded=True):
-                                        recommended_ids = status_breakdown['recommended']['id'].tolist()
-                                        recommended_products = status_breakdown['recommended']
-                                        
-                                        st.warning(f"You are approving {rec_count} recommended products:")
-                                        
-                                        # Bulk destination selector
-                                        st.markdown("#### 🎯 Move all products to:")
-                                        col_dest1, col_dest2, col_dest3 = st.columns(3)
-                                        
-                                        with col_dest1:
-                                            dept_options = [(dept['id'], dept['name']) for _, dept in departments.iterrows()]
-                                            selected_dept = st.selectbox(
-                                                "Department",
-                                                options=[opt[0] for opt in dept_options],
-                                                format_func=lambda x: next(opt[1] for opt in dept_options if opt[0] == x),
-                                                key="bulk_move_dept"
-                                            )
-                                        
-                                        with col_dest2:
-                                            dept_categories = categories[categories['department_id'] == selected_dept]
-                                            cat_options = [(cat['id'], cat['name']) for _, cat in dept_categories.iterrows()]
-                                            if cat_options:
-                                                selected_cat = st.selectbox(
-                                                    "Category",
-                                                    options=[opt[0] for opt in cat_options],
-                                                    format_func=lambda x: next(opt[1] for opt in cat_options if opt[0] == x),
-                                                    key="bulk_move_cat"
-                                                )
-                                            else:
-                                                st.warning("No categories in selected department")
-                                                selected_cat = None
-                                        
-                                        with col_dest3:
-                                            if selected_cat:
-                                                cat_subcategories = subcategories[subcategories['category_id'] == selected_cat]
-                                                subcat_options = [(subcat['id'], subcat['name']) for _, subcat in cat_subcategories.iterrows()]
-                                                if subcat_options:
-                                                    selected_subcat = st.selectbox(
-                                                        "Subcategory",
-                                                        options=[opt[0] for opt in subcat_options],
-                                                        format_func=lambda x: next(opt[1] for opt in subcat_options if opt[0] == x),
-                                                        key="bulk_move_subcat"
-                                                    )
-                                                else:
-                                                    st.warning("No subcategories in selected category")
-                                                    selected_subcat = None
-                                            else:
-                                                selected_subcat = None
-                                    
-                                        # Show destination path
-                                        if selected_dept and selected_cat and selected_subcat:
-                                            dest_dept = departments[departments['id'] == selected_dept]['name'].iloc[0]
-                                            dest_cat = categories[categories['id'] == selected_cat]['name'].iloc[0]
-                                            dest_subcat = subcategories[subcategories['id'] == selected_subcat]['name'].iloc[0]
-                                            dest_path = f"{dest_dept} > {dest_cat} > {dest_subcat}"
-                                            st.info(f"📍 Destination: {dest_path}")
-                                        
-                                            # Show products being moved
-                                            st.markdown("#### 📦 Products to approve & move:")
-                                            for _, product in recommended_products.iterrows():
-                                                current_path = get_product_hierarchy_path(
-                                                    product['id'], products, subcategories, categories, departments
-                                                )
-                                                col_prod1, col_prod2 = st.columns([1, 1])
-                                                with col_prod1:
-                                                    st.write(f"**{product['name']}**")
-                                                    st.caption(f"Currently: {current_path}")
-                                                with col_prod2:
-                                                    st.write("→")
-                                                    st.caption(f"Moving to: {dest_path}")
-                                        
-                                            # Action buttons
-                                            col_confirm1, col_confirm2 = st.columns(2)
-                                            with col_confirm1:
-                                                if st.button("✅ Confirm Approve & Move All", type="primary", key="confirm_approve_move"):
-                                                    # Validate destination exists
-                                                    if validate_category_path(selected_dept, selected_cat, selected_subcat, 
-                                                                             departments, categories, subcategories):
-                                                        # Execute approve + move operation
-                                                        results = bulk_approve_and_move(recommended_ids, selected_subcat)
-                                                        st.success(f"✅ Approved and moved {results} products!")
-                                                        st.rerun()
-                                                    else:
-                                                        st.error("❌ Invalid destination category. Please select a valid path.")
-                                            
-                                            with col_confirm2:
-                                                if st.button("❌ Cancel", key="cancel_approve_move"):
-                                                    st.rerun()
-                                        else:
-                                            st.warning("⚠️ Please select a complete destination path (Department > Category > Subcategory)")
-                                    st.markdown('</div>', unsafe_allow_html=True)
-                    
-                    with col_btn4:
-                        st.button("📊 Review History", 
-                                use_container_width=True,
-                                key="view_history",
-                                help="History tracking will be implemented in Phase 3")
-                
-                elif app_count > 0:
-                    st.info("📦 Selected products are already approved. Use filters to view recommended products for bulk actions.")
-                else:
-                    st.info("🔍 Select some recommended products to see bulk action options.")
-                
-                # ========== END BULK OPERATIONS PANEL ==========
-                
-                st.markdown("---")
-                st.markdown("### 📊 Quality Evolution Over Time")
+                    # Good quality count for the latest period in the time window
+                    good_count = selection_aggregate['latest_counts'].get('good', 0)
+                    st.metric("Current Good Quality", f"{good_count}",
+                              help=f"Latest period: {selection_aggregate['latest_period_name']}")
                 
-                # Create and display quality distribution chart
-                dist_chart = create_quality_distribution_chart(list(all_relevant_product_ids), temporal_quality)
-                if dist_chart:
-                    st.plotly_chart(dist_chart, use_container_width=True, config={'displayModeBar': False})
+                show_export_panel(all_relevant_product_ids, products, temporal_quality, "tree")
+                show_bulk_operations_panel(all_relevant_product_ids, products, departments, categories, subcategories)
+                show_quality_charts_panel(selection_aggregate, get_data_version(PLACEMENT_SCOPE))
                 
-                # Show quality trend analysis
-                st.markdown("#### 📈 Quality Trend Analysis")
-                
-                # Calculate quality trends
-                filtered_temporal = temporal_quality[temporal_quality['product_id'].isin(list(all_relevant_product_ids))]
-                
-                if not filtered_temporal.empty:
-                    quality_trends = (
-                        filtered_temporal.groupby(['period_index', 'period_name', 'quality'])
-                        .size()
-                        .unstack(fill_value=0)
-                        .reset_index()
-                        .sort_values('period_index')  # Sort by chronological order
-                    )
-                    
-                    # Show key insights
-                    col_insight1, col_insight2 = st.columns(2)
-                    
-                    with col_insight1:
-                        st.markdown("**📊 Quality Trends:**")
-                        if 'good' in quality_trends.columns:
-                            good_trend = quality_trends['good'].iloc[-1] - quality_trends['good'].iloc[0]
-                            if good_trend > 0:
-                                st.success(f"🟢 Good quality increased by {good_trend} products")
-                            elif good_trend < 0:
-                                st.error(f"🔴 Good quality decreased by {abs(good_trend)} products")
-                            else:
-                                st.info("🟡 Good quality remained stable")
-                    
-                    with col_insight2:
-                        st.markdown("**🎯 Best/Worst Periods:**")
-                        if 'good' in quality_trends.columns:
-                            best_period = quality_trends.loc[quality_trends['good'].idxmax(), 'period_name']
-                            worst_period = quality_trends.loc[quality_trends['good'].idxmin(), 'period_name']
-                            st.info(f"🏆 Best: {best_period}")
-                            st.warning(f"⚠️ Worst: {worst_period}")
-                    
-                    # Show detailed breakdown
-                    with st.expander("📋 View Detailed Quality Data"):
-                        st.dataframe(
-                            quality_trends,
-                            use_container_width=True,
-                            hide_index=True
-                        )
-                else:
-                    st.warning("No temporal quality data available for selected items")
+                # Trend rankings and comparisons use the exact rollups (once ready in approximate mode)
+                comparison_rollups, trend_features = None, None
+                if exact_future is None:
+                    comparison_rollups = get_granular_rollups(get_data_version(PLACEMENT_SCOPE), granularity)
+                    trend_features = get_product_trend_features(get_data_version(PLACEMENT_SCOPE), granularity)
+                show_trend_outliers_panel(all_relevant_product_ids, products, trend_features)
+                show_comparison_panel(all_relevant_product_ids, comparison_rollups, period_window)
             else:
                 st.info("Select items from the tree to see quality evolution")
         else:
             st.info("No items selected. Use the tree on the left to explore the hierarchy.")
     
-    # Additional insights section
-    st.markdown('<h2 class="section-header">💡 Tree Insights</h2>', unsafe_allow_html=True)
+    show_review_queue(subcategories, review_queue_ids)
+    show_triage_panel(products)
+    show_mapping_move_panel(products, departments, categories, subcategories)
     
-    if return_select and return_select.get('checked'):
-        selected_values = return_select['checked']
-        
-        # Analyze what's expanded vs selected
-        expanded_values = return_select.get('expanded', [])
-        
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown("#### 🔽 Expanded Nodes")
-            expanded_display = []
-            for value in expanded_values:
-                if value.startswith('dept_'):
-                    dept_id = int(value.replace('dept_', ''))
-                    dept_name = departments[departments['id'] == dept_id]['name'].iloc[0]
-                    expanded_display.append(f"📁 {dept_name}")
-                elif value.startswith('cat_'):
-                    cat_id = int(value.replace('cat_', ''))
-                    cat_name = categories[categories['id'] == cat_id]['name'].iloc[0]
-                    expanded_display.append(f"📂 {cat_name}")
-            
-            if expanded_display:
-                for item in expanded_display:
-                    st.write(item)
-            else:
-                st.info("No nodes expanded")
-        
-        with col2:
-            st.markdown("#### ✅ Selected Nodes")
-            selected_display = []
-            for value in selected_values:
-                if value.startswith('dept_'):
-                    dept_id = int(value.replace('dept_', ''))
-                    dept_name = departments[departments['id'] == dept_id]['name'].iloc[0]
-                    selected_display.append(f"🏢 {dept_name}")
-                elif value.startswith('cat_'):
-                    cat_id = int(value.replace('cat_', ''))
-                    cat_name = categories[categories['id'] == cat_id]['name'].iloc[0]
-                    selected_display.append(f"📂 {cat_name}")
-                elif value.startswith('subcat_'):
-                    subcat_id = int(value.replace('subcat_', ''))
-                    subcat_name = subcategories[subcategories['id'] == subcat_id]['name'].iloc[0]
-                    selected_display.append(f"🏷️ {subcat_name}")
-                elif value.startswith('product_'):
-                    product_id = int(value.replace('product_', ''))
-                    product_name = products[products['id'] == product_id]['name'].iloc[0]
-                    selected_display.append(f"🛒 {product_name}")
-            
-            if selected_display:
-                for item in selected_display:
-                    st.write(item)
-            else:
-                st.info("No items selected")
+    # Additional insights section
+    show_tree_insights_panel(return_select, departments, categories, subcategories, products)
 
 
 
@@ -1275,6 +3396,9 @@ def main():
             st.session_state.current_page = 'Tree Hierarchy'
             st.rerun()
     
+    # Pick up changes committed by other sessions
+    watch_data_version()
+    
     # Route to appropriate page
     if st.session_state.current_page == "Documentation":
         show_documentation()
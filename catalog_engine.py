@@ -0,0 +1,662 @@
+"""
+Catalog Engine
+
+Headless catalog operations shared by the Streamlit app and the scripts in scripts/:
+- Reading the hierarchy and products from a data directory
+- Resolving hierarchy selections to product ids
+- Vectorized validation of destination subcategories
+- Batched status and placement changes, each committed with one products.csv write
+  plus the approval history, undo change set, decision analytics and data version updates
+
+Nothing here depends on Streamlit. Callers that run alongside the app hold
+products_file_lock() around every operation that rewrites products.csv. Operations
+called with commit=False only prepare their change, which commit_product_changes()
+later merges into the current products.csv under the lock.
+"""
+
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: commits are only serialized within one process
+    fcntl = None
+
+DATA_DIR = Path("data")
+
+# Data files loaded by the app, in load_data() return order
+DATA_FILES = ["departments.csv", "categories.csv", "subcategories.csv", "products.csv", "temporal_quality.csv"]
+
+# Files the engine maintains, relative to the data directory
+DATA_VERSION_FILE = Path("data_version.json")
+COMMIT_LOCK_FILE = Path(".commit.lock")
+HISTORY_FILE = Path("workflow_tracking") / "approval_history.csv"
+DECISION_ANALYTICS_FILE = Path("workflow_tracking") / "decision_analytics.csv"
+CHANGE_SET_FILE = Path("workflow_tracking") / "change_sets.jsonl"
+UNDO_STATE_FILE = Path("workflow_tracking") / "undo_state.json"
+
+PRODUCT_STATUSES = ['approved', 'recommended', 'rejected']
+# Columns that may be empty are read as text so a rewrite keeps them as they were
+PRODUCT_DTYPES = {'sku': object, 'barcode': object, 'description': object, 'reviewed_by': object, 'review_date': object}
+
+def load_hierarchy(data_dir=DATA_DIR):
+    """Read departments, categories and subcategories"""
+    data_dir = Path(data_dir)
+    return tuple(pd.read_csv(data_dir / file_name) for file_name in DATA_FILES[:3])
+
+def read_products(data_dir=DATA_DIR):
+    """Read the committed products table"""
+    return pd.read_csv(Path(data_dir) / "products.csv", dtype=PRODUCT_DTYPES)
+
+def encode_ids(ids, vocabulary_ids):
+    """Map ids to their position in vocabulary_ids (-1 if absent) with a dense lookup"""
+    ids = np.asarray(ids, dtype=np.int64)
+    vocabulary_ids = np.asarray(vocabulary_ids, dtype=np.int64)
+    if len(vocabulary_ids) == 0:
+        return np.full(len(ids), -1, dtype=np.int64)
+    
+    lookup = np.full(max(int(vocabulary_ids.max()), int(ids.max(initial=0))) + 1, -1, dtype=np.int64)
+    lookup[vocabulary_ids] = np.arange(len(vocabulary_ids))
+    codes = np.full(len(ids), -1, dtype=np.int64)
+    valid = ids >= 0
+    codes[valid] = lookup[ids[valid]]
+    return codes
+
+def to_id_array(ids):
+    """Coerce ids (scalars, lists, arrays, possibly with blanks) to int64; unusable ids become -1"""
+    ids = pd.to_numeric(pd.Series(np.atleast_1d(np.asarray(ids, dtype=object))), errors='coerce')
+    return ids.where(ids.notna() & (ids == ids.round()), -1).to_numpy(dtype=np.int64)
+
+def build_hierarchy_index(departments, categories, subcategories):
+    """Build dense id lookup arrays mapping subcategories up the hierarchy"""
+    max_cat_id = int(categories['id'].max()) if len(categories) > 0 else 0
+    max_subcat_id = int(subcategories['id'].max()) if len(subcategories) > 0 else 0
+    
+    # Category id -> department id (-1 where the id does not exist)
+    cat_to_dept = np.full(max_cat_id + 1, -1, dtype=np.int64)
+    cat_to_dept[categories['id'].to_numpy()] = categories['department_id'].to_numpy()
+    
+    # Subcategory id -> category id and department id
+    subcat_to_cat = np.full(max_subcat_id + 1, -1, dtype=np.int64)
+    subcat_to_cat[subcategories['id'].to_numpy()] = subcategories['category_id'].to_numpy()
+    subcat_to_dept = np.where(subcat_to_cat >= 0, cat_to_dept[np.clip(subcat_to_cat, 0, None)], -1)
+    
+    return {
+        'cat_to_dept': cat_to_dept,
+        'subcat_to_cat': subcat_to_cat,
+        'subcat_to_dept': subcat_to_dept
+    }
+
+def lookup_ids(lookup, ids):
+    """Index a dense lookup array, giving -1 for ids outside it"""
+    inside = (ids >= 0) & (ids < len(lookup))
+    return np.where(inside, lookup[np.where(inside, ids, 0)], -1)
+
+def validate_category_paths(dept_ids, cat_ids, subcat_ids, departments, categories, subcategories):
+    """Vectorized check that each subcategory exists under its category and department"""
+    dept_ids, cat_ids, subcat_ids = to_id_array(dept_ids), to_id_array(cat_ids), to_id_array(subcat_ids)
+    hierarchy = build_hierarchy_index(departments, categories, subcategories)
+    return ((lookup_ids(hierarchy['subcat_to_cat'], subcat_ids) == cat_ids) &
+            (lookup_ids(hierarchy['cat_to_dept'], cat_ids) == dept_ids) &
+            np.isin(dept_ids, departments['id'].to_numpy()) & (subcat_ids >= 0))
+
+def validate_category_path(dept_id, cat_id, subcat_id, departments, categories, subcategories):
+    """Validate that the category hierarchy path is valid"""
+    return bool(validate_category_paths(dept_id, cat_id, subcat_id, departments, categories, subcategories)[0])
+
+def find_unknown_ids(ids, known_ids):
+    """Distinct ids missing from known_ids, in one vectorized pass"""
+    ids = to_id_array(ids)
+    return np.unique(ids[encode_ids(ids, known_ids) < 0])
+
+def build_hierarchy_paths(subcategory_ids, departments, categories, subcategories):
+    """Vectorized "Department > Category > Subcategory" paths for an array of subcategory ids"""
+    # One path per subcategory from two joins, then a positional lookup per product
+    subcategory_paths = subcategories[['id', 'name', 'category_id']].merge(
+        categories[['id', 'name', 'department_id']], left_on='category_id', right_on='id',
+        how='left', suffixes=('', '_category')
+    ).merge(
+        departments[['id', 'name']], left_on='department_id', right_on='id',
+        how='left', suffixes=('', '_department')
+    )
+    paths = (subcategory_paths['name_department'] + " > " + subcategory_paths['name_category']
+             + " > " + subcategory_paths['name']).fillna("Unknown").to_numpy(dtype=object)
+    
+    positions = encode_ids(np.asarray(subcategory_ids), subcategory_paths['id'].to_numpy())
+    return np.where(positions >= 0, paths[np.maximum(positions, 0)], "Unknown")
+
+def parse_selection_values(selected_values):
+    """Split tree values ('dept_1', 'cat_4', 'subcat_9', 'product_12') into id lists per level"""
+    selection = {
+        'dept_ids': [],
+        'cat_ids': [],
+        'subcat_ids': [],
+        'product_ids': []
+    }
+    
+    for value in selected_values:
+        if value.startswith('dept_'):
+            selection['dept_ids'].append(int(value.replace('dept_', '')))
+        elif value.startswith('cat_'):
+            selection['cat_ids'].append(int(value.replace('cat_', '')))
+        elif value.startswith('subcat_'):
+            selection['subcat_ids'].append(int(value.replace('subcat_', '')))
+        elif value.startswith('product_'):
+            selection['product_ids'].append(int(value.replace('product_', '')))
+    return selection
+
+def expand_selection(selection, products, categories, subcategories):
+    """Add 'relevant_product_ids': every product under the selected departments, categories and subcategories"""
+    selection = {level: list(selection.get(level, [])) for level in ('dept_ids', 'cat_ids', 'subcat_ids', 'product_ids')}
+    
+    # Expand departments and categories down to subcategories
+    dept_cat_ids = categories[categories['department_id'].isin(selection['dept_ids'])]['id']
+    all_cat_ids = set(selection['cat_ids']).union(dept_cat_ids)
+    all_subcat_ids = set(selection['subcat_ids']).union(
+        subcategories[subcategories['category_id'].isin(all_cat_ids)]['id']
+    )
+    
+    # Build comprehensive product filter based on all selections
+    relevant_product_ids = set(selection['product_ids']).union(
+        products[products['subcategory_id'].isin(all_subcat_ids)]['id']
+    )
+    selection['relevant_product_ids'] = sorted(relevant_product_ids)
+    
+    return selection
+
+def resolve_selection(selected_values, products, categories, subcategories):
+    """Parse checked tree values and resolve them to the set of relevant product ids"""
+    return expand_selection(parse_selection_values(selected_values), products, categories, subcategories)
+
+# Commits: products.csv is rewritten atomically and a small version file tells readers what changed
+def get_file_stat(file_path):
+    """mtime/size token of a data file"""
+    if not file_path.exists():
+        return "missing"
+    stat = file_path.stat()
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def read_data_version_state(data_dir=DATA_DIR):
+    """Committed version counters: global, per data file, and product placement"""
+    version_path = Path(data_dir) / DATA_VERSION_FILE
+    if not version_path.exists():
+        return {'version': 0, 'tables': {}, 'placement': 0}
+    with open(version_path) as version_file:
+        return json.load(version_file)
+
+def write_products_csv(products_df, data_dir=DATA_DIR):
+    """Rewrite products.csv atomically so concurrent readers never see a partial file"""
+    products_path = Path(data_dir) / "products.csv"
+    temporary_path = products_path.with_suffix('.csv.tmp')
+    products_df.to_csv(temporary_path, index=False)
+    temporary_path.replace(products_path)
+
+@contextmanager
+def products_file_lock(data_dir=DATA_DIR):
+    """Cross-process lock held by every writer of products.csv (app jobs and scripts)"""
+    with open(Path(data_dir) / COMMIT_LOCK_FILE, 'w') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def bump_data_version(file_names, placement_changed=False, data_dir=DATA_DIR):
+    """Record a committed rewrite of file_names (callers hold products_file_lock)"""
+    data_dir = Path(data_dir)
+    state = read_data_version_state(data_dir)
+    state['version'] += 1
+    for file_name in file_names:
+        table_state = state['tables'].setdefault(file_name, {'version': 0})
+        table_state['version'] += 1
+        table_state['stat'] = get_file_stat(data_dir / file_name)
+    if placement_changed:
+        state['placement'] += 1
+    
+    version_path = data_dir / DATA_VERSION_FILE
+    temporary_path = version_path.with_suffix('.tmp')
+    with open(temporary_path, 'w') as version_file:
+        json.dump(state, version_file)
+    temporary_path.replace(version_path)
+    return state['version']
+
+# Append-only approval history (schema from RECOMMENDED_PRODUCTS_PLAN.md, plus subcategory moves)
+HISTORY_COLUMNS = [
+    'history_id', 'product_id', 'product_name', 'action',
+    'previous_status', 'new_status', 'previous_subcategory_id', 'new_subcategory_id',
+    'reviewed_by', 'review_date', 'decision_reason', 'bulk_operation_id'
+]
+HISTORY_DTYPES = {'product_name': object, 'reviewed_by': object, 'review_date': object,
+                  'decision_reason': object, 'bulk_operation_id': object}
+
+def read_last_history_id(data_dir=DATA_DIR):
+    """Read the last history_id from the tail of the log without scanning it"""
+    history_path = Path(data_dir) / HISTORY_FILE
+    if not history_path.exists() or history_path.stat().st_size == 0:
+        return -1
+    with open(history_path, 'rb') as history_file:
+        history_file.seek(max(0, history_path.stat().st_size - 4096))
+        last_line = history_file.read().rstrip(b'\n').rsplit(b'\n', 1)[-1]
+    first_field = last_line.split(b',', 1)[0]
+    return int(first_field) if first_field.isdigit() else -1
+
+def record_approval_history(before, after, reviewed_by, review_date, decision_reason="", data_dir=DATA_DIR):
+    """Append one history row per changed product; before/after hold id, name, status and subcategory_id"""
+    changed = (before['status'].to_numpy() != after['status'].to_numpy()) | \
+              (before['subcategory_id'].to_numpy() != after['subcategory_id'].to_numpy())
+    before, after = before[changed], after[changed]
+    if len(before) == 0:
+        return 0
+    
+    # Moves are recorded as 'moved'; other rows take the new status as their action
+    moved = before['subcategory_id'].to_numpy() != after['subcategory_id'].to_numpy()
+    first_id = read_last_history_id(data_dir) + 1
+    history = pd.DataFrame({
+        'history_id': np.arange(first_id, first_id + len(before)),
+        'product_id': before['id'].to_numpy(),
+        'product_name': before['name'].to_numpy(),
+        'action': np.where(moved, 'moved', after['status'].to_numpy()),
+        'previous_status': before['status'].to_numpy(),
+        'new_status': after['status'].to_numpy(),
+        'previous_subcategory_id': before['subcategory_id'].to_numpy(),
+        'new_subcategory_id': after['subcategory_id'].to_numpy(),
+        'reviewed_by': reviewed_by,
+        'review_date': review_date,
+        'decision_reason': decision_reason,
+        'bulk_operation_id': f"bulk_{review_date.replace(' ', '_').replace(':', '')}_{first_id}"
+    }, columns=HISTORY_COLUMNS)
+    
+    history_path = Path(data_dir) / HISTORY_FILE
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    write_header = not history_path.exists() or history_path.stat().st_size == 0
+    history.to_csv(history_path, mode='a', header=write_header, index=False)
+    return len(history)
+
+# Decision analytics: running counters per (reviewer, subcategory, source, day), kept in step with products.csv
+DECISION_ANALYTICS_KEYS = ['reviewed_by', 'subcategory_id', 'recommendation_source', 'review_day']
+DECISION_ANALYTICS_COUNTERS = ['approved', 'rejected', 'decision_seconds', 'timed_decisions']
+DECISION_CONTEXT_COLUMNS = ['recommendation_source', 'recommendation_date']
+
+def decision_contributions(products):
+    """Counter contributions of decided products (status, reviewer, subcategory and context columns)"""
+    decided = products[products['status'].isin(['approved', 'rejected'])]
+    review_dates = pd.to_datetime(decided['review_date'], errors='coerce')
+    decision_seconds = (review_dates - pd.to_datetime(decided['recommendation_date'], errors='coerce')).dt.total_seconds()
+    contributions = pd.DataFrame({
+        'reviewed_by': decided['reviewed_by'].fillna("Unknown").to_numpy(),
+        'subcategory_id': decided['subcategory_id'].to_numpy(),
+        'recommendation_source': decided['recommendation_source'].fillna("Unknown").to_numpy(),
+        'review_day': review_dates.dt.strftime('%Y-%m-%d').fillna("Unknown").to_numpy(),
+        'approved': (decided['status'] == 'approved').to_numpy(dtype=int),
+        'rejected': (decided['status'] == 'rejected').to_numpy(dtype=int),
+        'decision_seconds': decision_seconds.fillna(0).to_numpy(),
+        'timed_decisions': decision_seconds.notna().to_numpy(dtype=int)
+    })
+    return contributions.groupby(DECISION_ANALYTICS_KEYS, as_index=False)[DECISION_ANALYTICS_COUNTERS].sum()
+
+def write_decision_analytics(analytics, data_dir=DATA_DIR):
+    """Replace the counters file atomically, dropping keys whose counters fell to zero"""
+    analytics = analytics[(analytics['approved'] != 0) | (analytics['rejected'] != 0)]
+    analytics_path = Path(data_dir) / DECISION_ANALYTICS_FILE
+    analytics_path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = analytics_path.with_suffix('.tmp')
+    analytics.sort_values(DECISION_ANALYTICS_KEYS).to_csv(temporary_path, index=False)
+    temporary_path.replace(analytics_path)
+    return analytics
+
+def read_decision_analytics(data_dir=DATA_DIR):
+    """Materialized counters, built with one products scan the first time they are needed"""
+    analytics_path = Path(data_dir) / DECISION_ANALYTICS_FILE
+    if not analytics_path.exists():
+        return write_decision_analytics(decision_contributions(read_products(data_dir)), data_dir)
+    return pd.read_csv(analytics_path, dtype={'reviewed_by': object, 'recommendation_source': object,
+                                              'review_day': object})
+
+def update_decision_analytics(products_df, mask, before, data_dir=DATA_DIR):
+    """Apply one commit's delta: retract the touched rows' old contributions and add their new ones"""
+    if not (Path(data_dir) / DECISION_ANALYTICS_FILE).exists():
+        # First commit since the counters existed: products_df already holds the committed state
+        return write_decision_analytics(decision_contributions(products_df), data_dir)
+    
+    context = products_df.loc[mask, DECISION_CONTEXT_COLUMNS]
+    added = decision_contributions(products_df.loc[mask, CHANGE_SET_COLUMNS].join(context))
+    retracted = decision_contributions(before[CHANGE_SET_COLUMNS].join(context))
+    retracted[DECISION_ANALYTICS_COUNTERS] = -retracted[DECISION_ANALYTICS_COUNTERS]
+    
+    analytics = pd.concat([read_decision_analytics(data_dir), added, retracted], ignore_index=True)
+    analytics = analytics.groupby(DECISION_ANALYTICS_KEYS, as_index=False)[DECISION_ANALYTICS_COUNTERS].sum()
+    return write_decision_analytics(analytics, data_dir)
+
+# Undo/redo: each bulk operation is kept as a change set of only the rows it touched
+CHANGE_SET_COLUMNS = ['status', 'subcategory_id', 'reviewed_by', 'review_date']
+
+def to_json_values(values):
+    """Convert a column of touched values to JSON-safe Python values (missing -> None)"""
+    return [None if pd.isna(value) else (value.item() if hasattr(value, 'item') else value) for value in values]
+
+def load_undo_state(data_dir=DATA_DIR):
+    """Undo and redo stacks of change-set entries (id, byte offset, description)"""
+    state_path = Path(data_dir) / UNDO_STATE_FILE
+    if not state_path.exists():
+        return {'next_id': 1, 'undo': [], 'redo': []}
+    with open(state_path) as state_file:
+        return json.load(state_file)
+
+def save_undo_state(state, data_dir=DATA_DIR):
+    """Replace the stack file atomically"""
+    state_path = Path(data_dir) / UNDO_STATE_FILE
+    temporary_path = state_path.with_suffix('.tmp')
+    with open(temporary_path, 'w') as state_file:
+        json.dump(state, state_file)
+    temporary_path.replace(state_path)
+
+def record_change_set(before, after, description, data_dir=DATA_DIR):
+    """Append the touched rows' before/after values and push the change set on the undo stack"""
+    change_set_path = Path(data_dir) / CHANGE_SET_FILE
+    change_set_path.parent.mkdir(parents=True, exist_ok=True)
+    state = load_undo_state(data_dir)
+    change_set = {
+        'id': state['next_id'],
+        'description': description,
+        'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'product_ids': to_json_values(before['id']),
+        'before': {column: to_json_values(before[column]) for column in CHANGE_SET_COLUMNS},
+        'after': {column: to_json_values(after[column]) for column in CHANGE_SET_COLUMNS}
+    }
+    
+    offset = change_set_path.stat().st_size if change_set_path.exists() else 0
+    with open(change_set_path, 'a') as change_set_file:
+        change_set_file.write(json.dumps(change_set) + "\n")
+    
+    # A new operation starts a new branch of history, so nothing is left to redo
+    state['undo'].append({'id': change_set['id'], 'offset': offset, 'description': description,
+                          'product_count': len(change_set['product_ids'])})
+    state['redo'] = []
+    state['next_id'] += 1
+    save_undo_state(state, data_dir)
+    return change_set['id']
+
+def read_change_set(entry, data_dir=DATA_DIR):
+    """Seek straight to one change set in the log"""
+    with open(Path(data_dir) / CHANGE_SET_FILE, 'rb') as change_set_file:
+        change_set_file.seek(entry['offset'])
+        return json.loads(change_set_file.readline())
+
+def change_set_values(change_set, direction):
+    """Target and expected values of a change set's rows, indexed by product id ('undo' restores 'before')"""
+    expected_side, target_side = ('after', 'before') if direction == 'undo' else ('before', 'after')
+    index = pd.Index(np.asarray(change_set['product_ids'], dtype=np.int64), name='id')
+    return (pd.DataFrame(change_set[target_side], columns=CHANGE_SET_COLUMNS, index=index),
+            pd.DataFrame(change_set[expected_side], columns=CHANGE_SET_COLUMNS, index=index))
+
+# Batched operations: prepared from a snapshot without any lock, then merged into the current products.csv
+# and written once under products_file_lock, so jobs on disjoint products only serialize for the write
+def check_product_ids(product_ids, products_df):
+    """Distinct product ids as int64; raises ValueError naming ids that are not in the catalog"""
+    product_ids = pd.unique(to_id_array(product_ids))
+    unknown = find_unknown_ids(product_ids, products_df['id'].to_numpy())
+    if len(unknown) > 0:
+        raise ValueError(f"{len(unknown)} unknown product ids, e.g. {unknown[:5].tolist()}")
+    return product_ids
+
+def per_product_values(values, product_ids, products_df, mask):
+    """Align a scalar, a Series keyed by product id or an array parallel to product_ids with the masked rows"""
+    if np.ndim(values) == 0:
+        return values
+    if not isinstance(values, pd.Series):
+        values = pd.Series(np.asarray(values), index=pd.Index(to_id_array(product_ids)))
+    return values[~values.index.duplicated(keep='last')].loc[products_df.loc[mask, 'id']].to_numpy()
+
+def read_products_snapshot(data_dir=DATA_DIR):
+    """Read products with the file stat token a commit checks before reusing the frame"""
+    products_stat = get_file_stat(Path(data_dir) / "products.csv")
+    return read_products(data_dir), products_stat
+
+def prepare_product_changes(snapshot, values, reviewed_by, review_date, review_reason, describe,
+                            placement_changed=False, data_dir=DATA_DIR, **options):
+    """A change ready to commit: values holds the new CHANGE_SET_COLUMNS values of its rows, indexed by product id"""
+    products_df, products_stat = snapshot
+    return {'products': products_df, 'products_stat': products_stat, 'values': values, 'reviewed_by': reviewed_by,
+            'review_date': review_date, 'review_reason': review_reason, 'describe': describe,
+            'placement_changed': placement_changed, 'data_dir': data_dir, **options}
+
+def merge_product_values(products_df, values, expected=None):
+    """Assign values (indexed by product id) to just their rows; returns those rows as they were and conflicting ids"""
+    product_ids = values.index.to_numpy()
+    
+    # Key index over the change's rows, probed once with the id column
+    entries = pd.Index(product_ids).get_indexer(products_df['id'].to_numpy())
+    positions = np.flatnonzero(entries >= 0)
+    entries = entries[positions]
+    missing = np.ones(len(product_ids), dtype=bool)
+    missing[entries] = False
+    conflicts = product_ids[missing]
+    
+    # Rows must still hold the expected values (undo/redo)
+    if expected is not None:
+        current = products_df.iloc[positions][expected.columns].to_numpy(dtype=object)
+        expected_values = expected.to_numpy(dtype=object)[entries]
+        changed = ~((current == expected_values) | (pd.isna(current) & pd.isna(expected_values))).all(axis=1)
+        conflicts = np.concatenate([conflicts, product_ids[entries[changed]]])
+    
+    before = products_df.iloc[positions][['id', 'name'] + CHANGE_SET_COLUMNS]
+    if len(conflicts) > 0:
+        return before, conflicts
+    for column in values.columns:
+        products_df.iloc[positions, products_df.columns.get_loc(column)] = values[column].to_numpy()[entries]
+    return before, conflicts
+
+def commit_product_changes(change, report=None):
+    """Merge a prepared change into products.csv with one write plus audit trail, undo, analytics and version"""
+    # Callers hold products_file_lock
+    report = report or (lambda progress, message: None)
+    data_dir = change['data_dir']
+    
+    # Reuse the snapshot unless another commit has rewritten products.csv since it was read
+    report(0.6, "Merging changes")
+    products_df = change['products']
+    if get_file_stat(Path(data_dir) / "products.csv") != change['products_stat']:
+        products_df = read_products(data_dir)
+    values = change['values']
+    if change.get('only_recommended'):
+        # Another session or job may have reviewed a product since this change was prepared
+        values = values[values.index.isin(products_df.loc[products_df['status'] == 'recommended', 'id'])]
+    
+    undo_redo = change.get('undo_redo')
+    if undo_redo is not None:
+        state = load_undo_state(data_dir)
+        source_stack, target_stack = ('undo', 'redo') if undo_redo['direction'] == 'undo' else ('redo', 'undo')
+        if not state[source_stack] or state[source_stack][-1]['id'] != undo_redo['entry']['id']:
+            raise ValueError(f"Nothing to {undo_redo['direction']} for this operation any more")
+    
+    before, conflicts = merge_product_values(products_df, values, change.get('expected'))
+    if len(conflicts) > 0:
+        raise ValueError(f"{len(conflicts)} products were changed or removed since this operation")
+    mask = products_df.index.isin(before.index)
+    
+    report(0.7, "Writing products")
+    write_products_csv(products_df, data_dir)
+    report(0.9, "Recording history")
+    after = products_df.loc[mask, before.columns]
+    record_approval_history(before, after, change['reviewed_by'], change['review_date'], change['review_reason'],
+                            data_dir)
+    if undo_redo is not None:
+        state[target_stack].append(state[source_stack].pop())
+        save_undo_state(state, data_dir)
+    else:
+        record_change_set(before, after, change['describe'](after), data_dir)
+    update_decision_analytics(products_df, mask, before, data_dir)
+    bump_data_version(["products.csv"], change['placement_changed'], data_dir)
+    return int(mask.sum())
+
+def describe_status_changes(statuses):
+    """Change-set description such as 'Approved 3, Rejected 2 products'"""
+    counts = pd.Series(np.atleast_1d(statuses)).value_counts(sort=False)
+    return ", ".join(f"{status.title()} {count}" for status, count in counts.items()) + " products"
+
+def bulk_update_product_status(product_ids, new_status, reviewed_by="Manager", review_reason="Bulk operation",
+                               progress_callback=None, data_dir=DATA_DIR, commit=True):
+    """Set the status of many products in one write; new_status is one status or one per product id"""
+    report = progress_callback or (lambda progress, message: None)
+    
+    report(0.2, "Loading products")
+    snapshot = read_products_snapshot(data_dir)
+    products_df = snapshot[0]
+    invalid = set(np.atleast_1d(new_status)) - set(PRODUCT_STATUSES)
+    if invalid:
+        raise ValueError(f"Unknown statuses: {sorted(map(str, invalid))}")
+    
+    report(0.4, "Preparing changes")
+    mask = products_df['id'].isin(check_product_ids(product_ids, products_df))
+    review_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    values = pd.DataFrame({'status': per_product_values(new_status, product_ids, products_df, mask),
+                           'reviewed_by': reviewed_by, 'review_date': review_date},
+                          index=pd.Index(products_df.loc[mask, 'id'].to_numpy(), name='id'))
+    change = prepare_product_changes(snapshot, values, reviewed_by, review_date, review_reason,
+                                     lambda after: describe_status_changes(after['status']), data_dir=data_dir)
+    return commit_product_changes(change, report) if commit else change
+
+def bulk_apply_review_decisions(product_ids, decisions, reviewed_by="Manager", review_reason="One-by-one review",
+                                progress_callback=None, data_dir=DATA_DIR, commit=True):
+    """Apply per-product (status, review date) decisions in one write; products no longer recommended are skipped"""
+    report = progress_callback or (lambda progress, message: None)
+    
+    report(0.2, "Loading products")
+    snapshot = read_products_snapshot(data_dir)
+    
+    report(0.4, "Preparing changes")
+    decision_frame = pd.DataFrame.from_dict(decisions, orient='index', columns=['status', 'review_date'])
+    values = decision_frame.loc[decision_frame.index.isin(to_id_array(product_ids))].assign(reviewed_by=reviewed_by)
+    values.index = pd.Index(to_id_array(values.index), name='id')
+    change = prepare_product_changes(snapshot, values, reviewed_by, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                     review_reason, lambda after: f"Review {len(after)} products one by one",
+                                     data_dir=data_dir, only_recommended=True)
+    return commit_product_changes(change, report) if commit else change
+
+def bulk_move_products(product_ids, new_subcategory_id, approve=False, reviewed_by="Manager",
+                       review_reason="Bulk move", progress_callback=None, data_dir=DATA_DIR, commit=True):
+    """Move products in one write (approving them too if asked); new_subcategory_id is one id or per-product ids"""
+    report = progress_callback or (lambda progress, message: None)
+    
+    report(0.2, "Loading products")
+    snapshot = read_products_snapshot(data_dir)
+    products_df = snapshot[0]
+    hierarchy = build_hierarchy_index(*load_hierarchy(data_dir))
+    
+    # Per-product targets are a dict/Series keyed by product id, or an array parallel to product_ids
+    if isinstance(new_subcategory_id, dict):
+        new_subcategory_id = pd.Series(new_subcategory_id, dtype=object)
+    
+    # Validate every destination against the hierarchy index at once before touching anything
+    targets = to_id_array(new_subcategory_id)
+    invalid = np.unique(targets[lookup_ids(hierarchy['subcat_to_dept'], targets) < 0])
+    if len(invalid) > 0:
+        raise ValueError(f"{len(invalid)} unknown destination subcategories, e.g. {invalid[:5].tolist()}")
+    
+    report(0.4, "Preparing changes")
+    mask = products_df['id'].isin(check_product_ids(product_ids, products_df))
+    review_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(new_subcategory_id, pd.Series):
+        targets = pd.Series(targets, index=pd.Index(to_id_array(new_subcategory_id.index)))
+    values = pd.DataFrame({'subcategory_id': per_product_values(targets if np.ndim(new_subcategory_id) else targets[0],
+                                                                product_ids, products_df, mask)},
+                          index=pd.Index(products_df.loc[mask, 'id'].to_numpy(), name='id'))
+    if approve:
+        values = values.assign(status='approved', reviewed_by=reviewed_by, review_date=review_date)
+    
+    def describe(after):
+        description = f"{'Approve & move' if approve else 'Move'} {len(after)} products"
+        if after['subcategory_id'].nunique() > 1:
+            description += f" to {after['subcategory_id'].nunique()} subcategories"
+        return description
+    
+    change = prepare_product_changes(snapshot, values, reviewed_by, review_date, review_reason, describe,
+                                     placement_changed=True, data_dir=data_dir)
+    return commit_product_changes(change, report) if commit else change
+
+def bulk_approve_and_move(product_ids, new_subcategory_id, reviewed_by="Manager", review_reason="Bulk approve & move",
+                          progress_callback=None, data_dir=DATA_DIR, commit=True):
+    """Approve products and move them in one write; new_subcategory_id is one id or per-product ids"""
+    return bulk_move_products(product_ids, new_subcategory_id, approve=True, reviewed_by=reviewed_by,
+                              review_reason=review_reason, progress_callback=progress_callback, data_dir=data_dir,
+                              commit=commit)
+
+# Move mappings: many (product_id -> subcategory_id) targets checked in one pass, applied in one write
+MOVE_MAPPING_COLUMNS = ['product_id', 'subcategory_id']
+
+def read_move_mapping(source, file_name=None):
+    """Mapping rows from a CSV or JSONL file (a path, or an uploaded file object with file_name)"""
+    if str(file_name or source).lower().endswith((".jsonl", ".ndjson")):
+        mapping = pd.read_json(source, lines=True)
+    else:
+        mapping = pd.read_csv(source)
+    missing = set(MOVE_MAPPING_COLUMNS) - set(mapping.columns)
+    if missing:
+        raise ValueError(f"Mapping is missing columns: {sorted(missing)}")
+    return mapping
+
+def validate_move_mapping(mapping, products, departments, categories, subcategories):
+    """Check every mapping row at once; returns the valid moves and the rejected rows with a 'problem'"""
+    product_ids = to_id_array(mapping['product_id'])
+    targets = to_id_array(mapping['subcategory_id'])
+    hierarchy = build_hierarchy_index(departments, categories, subcategories)
+    target_depts = lookup_ids(hierarchy['subcat_to_dept'], targets)
+    duplicated = pd.DataFrame({'product_id': product_ids, 'subcategory_id': targets}).duplicated()
+    conflicting = pd.Series(targets).groupby(product_ids).transform('nunique').to_numpy() > 1
+    
+    # The first failing check names the problem; optional category/department columns must agree with the target
+    checks = [
+        (product_ids < 0, "missing product id"),
+        (encode_ids(product_ids, products['id'].to_numpy()) < 0, "unknown product"),
+        ((target_depts < 0) | ~np.isin(target_depts, departments['id'].to_numpy()), "unknown subcategory"),
+        (conflicting, "conflicting targets for product")
+    ]
+    if 'category_id' in mapping.columns:
+        checks.append((lookup_ids(hierarchy['subcat_to_cat'], targets) != to_id_array(mapping['category_id']),
+                       "subcategory is not in category_id"))
+    if 'department_id' in mapping.columns:
+        checks.append((target_depts != to_id_array(mapping['department_id']), "subcategory is not in department_id"))
+    
+    problems = np.full(len(mapping), None, dtype=object)
+    for failed, problem in checks:
+        problems[failed & pd.isna(problems)] = problem
+    
+    valid = pd.isna(problems)
+    moves = pd.DataFrame({'product_id': product_ids[valid & ~duplicated.to_numpy()],
+                          'subcategory_id': targets[valid & ~duplicated.to_numpy()]})
+    return {'moves': moves, 'problems': mapping[~valid].assign(problem=problems[~valid])}
+
+# Undo/redo checks and assigns only the change set's rows (one key index over them, one indexed assignment
+# per column), so that work grows with the change set. products.csv is still read and rewritten whole, so
+# every undo or redo also pays one O(catalog) read and write.
+def undo_redo_bulk_operation(product_ids, direction, change_set_id, reviewed_by="Manager", progress_callback=None,
+                             data_dir=DATA_DIR, commit=True):
+    """Undo or redo the change set on top of its stack (product_ids are the rows it touches)"""
+    report = progress_callback or (lambda progress, message: None)
+    source_stack = 'undo' if direction == 'undo' else 'redo'
+    
+    state = load_undo_state(data_dir)
+    if not state[source_stack] or state[source_stack][-1]['id'] != change_set_id:
+        raise ValueError(f"Nothing to {direction} for this operation any more")
+    entry = state[source_stack][-1]
+    change_set = read_change_set(entry, data_dir)
+    
+    report(0.2, "Loading products")
+    snapshot = read_products_snapshot(data_dir)
+    
+    # The rows must still hold what the change set left (or found) there when the change is committed
+    report(0.4, f"Preparing {direction}")
+    values, expected = change_set_values(change_set, direction)
+    change = prepare_product_changes(snapshot, values, reviewed_by, datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                     f"{direction.title()}: {entry['description']}", None,
+                                     change_set['before']['subcategory_id'] != change_set['after']['subcategory_id'],
+                                     data_dir=data_dir, expected=expected,
+                                     undo_redo={'direction': direction, 'entry': entry})
+    return commit_product_changes(change, report) if commit else change
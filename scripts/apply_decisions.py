@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Batch Review Decisions
+
+Applies review decisions to data/products.csv without the UI, for nightly jobs:
+1. Reads a CSV or JSONL file of (product_id, status) decisions, or selects the
+   recommended products under departments/categories/subcategories
+2. Validates every product id and status up front
+3. Commits all decisions with a single products.csv write, recorded in the
+   approval history, the undo stack and the decision analytics like a UI bulk job
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from catalog_engine import (
+    bulk_update_product_status, check_product_ids, expand_selection, load_hierarchy, products_file_lock,
+    read_products, PRODUCT_STATUSES
+)
+
+def read_decisions(decisions_path):
+    """Read product_id/status decisions from CSV or JSONL (a 'decision' column is accepted for status)"""
+    if Path(decisions_path).suffix.lower() in (".jsonl", ".ndjson"):
+        decisions = pd.read_json(decisions_path, lines=True)
+    else:
+        decisions = pd.read_csv(decisions_path)
+    decisions = decisions.rename(columns={'decision': 'status'})
+    missing = {'product_id', 'status'} - set(decisions.columns)
+    if missing:
+        raise ValueError(f"Decisions file is missing columns: {sorted(missing)}")
+    return decisions[['product_id', 'status']]
+
+def select_decisions(status, data_dir, dept_ids=(), cat_ids=(), subcat_ids=()):
+    """One decision for every recommended product under the selected hierarchy nodes"""
+    departments, categories, subcategories = load_hierarchy(data_dir)
+    products = read_products(data_dir)
+    recommended = products[products['status'] == 'recommended']
+    selection = expand_selection({'dept_ids': dept_ids, 'cat_ids': cat_ids, 'subcat_ids': subcat_ids},
+                                 recommended, categories, subcategories)
+    return pd.DataFrame({'product_id': selection['relevant_product_ids'], 'status': status})
+
+def apply_decisions(decisions, data_dir="data", reviewed_by="Nightly batch", review_reason="Batch decisions",
+                    dry_run=False):
+    """Validate decisions and commit them in one write; returns the number of products updated"""
+    invalid_statuses = sorted(set(decisions['status']) - set(PRODUCT_STATUSES))
+    if invalid_statuses:
+        raise ValueError(f"Unknown statuses: {invalid_statuses}")
+    if dry_run:
+        check_product_ids(decisions['product_id'], read_products(data_dir))
+        return 0
+    if len(decisions) == 0:
+        return 0
+    
+    with products_file_lock(data_dir):
+        return bulk_update_product_status(decisions['product_id'].to_numpy(), decisions['status'].to_numpy(),
+                                          reviewed_by=reviewed_by, review_reason=review_reason, data_dir=data_dir)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply review decisions to products without the UI")
+    parser.add_argument("decisions", nargs="?", help="CSV or JSONL file with product_id and status columns")
+    parser.add_argument("--status", choices=PRODUCT_STATUSES,
+                        help="Decide every recommended product under the selected nodes with this status")
+    parser.add_argument("--department", type=int, nargs="*", default=[], help="Department ids to select")
+    parser.add_argument("--category", type=int, nargs="*", default=[], help="Category ids to select")
+    parser.add_argument("--subcategory", type=int, nargs="*", default=[], help="Subcategory ids to select")
+    parser.add_argument("--data-dir", default="data", help="Directory holding the catalog CSV files")
+    parser.add_argument("--reviewed-by", default="Nightly batch", help="Reviewer recorded for the decisions")
+    parser.add_argument("--reason", default="Batch decisions", help="Reason recorded in the approval history")
+    parser.add_argument("--dry-run", action="store_true", help="Validate without committing")
+    args = parser.parse_args()
+    
+    if args.decisions:
+        decisions = read_decisions(args.decisions)
+    elif args.status:
+        decisions = select_decisions(args.status, args.data_dir, args.department, args.category, args.subcategory)
+    else:
+        parser.error("pass a decisions file, or --status with --department/--category/--subcategory")
+    
+    print(f"🗂️ Applying {len(decisions)} decisions...")
+    updated = apply_decisions(decisions, args.data_dir, args.reviewed_by, args.reason, args.dry_run)
+    print("✅ Dry run complete: all decisions are valid" if args.dry_run else f"✅ Updated {updated} products")
+    for status, count in decisions['status'].value_counts().items():
+        print(f"   • {status}: {count}")
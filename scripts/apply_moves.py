@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Bulk Moves from a Mapping File
+
+Moves products to new subcategories from a (product_id -> subcategory_id) mapping:
+1. Reads a CSV or JSONL mapping; optional category_id/department_id columns are cross-checked
+2. Validates every row against the hierarchy index in one pass
+3. Applies all valid moves with a single products.csv write (optionally approving the products)
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from catalog_engine import (
+    bulk_move_products, load_hierarchy, products_file_lock, read_move_mapping, read_products, validate_move_mapping
+)
+
+MAX_PRINTED_PROBLEMS = 10
+
+def apply_moves(mapping_path, data_dir="data", approve=False, skip_invalid=False, reviewed_by="Mapping import",
+                dry_run=False):
+    """Validate a mapping file and apply its moves in one write; returns the validation result and moved count"""
+    mapping = read_move_mapping(mapping_path)
+    with products_file_lock(data_dir):
+        validation = validate_move_mapping(mapping, read_products(data_dir), *load_hierarchy(data_dir))
+        moves = validation['moves']
+        if dry_run or len(moves) == 0 or (len(validation['problems']) > 0 and not skip_invalid):
+            return validation, 0
+        moved = bulk_move_products(moves['product_id'].to_numpy(), moves['subcategory_id'].to_numpy(),
+                                   approve=approve, reviewed_by=reviewed_by,
+                                   review_reason=f"Mapping file {Path(mapping_path).name}", data_dir=data_dir)
+    return validation, moved
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move products to new subcategories from a mapping file")
+    parser.add_argument("mapping", help="CSV or JSONL file with product_id and subcategory_id columns")
+    parser.add_argument("--approve", action="store_true", help="Also approve every moved product")
+    parser.add_argument("--skip-invalid", action="store_true",
+                        help="Apply the valid rows even when some rows fail validation")
+    parser.add_argument("--data-dir", default="data", help="Directory holding the catalog CSV files")
+    parser.add_argument("--reviewed-by", default="Mapping import", help="Reviewer recorded for the moves")
+    parser.add_argument("--dry-run", action="store_true", help="Validate without committing")
+    args = parser.parse_args()
+    
+    print(f"🗺️ Validating moves from {args.mapping}...")
+    validation, moved = apply_moves(args.mapping, args.data_dir, args.approve, args.skip_invalid,
+                                    args.reviewed_by, args.dry_run)
+    moves, problems = validation['moves'], validation['problems']
+    print(f"   • Valid moves: {len(moves)} to {moves['subcategory_id'].nunique()} subcategories")
+    print(f"   • Invalid rows: {len(problems)}")
+    for problem, count in problems['problem'].value_counts().items():
+        print(f"     - {problem}: {count}")
+    for _, row in problems.head(MAX_PRINTED_PROBLEMS).iterrows():
+        print(f"     product {row['product_id']} -> {row['subcategory_id']}: {row['problem']}")
+    
+    if args.dry_run:
+        print("✅ Dry run complete")
+    elif len(problems) > 0 and not args.skip_invalid:
+        print("❌ Nothing moved: fix the invalid rows or pass --skip-invalid")
+        sys.exit(1)
+    else:
+        print(f"✅ Moved {moved} products")
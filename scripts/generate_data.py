@@ -11,6 +11,7 @@ This script generates a comprehensive 4-level hierarchical dataset for a grocery
 The data is designed to stress-test UI/UX components with realistic variety and volume.
 """
 
+import argparse
 import pandas as pd
 import random
 from faker import Faker
@@ -324,28 +325,42 @@ def generate_products():
     
     return pd.DataFrame(products)
 
-def generate_temporal_quality_data(products_df):
+# Supported source granularities for temporal quality data (pandas date_range frequencies)
+TEMPORAL_FREQUENCIES = {
+    "daily": "D",
+    "weekly": "W-MON",
+    "monthly": "MS"
+}
+
+def create_time_periods(start_date="2023-01-01", num_periods=12, frequency="monthly"):
+    """Create (period_id, period_name, period_date) tuples for the temporal quality data"""
+    period_dates = pd.date_range(start=start_date, periods=num_periods, freq=TEMPORAL_FREQUENCIES[frequency])
+    
+    time_periods = []
+    for period_date in period_dates:
+        if frequency == "monthly":
+            period_id = period_date.strftime("%Y-%m")
+            period_name = period_date.strftime("%B %Y")
+        elif frequency == "weekly":
+            period_id = period_date.strftime("%Y-%m-%d")
+            period_name = f"Week of {period_date.strftime('%b %d, %Y')}"
+        else:
+            period_id = period_date.strftime("%Y-%m-%d")
+            period_name = period_date.strftime("%b %d, %Y")
+        time_periods.append((period_id, period_name, period_date))
+    
+    return time_periods
+
+def generate_temporal_quality_data(products_df, start_date="2023-01-01", num_periods=12, frequency="monthly"):
     """
     Generates temporal quality data showing how product quality distribution changes over time.
-    Creates 12 monthly snapshots with realistic quality evolution patterns.
+    Creates num_periods daily, weekly or monthly snapshots (12 months of 2023 by default)
+    with realistic quality evolution patterns.
     """
     temporal_quality_data = []
     
-    # Create 12 monthly time periods
-    time_periods = [
-        ("2023-01", "January 2023"),
-        ("2023-02", "February 2023"),
-        ("2023-03", "March 2023"),
-        ("2023-04", "April 2023"),
-        ("2023-05", "May 2023"),
-        ("2023-06", "June 2023"),
-        ("2023-07", "July 2023"),
-        ("2023-08", "August 2023"),
-        ("2023-09", "September 2023"),
-        ("2023-10", "October 2023"),
-        ("2023-11", "November 2023"),
-        ("2023-12", "December 2023"),
-    ]
+    # Create the time periods
+    time_periods = create_time_periods(start_date, num_periods, frequency)
     
     for _, product in products_df.iterrows():
         product_id = product["id"]
@@ -363,10 +378,10 @@ def generate_temporal_quality_data(products_df):
         else:  # poor
             quality_probabilities = {"good": 0.1, "neutral": 0.3, "poor": 0.6}
         
-        for period_idx, (period_id, period_name) in enumerate(time_periods):
+        for period_idx, (period_id, period_name, period_date) in enumerate(time_periods):
             # Simulate quality evolution over time
             # Products tend to improve in spring/summer, decline in winter
-            seasonal_modifier = 0.1 if period_idx in [2, 3, 4, 5, 6, 7] else -0.1  # Mar-Aug better
+            seasonal_modifier = 0.1 if period_date.month in [3, 4, 5, 6, 7, 8] else -0.1  # Mar-Aug better
             
             # Random quality shifts (supply chain improvements/issues)
             random_shift = random.uniform(-0.15, 0.15)
@@ -412,6 +427,7 @@ def generate_temporal_quality_data(products_df):
                     "period_id": period_id,
                     "period_name": period_name,
                     "period_index": period_idx,
+                    "period_date": period_date.strftime("%Y-%m-%d"),
                     "quality": quality,
                     "price": period_price,
                     "stock_quantity": instance_stock,
@@ -429,7 +445,18 @@ def generate_temporal_quality_data(products_df):
     
     return pd.DataFrame(temporal_quality_data)
 
-def save_data():
+def save_temporal_quality_data(start_date="2023-01-01", num_periods=12, frequency="monthly"):
+    """Regenerate only the temporal quality data for the existing products.csv"""
+    data_dir = Path("data")
+    products_df = pd.read_csv(data_dir / "products.csv")
+    
+    print(f"📊 Generating {num_periods} {frequency} periods of temporal quality data from {start_date}...")
+    temporal_quality_df = generate_temporal_quality_data(products_df, start_date, num_periods, frequency)
+    temporal_quality_df.to_csv(data_dir / "temporal_quality.csv", index=False)
+    
+    print(f"✅ Saved {len(temporal_quality_df)} temporal quality rows to {(data_dir / 'temporal_quality.csv').absolute()}")
+
+def save_data(start_date="2023-01-01", num_periods=12, frequency="monthly"):
     """Generate all data and save to CSV files"""
     print("🏗️  Generating grocery store data...")
     
@@ -451,7 +478,7 @@ def save_data():
     products_df = generate_products()
 
     print("📊 Generating temporal quality data...")
-    temporal_quality_df = generate_temporal_quality_data(products_df)
+    temporal_quality_df = generate_temporal_quality_data(products_df, start_date, num_periods, frequency)
     
     # Save to CSV files
     print("💾 Saving data to CSV files...")
@@ -480,4 +507,16 @@ def save_data():
     print("🚀 Ready to run: streamlit run app.py")
 
 if __name__ == "__main__":
-    save_data() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate grocery store sample data")
+    parser.add_argument("--start-date", default="2023-01-01", help="First temporal quality period (YYYY-MM-DD)")
+    parser.add_argument("--periods", type=int, default=12, help="Number of temporal quality periods")
+    parser.add_argument("--frequency", choices=sorted(TEMPORAL_FREQUENCIES), default="monthly",
+                        help="Granularity of the temporal quality source data")
+    parser.add_argument("--temporal-only", action="store_true",
+                        help="Only regenerate temporal_quality.csv for the existing products.csv")
+    args = parser.parse_args()
+    
+    if args.temporal_only:
+        save_temporal_quality_data(args.start_date, args.periods, args.frequency)
+    else:
+        save_data(args.start_date, args.periods, args.frequency)
\ No newline at end of file
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Recommendation Feed Ingestion
+
+Streams a CSV or JSONL feed of recommended products into data/products.csv:
+1. Builds hash indexes of the normalized sku and barcode of every existing product
+2. Reads the feed in bounded chunks, dropping rows that duplicate the catalog or the feed itself
+3. Assigns product ids and subcategories and stages new rows on disk
+4. Appends the staged rows to products.csv in a single commit and bumps the data version
+
+Neither the catalog nor the feed is ever loaded into memory at once.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Commits share the app's lock and version file so open sessions pick up the new rows
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from catalog_engine import bump_data_version, products_file_lock
+
+KEY_COLUMNS = ["sku", "barcode"]
+DEFAULT_CHUNK_ROWS = 50_000
+PRODUCT_QUALITIES = ["good", "neutral", "poor"]
+
+def normalize_keys(values, key):
+    """Normalize sku (trimmed, upper case) or barcode (digits only, no leading zeros); blanks become NA"""
+    values = pd.Series(values).astype("string").str.strip()
+    if key == "sku":
+        values = values.str.upper()
+    else:
+        values = values.str.replace(r"\.0$", "", regex=True).str.replace(r"\D", "", regex=True).str.lstrip("0")
+    return values.mask(values == "")
+
+def hash_keys(normalized):
+    """64-bit hashes of normalized keys (missing keys are not hashed)"""
+    return pd.util.hash_array(normalized.dropna().to_numpy(dtype=object))
+
+def build_key_index(products_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Stream the catalog's id, sku and barcode columns into sorted hash arrays"""
+    key_hashes = {key: [np.array([], dtype=np.uint64)] for key in KEY_COLUMNS}
+    max_id = 0
+    for chunk in pd.read_csv(products_path, usecols=["id"] + KEY_COLUMNS,
+                             dtype={"sku": str, "barcode": str}, chunksize=chunk_rows):
+        if len(chunk) > 0:
+            max_id = max(max_id, int(chunk["id"].max()))
+        for key in KEY_COLUMNS:
+            key_hashes[key].append(hash_keys(normalize_keys(chunk[key], key)))
+    key_index = {}
+    for key, hashes in key_hashes.items():
+        hashes = np.sort(np.concatenate(hashes))
+        key_index[key] = hashes[np.concatenate(([True], hashes[1:] != hashes[:-1]))] if len(hashes) else hashes
+    return key_index, max_id
+
+def in_key_index(sorted_hashes, hashes):
+    """Vectorized membership seek of hashes in a sorted hash index"""
+    if len(sorted_hashes) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+    return sorted_hashes[positions] == hashes
+
+def merge_key_index(sorted_hashes, new_hashes):
+    """Insert hashes known to be absent from the index, keeping it sorted"""
+    new_hashes = np.sort(new_hashes)
+    return np.insert(sorted_hashes, np.searchsorted(sorted_hashes, new_hashes), new_hashes)
+
+def read_feed(feed_path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Iterate over a CSV or JSONL feed in chunks of at most chunk_rows rows"""
+    if Path(feed_path).suffix.lower() in (".jsonl", ".ndjson"):
+        return pd.read_json(feed_path, lines=True, chunksize=chunk_rows, dtype={"sku": str, "barcode": str})
+    return pd.read_csv(feed_path, chunksize=chunk_rows, dtype={"sku": str, "barcode": str})
+
+def resolve_subcategories(feed_chunk, subcategories):
+    """Subcategory id per feed row from subcategory_id or subcategory (name); -1 when unknown"""
+    subcategory_ids = pd.Series(-1, index=feed_chunk.index)
+    if "subcategory_id" in feed_chunk.columns:
+        known = pd.to_numeric(feed_chunk["subcategory_id"], errors="coerce").isin(subcategories["id"])
+        subcategory_ids[known] = feed_chunk.loc[known, "subcategory_id"].astype(int)
+    if "subcategory" in feed_chunk.columns:
+        ids_by_name = pd.Series(subcategories["id"].to_numpy(), index=subcategories["name"].str.lower())
+        ids_by_name = ids_by_name[~ids_by_name.index.duplicated()]
+        by_name = feed_chunk["subcategory"].astype("string").str.strip().str.lower().map(ids_by_name)
+        unresolved = (subcategory_ids < 0) & by_name.notna()
+        subcategory_ids[unresolved] = by_name[unresolved].astype(int)
+    return subcategory_ids
+
+def feed_column(rows, column, default):
+    """Feed column with missing values (or a missing column) filled with a default"""
+    if column not in rows.columns:
+        return pd.Series(default, index=rows.index, dtype=object)
+    return rows[column].astype(object).where(rows[column].notna(), default)
+
+def prepare_chunk(feed_chunk, key_index, subcategories, next_id, product_columns, source, recommendation_date):
+    """Dedupe, validate and shape one feed chunk; returns (new product rows, counts)"""
+    normalized = {key: normalize_keys(feed_chunk[key], key) if key in feed_chunk.columns
+                  else pd.Series(pd.NA, index=feed_chunk.index, dtype="string") for key in KEY_COLUMNS}
+    
+    # Rows need a name, a price and at least one key
+    prices = pd.to_numeric(feed_column(feed_chunk, "price", np.nan), errors="coerce")
+    names = feed_column(feed_chunk, "name", pd.NA).astype("string").str.strip()
+    valid = names.notna() & (names != "") & prices.notna() & (normalized["sku"].notna() | normalized["barcode"].notna())
+    
+    # Duplicates of the catalog (hash index seek) or of earlier rows in the feed
+    duplicate = pd.Series(False, index=feed_chunk.index)
+    for key in KEY_COLUMNS:
+        present = normalized[key].notna()
+        hashes = pd.util.hash_array(normalized[key].fillna("").to_numpy(dtype=object))
+        duplicate |= present & (in_key_index(key_index[key], hashes) | normalized[key].duplicated(keep="first"))
+    duplicate &= valid
+    
+    subcategory_ids = resolve_subcategories(feed_chunk, subcategories)
+    unassigned = valid & ~duplicate & (subcategory_ids < 0)
+    accepted = valid & ~duplicate & ~unassigned
+    
+    rows = feed_chunk[accepted]
+    qualities = feed_column(rows, "quality", "neutral")
+    new_products = pd.DataFrame({
+        "id": np.arange(next_id, next_id + len(rows)),
+        "subcategory_id": subcategory_ids[accepted].to_numpy(),
+        "name": names[accepted].to_numpy(),
+        "price": prices[accepted].round(2).to_numpy(),
+        "stock_quantity": pd.to_numeric(feed_column(rows, "stock_quantity", 0), errors="coerce").fillna(0).astype(int).to_numpy(),
+        "unit": feed_column(rows, "unit", "each").to_numpy(),
+        "sku": feed_column(rows, "sku", pd.NA).str.strip().to_numpy(),
+        "barcode": feed_column(rows, "barcode", pd.NA).str.strip().to_numpy(),
+        "description": feed_column(rows, "description", "").to_numpy(),
+        "quality": qualities.where(qualities.isin(PRODUCT_QUALITIES), "neutral").to_numpy(),
+        "status": "recommended",
+        "recommendation_date": feed_column(rows, "recommendation_date", recommendation_date).to_numpy(),
+        "reviewed_by": pd.NA,
+        "review_date": pd.NA,
+        "recommendation_source": feed_column(rows, "recommendation_source", source).to_numpy()
+    }).reindex(columns=product_columns)
+    
+    # Accepted keys join the index so later chunks see them
+    for key in KEY_COLUMNS:
+        key_index[key] = merge_key_index(key_index[key], hash_keys(normalized[key][accepted]))
+    
+    counts = {"invalid": int((~valid).sum()), "duplicates": int(duplicate.sum()), "unassigned": int(unassigned.sum())}
+    return new_products, counts
+
+def ingest_recommendations(feed_path, data_dir="data", chunk_rows=DEFAULT_CHUNK_ROWS, source="Feed_Import",
+                           dry_run=False):
+    """Ingest a CSV/JSONL feed of recommended products; returns ingestion counts"""
+    data_dir = Path(data_dir)
+    products_path = data_dir / "products.csv"
+    staging_path = data_dir / "products.ingest.tmp"
+    product_columns = pd.read_csv(products_path, nrows=0).columns.tolist()
+    subcategories = pd.read_csv(data_dir / "subcategories.csv")
+    key_index, max_id = build_key_index(products_path, chunk_rows)
+    recommendation_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    stats = {"read": 0, "ingested": 0, "duplicates": 0, "invalid": 0, "unassigned": 0,
+             "first_id": max_id + 1, "last_id": max_id}
+    
+    # Stage accepted rows on disk chunk by chunk
+    staging_path.unlink(missing_ok=True)
+    try:
+        for feed_chunk in read_feed(feed_path, chunk_rows):
+            new_products, counts = prepare_chunk(feed_chunk.reset_index(drop=True), key_index, subcategories,
+                                                 stats["last_id"] + 1, product_columns, source, recommendation_date)
+            new_products.to_csv(staging_path, mode="a", header=False, index=False)
+            stats["read"] += len(feed_chunk)
+            stats["ingested"] += len(new_products)
+            stats["last_id"] += len(new_products)
+            for name, count in counts.items():
+                stats[name] += count
+        
+        if dry_run or stats["ingested"] == 0:
+            return stats
+        
+        # Single commit: copy the current catalog plus the staged rows, then swap it in
+        with products_file_lock(data_dir):
+            _, current_max_id = build_key_index(products_path, chunk_rows)
+            if current_max_id != max_id:
+                raise RuntimeError("products.csv gained new products during ingestion; run the ingestion again")
+            
+            temporary_path = products_path.with_suffix(".csv.tmp")
+            with open(temporary_path, "wb") as output, open(products_path, "rb") as catalog:
+                shutil.copyfileobj(catalog, output)
+                output.seek(0, os.SEEK_END)
+                if output.tell() > 0:
+                    catalog.seek(-1, os.SEEK_END)
+                    if catalog.read(1) != b"\n":
+                        output.write(b"\n")
+                with open(staging_path, "rb") as staged:
+                    shutil.copyfileobj(staged, output)
+            temporary_path.replace(products_path)
+            bump_data_version(["products.csv"], placement_changed=True, data_dir=data_dir)
+    finally:
+        staging_path.unlink(missing_ok=True)
+    
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a feed of recommended products into data/products.csv")
+    parser.add_argument("feed", help="CSV or JSONL (.jsonl/.ndjson) feed of recommended products")
+    parser.add_argument("--data-dir", default="data", help="Directory holding products.csv and subcategories.csv")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Feed rows read per chunk")
+    parser.add_argument("--source", default="Feed_Import",
+                        help="recommendation_source for rows that do not carry one")
+    parser.add_argument("--dry-run", action="store_true", help="Validate and dedupe without committing")
+    args = parser.parse_args()
+    
+    print(f"📥 Ingesting recommendations from {args.feed}...")
+    stats = ingest_recommendations(args.feed, args.data_dir, args.chunk_rows, args.source, args.dry_run)
+    
+    print("✅ Dry run complete" if args.dry_run else "✅ Ingestion complete!")
+    print(f"   • Rows read: {stats['read']}")
+    print(f"   • New recommendations: {stats['ingested']}")
+    if stats["ingested"]:
+        print(f"   • Assigned ids: {stats['first_id']}-{stats['last_id']}")
+    print(f"   • Duplicates skipped: {stats['duplicates']}")
+    print(f"   • Invalid rows skipped: {stats['invalid']}")
+    print(f"   • Rows without a known subcategory: {stats['unassigned']}")
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Tests import app.py and catalog_engine.py from the repository root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
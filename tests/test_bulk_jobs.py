@@ -0,0 +1,88 @@
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import app
+from catalog_engine import bulk_move_products, bulk_update_product_status, load_undo_state, read_products
+
+REPO_DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # Jobs take the commit lock in ./data, so run against a copy of the catalog there
+    monkeypatch.chdir(tmp_path)
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    for file_name in ["departments.csv", "categories.csv", "subcategories.csv", "products.csv"]:
+        shutil.copy(REPO_DATA_DIR / file_name, data_dir / file_name)
+    return data_dir
+
+def submit_job(product_ids, operation, **operation_kwargs):
+    runner = app.get_bulk_job_runner()
+    job_id = app.submit_bulk_job(runner, "test job", product_ids, operation, **operation_kwargs)
+    assert job_id is not None
+    return runner['jobs'][job_id]
+
+def wait_for_job(job):
+    deadline = time.monotonic() + 30
+    while job['status'] not in ('committed', 'failed') and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert job['status'] == 'committed', job['error']
+    return job
+
+def run_job(product_ids, operation, **operation_kwargs):
+    return wait_for_job(submit_job(product_ids, operation, **operation_kwargs))
+
+@pytest.mark.parametrize("keyed_targets", [True, False])
+def test_unsorted_mapping_moves_each_product_to_its_own_target(data_dir, keyed_targets):
+    mapping = pd.DataFrame({'product_id': [30, 10, 20], 'subcategory_id': [3, 1, 2]})
+    targets = mapping.set_index('product_id')['subcategory_id'] if keyed_targets \
+        else mapping['subcategory_id'].to_numpy()
+    
+    run_job(mapping['product_id'].tolist(), bulk_move_products, new_subcategory_id=targets, data_dir=data_dir)
+    
+    products = read_products(data_dir).set_index('id')
+    assert products.loc[[30, 10, 20], 'subcategory_id'].tolist() == [3, 1, 2]
+
+def test_disjoint_jobs_prepare_concurrently_and_both_commit(data_dir):
+    # Each preparation waits for the other, so this only passes if they run side by side
+    both_preparing = threading.Barrier(2, timeout=10)
+    
+    def prepare_while_other_prepares(operation):
+        def prepare(product_ids, **operation_kwargs):
+            change = operation(product_ids, **operation_kwargs)
+            both_preparing.wait()
+            return change
+        return prepare
+    
+    jobs = [
+        submit_job([1, 2, 3], prepare_while_other_prepares(bulk_update_product_status),
+                   new_status='rejected', data_dir=data_dir),
+        submit_job([40, 41], prepare_while_other_prepares(bulk_move_products),
+                   new_subcategory_id=5, data_dir=data_dir)
+    ]
+    for job in jobs:
+        wait_for_job(job)
+    
+    # Each commit merged only its own rows into the file the other one wrote
+    products = read_products(data_dir).set_index('id')
+    assert products.loc[[1, 2, 3], 'status'].tolist() == ['rejected'] * 3
+    assert products.loc[[40, 41], 'subcategory_id'].tolist() == [5, 5]
+    assert len(load_undo_state(data_dir)['undo']) == 2
+
+def test_commit_callback_sees_the_committed_rows_before_the_job_finishes(data_dir):
+    jobs = app.get_bulk_job_runner()['jobs']
+    committed = []
+    
+    def on_commit(result):
+        # The submitter's pending copies are cleared while the job still reports running
+        committed.append((result, read_products(data_dir).set_index('id').loc[[7, 8], 'status'].tolist(),
+                          jobs[max(jobs)]['status']))
+    
+    job = run_job([7, 8], bulk_update_product_status, on_commit=on_commit, new_status='rejected', data_dir=data_dir)
+    
+    assert committed == [(job['result'], ['rejected', 'rejected'], 'running')]
@@ -0,0 +1,26 @@
+import threading
+
+import pandas as pd
+
+import app
+from catalog_engine import HISTORY_FILE, record_approval_history
+
+def append_history(data_dir, product_ids, reviewed_by, review_date):
+    before = pd.DataFrame({'id': product_ids, 'name': [f"Product {product_id}" for product_id in product_ids],
+                           'status': 'recommended', 'subcategory_id': 1})
+    record_approval_history(before, before.assign(status='approved'), reviewed_by, review_date, data_dir=data_dir)
+
+def test_appended_longer_actor_names_are_not_truncated(tmp_path):
+    history_index = {'lock': threading.Lock(), 'path': tmp_path / HISTORY_FILE, **app.empty_history_state()}
+    append_history(tmp_path, [1, 2], "Manager", "2026-01-01 09:00:00")
+    app.refresh_approval_history_index(history_index)
+    
+    # Merged into the index built from the shorter "Manager" keys
+    append_history(tmp_path, [3, 4, 5], "Auto-triage", "2026-01-02 09:00:00")
+    append_history(tmp_path, [6], "Ann", "2026-01-03 09:00:00")
+    app.refresh_approval_history_index(history_index)
+    
+    assert app.query_history_by_actor(history_index, "Auto-triage")['product_id'].tolist() == [3, 4, 5]
+    assert app.query_history_by_actor(history_index, "Manager")['product_id'].tolist() == [1, 2]
+    assert app.query_history_by_actor(history_index, "Ann")['product_id'].tolist() == [6]
+    assert app.query_history_by_actor(history_index, "Auto-tr").empty
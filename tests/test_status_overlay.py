@@ -0,0 +1,11 @@
+import pandas as pd
+
+import app
+
+def test_overlay_decisions_already_saved_are_not_applied_twice():
+    products = pd.DataFrame({'id': [1, 2, 3], 'status': ['approved', 'recommended', 'recommended']})
+    overlay = {1: ('approved', "2024-01-01 10:00:00"), 2: ('rejected', "2024-01-01 10:00:01"),
+               9: ('approved', "2024-01-01 10:00:02")}
+    
+    # Product 1 was saved by a flush that committed after the overlay was copied; 9 no longer exists
+    assert app.get_unsaved_statuses(products, overlay) == {2: 'rejected'}
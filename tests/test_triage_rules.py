@@ -0,0 +1,24 @@
+import pytest
+
+import app
+
+@pytest.mark.parametrize("rules", [
+    [{"name": "Good", "decision": "approved", "conditions": {"quality": "good"}}],
+    [{"name": "Source", "decision": "approved", "conditions": {"recommendation_source": ["Feed", 3]}}],
+    [{"name": "Cheap", "decision": "approved", "conditions": {"max_price_deviation": "0.2"}}],
+    [{"name": "Streak", "decision": "rejected", "conditions": {"min_poor_streak": True}}],
+    [{"decision": "rejected", "conditions": {"min_poor_streak": 3}}],
+    [{"name": "", "decision": "rejected", "conditions": {}}],
+    [{"name": "Listed", "decision": "rejected", "conditions": [["min_poor_streak", 3]]}],
+    ["reject everything"]
+])
+def test_invalid_rules_are_rejected(tmp_path, rules):
+    rules_path = tmp_path / "triage_rules.json"
+    with pytest.raises(ValueError):
+        app.save_triage_rules(rules, rules_path)
+    assert not rules_path.exists()
+
+def test_default_rules_are_valid(tmp_path):
+    rules_path = tmp_path / "triage_rules.json"
+    app.save_triage_rules(app.DEFAULT_TRIAGE_RULES, rules_path)
+    assert app.load_triage_rules(rules_path) == app.DEFAULT_TRIAGE_RULES
@@ -0,0 +1,48 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from catalog_engine import (
+    bulk_move_products, bulk_update_product_status, load_undo_state, read_products, undo_redo_bulk_operation,
+    write_products_csv
+)
+
+REPO_DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+@pytest.fixture
+def data_dir(tmp_path):
+    for file_name in ["departments.csv", "categories.csv", "subcategories.csv", "products.csv"]:
+        shutil.copy(REPO_DATA_DIR / file_name, tmp_path / file_name)
+    return tmp_path
+
+def undo_redo(direction, data_dir):
+    entry = load_undo_state(data_dir)[direction][-1]
+    return undo_redo_bulk_operation([], direction, entry['id'], data_dir=data_dir)
+
+def test_undo_and_redo_restore_the_catalog_exactly(data_dir):
+    original = (data_dir / "products.csv").read_bytes()
+    bulk_update_product_status([12, 3, 7], ['rejected', 'approved', 'rejected'], reviewed_by="Ann", data_dir=data_dir)
+    bulk_move_products([7, 40], {40: 5, 7: 2}, data_dir=data_dir)
+    changed = (data_dir / "products.csv").read_bytes()
+    
+    assert undo_redo('undo', data_dir) == 2
+    assert undo_redo('undo', data_dir) == 3
+    assert (data_dir / "products.csv").read_bytes() == original
+    
+    undo_redo('redo', data_dir)
+    undo_redo('redo', data_dir)
+    assert (data_dir / "products.csv").read_bytes() == changed
+
+def test_undo_refuses_rows_changed_since(data_dir):
+    bulk_update_product_status([12, 3], 'rejected', data_dir=data_dir)
+    
+    # Another writer changes one of the touched rows outside the undo stack
+    products = read_products(data_dir)
+    products.loc[products['id'] == 3, 'status'] = 'approved'
+    write_products_csv(products, data_dir)
+    edited = (data_dir / "products.csv").read_bytes()
+    
+    with pytest.raises(ValueError, match="1 products were changed"):
+        undo_redo('undo', data_dir)
+    assert (data_dir / "products.csv").read_bytes() == edited